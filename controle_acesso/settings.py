@@ -90,10 +90,33 @@ TEMPLATES = [
 WSGI_APPLICATION = 'controle_acesso.wsgi.application'
 
 # Database
+# Perfil de desempenho do SQLite, aplicado a cada nova conexão. WAL deixa a
+# leitura correr em paralelo à escrita e o timeout faz a escrita esperar a vez.
+# As transações continuam DEFERRED; só o registro de acesso e a importação
+# reservam a escrita no início (core.utils.transacao_escrita), para que
+# terminais concorrentes esperem em vez de falharem com "database is locked".
+# Compare com: manage.py benchmark_sqlite
+SQLITE_OTIMIZADO = os.getenv('SQLITE_OTIMIZADO', 'True').lower() in ['true', '1', 'yes']
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', '20'))  # segundos
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # negativo = KiB (64 MiB)
+
+SQLITE_PERFIL_DESEMPENHO = {
+    'timeout': SQLITE_BUSY_TIMEOUT,
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+        f'PRAGMA cache_size={SQLITE_CACHE_SIZE}',
+        'PRAGMA temp_store=MEMORY',
+    ]),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_PERFIL_DESEMPENHO if SQLITE_OTIMIZADO else {},
     }
 }
 
@@ -173,6 +196,22 @@ STORAGES = {
     },
 }
 
+# Índice em memória da busca de servidores: segundos até a reconstrução
+# completa a partir do banco (0 desativa a expiração; sinais mantêm o índice
+# atualizado entre reconstruções)
+BUSCA_INDICE_TTL = int(os.getenv('BUSCA_INDICE_TTL', '300'))
+
+# Exportações em segundo plano (manage.py processar_exportacoes): dias que os
+# arquivos gerados em MEDIA_ROOT/exportacoes/ ficam disponíveis para download
+EXPORTACAO_RETENCAO_DIAS = int(os.getenv('EXPORTACAO_RETENCAO_DIAS', '7'))
+# Minutos em execução após os quais uma exportação é dada como interrompida e
+# volta para a fila (maior que a exportação mais longa)
+EXPORTACAO_TEMPO_LIMITE_MINUTOS = int(os.getenv('EXPORTACAO_TEMPO_LIMITE_MINUTOS', '60'))
+
+# Horas que as chaves de idempotência dos terminais são guardadas (podadas na
+# limpeza do dashboard); precisa cobrir o maior tempo de um terminal sem rede
+IDEMPOTENCIA_RETENCAO_HORAS = int(os.getenv('IDEMPOTENCIA_RETENCAO_HORAS', '72'))
+
 # Configurações para evitar erro de muitos campos no admin
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 4000  # Padrão é 1000 - aumentado para suportar mais registros
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB - Padrão é 2.5MB
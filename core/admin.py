@@ -31,7 +31,11 @@ from .models import (
     Servidor, RegistroAcesso, RegistroDashboard, 
     LogAuditoria, VideoTutorial, PerfilUsuario
 )
-from .utils import get_unidade_prisional
+from .utils import (
+    COLUNAS_EXPORTACAO_REGISTROS, anotar_alteracoes_servidores_dashboard, get_unidade_prisional,
+    invalidar_dashboard_stats, linhas_exportacao_registros,
+)
+from .indice_busca import indice_servidores
 
 
 def _html_estatico(conteudo: str) -> SafeString:
@@ -182,7 +186,12 @@ class StatusAtivoFilter(SimpleListFilter):
 
 def ativar_servidores_selecionados(modeladmin, request, queryset):
     """Ativa servidores selecionados em massa"""
+    servidor_ids = list(queryset.values_list('id', flat=True))
     updated = queryset.update(ativo=True)
+    # update() não dispara sinais: descarta os caches derivados do cadastro
+    indice_servidores.invalidar()
+    invalidar_dashboard_stats()
+    anotar_alteracoes_servidores_dashboard(servidor_ids)
     messages.success(
         request,
         f'✅ {updated} servidor(es) ativado(s) com sucesso!'
@@ -191,7 +200,12 @@ ativar_servidores_selecionados.short_description = "✅ Ativar servidores seleci
 
 def desativar_servidores_selecionados(modeladmin, request, queryset):
     """Desativa servidores selecionados em massa"""
+    servidor_ids = list(queryset.values_list('id', flat=True))
     updated = queryset.update(ativo=False)
+    # update() não dispara sinais: descarta os caches derivados do cadastro
+    indice_servidores.invalidar()
+    invalidar_dashboard_stats()
+    anotar_alteracoes_servidores_dashboard(servidor_ids)
     messages.warning(
         request,
         f'❌ {updated} servidor(es) desativado(s) com sucesso!'
@@ -280,34 +294,14 @@ marcar_logs_para_analise.short_description = "🔍 Marcar logs para análise"
 
 def exportar_registros_selecionados(modeladmin, request, queryset):
     """Exporta registros de acesso selecionados"""
-    from django.http import HttpResponse
-    import csv
     from datetime import datetime
+    from .exportacao import resposta_csv
     
-    response = HttpResponse(content_type='text/csv; charset=utf-8')
-    response['Content-Disposition'] = f'attachment; filename="registros_acesso_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    
-    response.write('\ufeff')  # BOM para UTF-8
-    
-    writer = csv.writer(response, delimiter=';')
-    writer.writerow([
-        'Data/Hora', 'Servidor', 'Documento', 'Tipo Acesso', 'Setor', 
-        'Veículo', 'ISV', 'Operador', 'Status', 'Observação'
-    ])
-    
-    for reg in queryset.order_by('-data_hora'):
-        writer.writerow([
-            reg.data_hora.strftime('%d/%m/%Y %H:%M:%S'),
-            reg.servidor.nome,
-            reg.servidor.numero_documento,
-            reg.get_tipo_acesso_display(),
-            reg.setor or reg.servidor.setor,
-            reg.veiculo or reg.servidor.veiculo,
-            'Sim' if reg.isv else 'Não',
-            reg.operador.username,
-            'Pendente' if reg.saida_pendente else 'Completo',
-            reg.observacao or ''
-        ])
+    response = resposta_csv(
+        linhas_exportacao_registros(queryset.select_related('servidor', 'operador')),
+        COLUNAS_EXPORTACAO_REGISTROS,
+        f'registros_acesso_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
+    )
     
     count = queryset.count()
     modeladmin.message_user(
@@ -320,6 +314,27 @@ def exportar_registros_selecionados(modeladmin, request, queryset):
 
 exportar_registros_selecionados.short_description = "📊 Exportar registros selecionados (CSV)"
 
+def exportar_registros_segundo_plano(modeladmin, request, queryset):
+    """Exporta registros de acesso selecionados pelo worker de exportações"""
+    from .tarefas import enfileirar_exportacao
+    
+    ids = list(queryset.values_list('pk', flat=True))
+    tarefa = enfileirar_exportacao(
+        request.user, 'REGISTROS', 'csv', {'modelo': queryset.model.__name__, 'ids': ids}
+    )
+    
+    modeladmin.message_user(
+        request,
+        format_html(
+            '⏳ Exportação de {} registro(s) enviada para segundo plano. '
+            '<a href="{}">Acompanhar / baixar</a>',
+            len(ids), reverse('status_exportacao', args=[tarefa.pk])
+        ),
+        messages.INFO
+    )
+
+exportar_registros_segundo_plano.short_description = "⏳ Exportar registros selecionados em segundo plano (CSV)"
+
 def finalizar_entradas_pendentes(modeladmin, request, queryset):
     """Finaliza entradas pendentes marcando saída automática"""
     from django.utils import timezone
@@ -610,7 +625,8 @@ class RegistroAcessoAdmin(ColunasRegistroMixin, admin.ModelAdmin):
     
     # Ações personalizadas para registros
     actions = [
-        'exportar_registros_selecionados',
+        exportar_registros_selecionados,
+        exportar_registros_segundo_plano,
         'finalizar_entradas_pendentes'
     ]
     
@@ -696,7 +712,8 @@ class RegistroDashboardAdmin(ColunasRegistroMixin, admin.ModelAdmin):
     
     # Ações disponíveis para registros do dashboard
     actions = [
-        'exportar_registros_selecionados'
+        exportar_registros_selecionados,
+        exportar_registros_segundo_plano,
     ]
 
 @admin.register(LogAuditoria)
@@ -0,0 +1,95 @@
+"""
+Canal de eventos em memória para o push do dashboard (Server-Sent Events).
+
+Cada conexão SSE assina o canal com uma fila asyncio própria; os helpers de
+registro publicam entrada/saída/edição/exclusão depois do commit e o canal
+reparte o evento para todas as filas. Como a produção roda um único processo
+uvicorn (web.config), todos os terminais da portaria compartilham o canal.
+
+O evento só avisa que algo mudou: o cliente busca as alterações no feed
+incremental (/registros-plantao/?since=<cursor>), então descartar eventos
+antigos de uma fila cheia não perde nada.
+"""
+
+import asyncio
+import logging
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+TIPOS_EVENTO = ('entrada', 'saida', 'edicao', 'exclusao')
+TAMANHO_FILA = 100
+
+
+class CanalEventos:
+    """Pub/sub em memória: publicação síncrona (qualquer thread), consumo assíncrono."""
+
+    def __init__(self, tamanho_fila=TAMANHO_FILA):
+        self._lock = threading.Lock()
+        self._assinantes = {}
+        self._tamanho_fila = tamanho_fila
+
+    def assinar(self):
+        """Cria a fila de uma nova conexão. Deve ser chamado dentro do event loop."""
+        fila = asyncio.Queue(maxsize=self._tamanho_fila)
+        with self._lock:
+            self._assinantes[fila] = asyncio.get_running_loop()
+        return fila
+
+    def cancelar(self, fila):
+        """Remove a fila de uma conexão encerrada."""
+        with self._lock:
+            self._assinantes.pop(fila, None)
+
+    @property
+    def total_assinantes(self):
+        with self._lock:
+            return len(self._assinantes)
+
+    def publicar(self, evento):
+        """Entrega o evento a todas as filas, cada uma no seu event loop."""
+        with self._lock:
+            assinantes = list(self._assinantes.items())
+        for fila, loop in assinantes:
+            try:
+                loop.call_soon_threadsafe(self._entregar, fila, evento)
+            except RuntimeError:
+                # Loop já encerrado: a conexão caiu sem passar pelo cancelar()
+                self.cancelar(fila)
+
+    @staticmethod
+    def _entregar(fila, evento):
+        if fila.full():
+            # Cliente lento: o evento mais antigo é redundante com o mais novo
+            fila.get_nowait()
+        fila.put_nowait(evento)
+
+
+canal_dashboard = CanalEventos()
+
+
+def publicar_evento_dashboard(tipo, registro_id=None, is_treinamento=False):
+    """
+    Publica uma mudança do dashboard assim que a transação atual for confirmada.
+
+    Args:
+        tipo: Um de TIPOS_EVENTO
+        registro_id: Id do registro afetado, se houver um só
+        is_treinamento: Boolean indicando se é ambiente de treinamento
+    """
+    evento = {
+        'tipo': tipo,
+        'registro_id': registro_id,
+        'ambiente': 'treinamento' if is_treinamento else 'producao',
+    }
+
+    def _publicar():
+        try:
+            canal_dashboard.publicar(evento)
+        except Exception as exc:
+            # O push é acessório: nunca pode derrubar o registro de acesso
+            logger.warning('Falha ao publicar evento do dashboard: %s', exc)
+
+    transaction.on_commit(_publicar)
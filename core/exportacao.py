@@ -0,0 +1,235 @@
+"""
+Exportação de planilhas em fluxo contínuo.
+
+As linhas são gravadas uma a uma num workbook write-only do openpyxl, que não
+mantém a planilha em memória, e o arquivo final fica num temporário em disco
+entregue via FileResponse. O consumo de memória não depende do tamanho do
+período exportado.
+
+Com ajustar_larguras=True a largura de cada coluna é acompanhada enquanto as
+linhas são gravadas (uma única passada, sem DataFrame). O openpyxl só aceita
+larguras antes da primeira linha no modo write-only, então nesse caso a
+planilha fica em memória: use para exportações do tamanho do dashboard.
+
+Também há CSV (gerado enquanto é enviado) e Parquet (colunar, exige pyarrow)
+para extrações grandes do histórico.
+"""
+
+import csv
+import importlib.util
+import tempfile
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+TAMANHO_LOTE_EXPORTACAO = 2000
+TAMANHO_BLOCO_ENVIO = 64 * 1024
+CONTENT_TYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CONTENT_TYPE_CSV = 'text/csv; charset=utf-8'
+CONTENT_TYPE_PARQUET = 'application/vnd.apache.parquet'
+
+
+class _EnvioAssincronoMixin:
+    """
+    Sob ASGI (uvicorn), lê o conteúdo síncrono um bloco por vez.
+
+    O StreamingHttpResponse padrão converte iteradores síncronos com
+    list() antes de enviar, o que carregaria a exportação inteira na memória.
+    """
+
+    async def __aiter__(self):
+        iterador = iter(self.streaming_content)
+        proximo = sync_to_async(next)
+        while True:
+            parte = await proximo(iterador, None)
+            if parte is None:
+                return
+            yield parte
+
+
+class RespostaEmFluxo(_EnvioAssincronoMixin, StreamingHttpResponse):
+    """StreamingHttpResponse que não acumula o conteúdo sob ASGI."""
+
+
+class ArquivoEmFluxo(_EnvioAssincronoMixin, FileResponse):
+    """FileResponse que não acumula o arquivo sob ASGI."""
+
+    block_size = TAMANHO_BLOCO_ENVIO
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def iterar_em_lotes(queryset, tamanho=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Percorre o queryset com iterator(), entregando listas de até `tamanho` objetos.
+
+    Permite processar cada lote de uma vez (ex.: calcular_plantoes) sem
+    carregar o resultado inteiro da consulta.
+    """
+    lote = []
+    for item in queryset.iterator(chunk_size=tamanho):
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def gravar_xlsx(destino, linhas, cabecalho, titulo_planilha='Planilha', ajustar_larguras=False):
+    """
+    Grava um .xlsx a partir de um iterável de linhas.
+
+    Args:
+        destino: Arquivo binário (ou caminho) onde a planilha é salva
+        linhas: Iterável (de preferência um gerador) de listas de valores
+        cabecalho: Títulos das colunas
+        titulo_planilha: Nome da aba
+        ajustar_larguras: Ajusta a largura das colunas ao maior conteúdo
+    """
+    workbook = Workbook(write_only=not ajustar_larguras)
+    if ajustar_larguras:
+        planilha = workbook.active
+        planilha.title = titulo_planilha
+    else:
+        planilha = workbook.create_sheet(titulo_planilha)
+
+    planilha.append(cabecalho)
+    larguras = [len(str(titulo)) for titulo in cabecalho]
+    for linha in linhas:
+        planilha.append(linha)
+        if ajustar_larguras:
+            for indice, valor in enumerate(linha):
+                tamanho = len(str(valor))
+                if indice >= len(larguras):
+                    larguras.append(tamanho)
+                elif tamanho > larguras[indice]:
+                    larguras[indice] = tamanho
+
+    if ajustar_larguras:
+        for indice, largura in enumerate(larguras, start=1):
+            planilha.column_dimensions[get_column_letter(indice)].width = largura + 2
+
+    workbook.save(destino)
+
+
+def _blocos_csv(linhas, cabecalho, delimitador):
+    """Texto do CSV (com BOM) em blocos de ~TAMANHO_BLOCO_ENVIO caracteres."""
+    escritor = csv.writer(_Eco(), delimiter=delimitador)
+    bloco = ['\ufeff', escritor.writerow(cabecalho)]
+    tamanho = 0
+    for linha in linhas:
+        texto = escritor.writerow(linha)
+        bloco.append(texto)
+        tamanho += len(texto)
+        if tamanho >= TAMANHO_BLOCO_ENVIO:
+            yield ''.join(bloco)
+            bloco = []
+            tamanho = 0
+    if bloco:
+        yield ''.join(bloco)
+
+
+def gravar_csv(destino, linhas, cabecalho, delimitador=';'):
+    """Grava um .csv UTF-8 com BOM num arquivo binário."""
+    for bloco in _blocos_csv(linhas, cabecalho, delimitador):
+        destino.write(bloco.encode('utf-8'))
+
+
+def parquet_disponivel():
+    """Indica se o pyarrow (dependência opcional do formato Parquet) está instalado."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def gravar_parquet(destino, linhas, cabecalho, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Grava um .parquet (colunas de texto, compressão snappy) a partir das linhas.
+
+    As linhas são convertidas em lotes de `tamanho_lote` para o ParquetWriter,
+    então a memória usada não depende do total exportado.
+
+    Raises:
+        ImportError: se o pyarrow não estiver instalado (ver parquet_disponivel)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([(str(titulo), pa.string()) for titulo in cabecalho])
+
+    def gravar(escritor, lote):
+        colunas = [
+            pa.array([None if valor is None else str(valor) for valor in coluna], type=pa.string())
+            for coluna in zip(*lote)
+        ]
+        escritor.write_table(pa.Table.from_arrays(colunas, schema=esquema))
+
+    with pq.ParquetWriter(destino, esquema, compression='snappy') as escritor:
+        lote = []
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                gravar(escritor, lote)
+                lote = []
+        if lote:
+            gravar(escritor, lote)
+
+
+def _resposta_arquivo_temporario(gravar, nome_arquivo, content_type):
+    """Executa gravar(arquivo) num temporário e o devolve como download."""
+    arquivo = tempfile.TemporaryFile()
+    try:
+        gravar(arquivo)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return ArquivoEmFluxo(
+        arquivo, as_attachment=True, filename=nome_arquivo, content_type=content_type
+    )
+
+
+def resposta_xlsx(linhas, cabecalho, nome_arquivo, titulo_planilha='Planilha', ajustar_larguras=False):
+    """
+    Gera um .xlsx (ver gravar_xlsx) e o devolve como download.
+
+    Returns:
+        FileResponse que lê o arquivo temporário (apagado ao ser fechado)
+    """
+    return _resposta_arquivo_temporario(
+        lambda arquivo: gravar_xlsx(arquivo, linhas, cabecalho, titulo_planilha, ajustar_larguras),
+        nome_arquivo,
+        CONTENT_TYPE_XLSX,
+    )
+
+
+def resposta_csv(linhas, cabecalho, nome_arquivo, delimitador=';'):
+    """
+    Gera um .csv enquanto ele é enviado (UTF-8 com BOM, para o Excel).
+
+    Args:
+        linhas: Iterável (de preferência um gerador) de listas de valores
+        cabecalho: Títulos das colunas
+        nome_arquivo: Nome do arquivo baixado
+        delimitador: Separador de campos (';' é o padrão do Excel em pt-BR)
+    """
+    response = RespostaEmFluxo(
+        _blocos_csv(linhas, cabecalho, delimitador), content_type=CONTENT_TYPE_CSV
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+def resposta_parquet(linhas, cabecalho, nome_arquivo, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """Gera um .parquet (ver gravar_parquet) e o devolve como download."""
+    return _resposta_arquivo_temporario(
+        lambda arquivo: gravar_parquet(arquivo, linhas, cabecalho, tamanho_lote),
+        nome_arquivo,
+        CONTENT_TYPE_PARQUET,
+    )
@@ -0,0 +1,102 @@
+"""
+Chaves de idempotência dos terminais da portaria (ChaveIdempotencia).
+
+O terminal gera uma chave por ação (um UUID) e a repete em toda retentativa,
+no cabeçalho Idempotency-Key ou no campo idempotency_key do formulário. A
+primeira requisição grava a chave e a resposta na mesma transação do
+registro; as repetições recebem a resposta gravada sem registrar de novo.
+Como a coluna é única, duas retentativas simultâneas não passam as duas.
+
+A chave identifica a ação, não o endpoint: a saída enviada pelo botão e
+depois reenviada pela fila offline (/registro-acesso/sincronizar/) com a
+mesma chave é registrada uma vez só.
+
+Só resultados definitivos ficam gravados (sucesso, dados inválidos, servidor
+inexistente). Recusas que dependem do estado do momento (409: entrada já
+aberta, saída sem entrada) não guardam a chave, então a retentativa executa
+de novo em vez de repetir a recusa.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ChaveIdempotencia
+from .utils import transacao_escrita
+
+TAMANHO_MAXIMO_CHAVE = ChaveIdempotencia._meta.get_field('chave').max_length
+
+# Respostas que não são gravadas com a chave (a retentativa executa de novo)
+STATUS_NAO_DEFINITIVOS = frozenset({409})
+
+
+def chave_da_requisicao(request):
+    """Chave enviada pelo terminal ('' quando a requisição não traz nenhuma)."""
+    chave = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key', '')
+    return chave.strip()
+
+
+def executar_idempotente(chave, operador, operacao, acao):
+    """
+    Executa `acao` uma única vez por chave.
+
+    Args:
+        chave: Chave enviada pelo terminal ('' executa sem deduplicar)
+        operador: Usuário que está registrando
+        operacao: Nome da operação, gravado junto da chave
+        acao: Função sem argumentos que devolve (status_code, resposta: dict)
+
+    Returns:
+        Tuple (status_code, resposta, repetida: bool). Exceções em `acao` e
+        respostas em STATUS_NAO_DEFINITIVOS não deixam a chave gravada, então
+        a retentativa executa de novo.
+    """
+    if not chave:
+        status_code, resposta = acao()
+        return status_code, resposta, False
+    if len(chave) > TAMANHO_MAXIMO_CHAVE:
+        return 400, {
+            'status': 'error',
+            'message': f'Chave de idempotência com mais de {TAMANHO_MAXIMO_CHAVE} caracteres.',
+        }, False
+
+    with transacao_escrita():
+        try:
+            with transaction.atomic():
+                registro = ChaveIdempotencia.objects.create(
+                    chave=chave, operador=operador, operacao=operacao
+                )
+        except IntegrityError:
+            anterior = ChaveIdempotencia.objects.get(chave=chave)
+            if anterior.operador_id != operador.pk:
+                return 409, {
+                    'status': 'error',
+                    'message': 'Chave de idempotência já utilizada por outro usuário.',
+                }, False
+            return anterior.status_code, anterior.resposta, True
+
+        status_code, resposta = acao()
+        if status_code in STATUS_NAO_DEFINITIVOS:
+            registro.delete()
+            return status_code, resposta, False
+        registro.status_code = status_code
+        registro.resposta = resposta
+        registro.save(update_fields=['status_code', 'resposta'])
+    return status_code, resposta, False
+
+
+def podar_chaves_idempotencia(retencao=None):
+    """
+    Remove as chaves mais antigas que a retenção (IDEMPOTENCIA_RETENCAO_HORAS).
+
+    A retenção precisa cobrir o maior tempo que um terminal fica sem rede:
+    um evento reenviado depois que a chave foi removida é registrado de novo.
+    """
+    if retencao is None:
+        retencao = timedelta(hours=settings.IDEMPOTENCIA_RETENCAO_HORAS)
+    removidas, _ = ChaveIdempotencia.objects.filter(
+        data_hora__lt=timezone.now() - retencao
+    ).delete()
+    return removidas
@@ -0,0 +1,399 @@
+"""
+Importação de servidores em lote a partir de planilhas CSV ou XLSX.
+
+O arquivo é lido linha a linha (CSV sem decodificar tudo na memória, XLSX no
+modo read_only do openpyxl, que não carrega a planilha inteira) e aplicado
+em lotes de TAMANHO_LOTE_IMPORTACAO: para cada lote uma única consulta traz os
+servidores já cadastrados pelos dígitos do documento, os novos entram com
+bulk_create, os alterados com bulk_update e um LogAuditoria resume o lote.
+Tudo roda numa transação: uma linha inválida desfaz a importação inteira.
+
+Na prévia (comparar_importacao) o arquivo é lido uma vez e comparado ao
+cadastro; as linhas já validadas ficam no banco (PreviaImportacao) sob um
+token e a confirmação as aplica sem reler o arquivo.
+
+bulk_create/bulk_update não chamam save() nem disparam sinais, então a caixa
+alta, as colunas de busca, o índice em memória e os contadores do dashboard
+são tratados aqui.
+"""
+
+import codecs
+import csv
+import uuid
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .indice_busca import indice_servidores
+from .models import LogAuditoria, PreviaImportacao, Servidor
+from .utils import (
+    anotar_alteracoes_servidores_dashboard, colapsar_espacos, invalidar_dashboard_stats,
+    normalizar_documento, transacao_escrita,
+)
+
+TAMANHO_LOTE_IMPORTACAO = 500
+
+# Estas colunas DEVEM corresponder às do modelo (download_modelo_importacao)
+COLUNAS_IMPORTACAO = ['Nome', 'Número do Documento', 'Setor', 'Veículo']
+
+# Campos gravados pela importação (além do documento, que é a chave)
+CAMPOS_IMPORTACAO = ['nome', 'setor', 'veiculo', 'ativo']
+ROTULOS_CAMPOS_IMPORTACAO = {'nome': 'Nome', 'setor': 'Setor', 'veiculo': 'Veículo', 'ativo': 'Ativo'}
+
+# latin1 aceita qualquer sequência de bytes, então é o último recurso
+CODIFICACOES_CSV = ['utf-8-sig', 'latin1']
+
+# Início de todo arquivo ZIP (o .xlsx é um ZIP)
+ASSINATURA_XLSX = b'PK\x03\x04'
+
+# Segundos que a prévia fica guardada aguardando a confirmação
+VALIDADE_PREVIA_IMPORTACAO = 30 * 60
+
+
+def _normalizar_nome_coluna_csv(coluna: str | None) -> str:
+    """Normaliza cabecalhos e celulas CSV (BOM, NBSP, espacos extras)."""
+    return colapsar_espacos(coluna)
+
+
+def _detectar_codificacao(arquivo):
+    """Primeira codificação de CODIFICACOES_CSV que decodifica o arquivo inteiro."""
+    for codificacao in CODIFICACOES_CSV[:-1]:
+        decodificador = codecs.getincrementaldecoder(codificacao)()
+        arquivo.seek(0)
+        try:
+            for bloco in arquivo.chunks():
+                decodificador.decode(bloco)
+            decodificador.decode(b'', final=True)
+            return codificacao
+        except UnicodeDecodeError:
+            continue
+    return CODIFICACOES_CSV[-1]
+
+
+def mapear_colunas(cabecalho):
+    """
+    Localiza as colunas de COLUNAS_IMPORTACAO no cabeçalho da planilha.
+
+    Aceita variações de BOM, espaços e acentos (ex.: 'Numero do Documento').
+
+    Returns:
+        Dict coluna esperada -> índice da coluna no arquivo
+
+    Raises:
+        ValueError: se faltar alguma coluna
+    """
+    cabecalho = [_normalizar_nome_coluna_csv(coluna) for coluna in cabecalho]
+    if not any(cabecalho):
+        raise ValueError('Arquivo não contém cabeçalhos de colunas')
+
+    def sem_acentos(coluna):
+        return coluna.lower().replace('ú', 'u').replace('í', 'i')
+
+    mapeamento = {}
+    for coluna_esperada in COLUNAS_IMPORTACAO:
+        if coluna_esperada in cabecalho:
+            mapeamento[coluna_esperada] = cabecalho.index(coluna_esperada)
+            continue
+        for indice, coluna in enumerate(cabecalho):
+            if sem_acentos(coluna) == sem_acentos(coluna_esperada):
+                mapeamento[coluna_esperada] = indice
+                break
+
+    colunas_faltantes = [col for col in COLUNAS_IMPORTACAO if col not in mapeamento]
+    if colunas_faltantes:
+        colunas_encontradas = ", ".join([f"'{c}'" for c in cabecalho if c])
+        colunas_necessarias = ", ".join([f"'{c}'" for c in colunas_faltantes])
+        raise ValueError(f"Colunas não encontradas: {colunas_necessarias}. Colunas disponíveis: {colunas_encontradas}")
+    return mapeamento
+
+
+def _linhas_csv(arquivo):
+    """
+    Lê o CSV enviado linha a linha.
+
+    Detecta a codificação e o delimitador (';' se aparecer no cabeçalho,
+    senão ',').
+
+    Returns:
+        Tuple (cabeçalho, iterador de (número da linha, células))
+    """
+    codificacao = _detectar_codificacao(arquivo)
+    arquivo.seek(0)
+    texto = codecs.iterdecode(arquivo, codificacao)
+    primeira_linha = next(texto, '')
+    delimitador = ';' if ';' in primeira_linha else ','
+
+    leitor = csv.reader(chain([primeira_linha], texto), delimiter=delimitador)
+    cabecalho = next(leitor, [])
+    return cabecalho, ((leitor.line_num, linha) for linha in leitor)
+
+
+def _texto_celula_xlsx(valor):
+    """Valor da célula como no CSV exportado pelo Excel (12345.0 vira '12345')."""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _linhas_xlsx(arquivo):
+    """
+    Lê a primeira aba do .xlsx enviado linha a linha (openpyxl read_only).
+
+    Returns:
+        Tuple (cabeçalho, iterador de (número da linha, células))
+    """
+    arquivo.seek(0)
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    linhas = workbook.active.iter_rows(values_only=True)
+    cabecalho = [_texto_celula_xlsx(valor) for valor in next(linhas, ())]
+
+    def iterar():
+        try:
+            for numero, linha in enumerate(linhas, start=2):
+                yield numero, [_texto_celula_xlsx(valor) for valor in linha]
+        finally:
+            workbook.close()
+
+    return cabecalho, iterar()
+
+
+def _eh_xlsx(arquivo):
+    arquivo.seek(0)
+    return arquivo.read(len(ASSINATURA_XLSX)) == ASSINATURA_XLSX
+
+
+def ler_planilha_servidores(arquivo):
+    """
+    Converte a planilha enviada (CSV ou XLSX) em dados de servidores, sem acessar o banco.
+
+    O formato é identificado pelo conteúdo, não pela extensão. Linhas sem nome
+    ou documento são ignoradas.
+
+    Yields:
+        Tuple (número da linha, dict com nome, numero_documento, setor, veiculo)
+    """
+    cabecalho, linhas = _linhas_xlsx(arquivo) if _eh_xlsx(arquivo) else _linhas_csv(arquivo)
+    colunas = mapear_colunas(cabecalho)
+
+    def celula(linha, coluna):
+        indice = colunas[coluna]
+        return _normalizar_nome_coluna_csv(linha[indice] if indice < len(linha) else '')
+
+    for numero, linha in linhas:
+        nome = celula(linha, 'Nome')
+        documento = celula(linha, 'Número do Documento')
+        if not nome or not documento:
+            continue
+        yield numero, {
+            'nome': nome,
+            'numero_documento': documento,
+            'setor': celula(linha, 'Setor'),
+            'veiculo': celula(linha, 'Veículo') or None,
+        }
+
+
+def _servidor_importado(dados):
+    """Servidor com os dados da planilha já normalizados como no save()."""
+    servidor = Servidor(ativo=True, **dados)
+    servidor._aplicar_caixa_alta_nome_setor()
+    servidor._atualizar_campos_busca({})
+    return servidor
+
+
+def _campos_alterados(atual, importado):
+    """Campos de CAMPOS_IMPORTACAO que diferem entre o cadastro e a planilha."""
+    return [
+        campo for campo in CAMPOS_IMPORTACAO
+        if getattr(atual, campo) != getattr(importado, campo)
+    ]
+
+
+def _chave_documento(documento):
+    """Dígitos do documento (como na restrição servidor_documento_unico) ou, sem dígitos, o próprio texto."""
+    return normalizar_documento(documento) or documento
+
+
+def _servidores_por_documento(chaves):
+    """Servidores cadastrados para as chaves de _chave_documento, numa única consulta."""
+    chaves = list(chaves)
+    servidores = Servidor.objects.filter(
+        Q(documento_digitos__in=chaves) | Q(documento_digitos='', numero_documento__in=chaves)
+    )
+    return {_chave_documento(servidor.numero_documento): servidor for servidor in servidores}
+
+
+def _lotes(registros, tamanho):
+    iterador = iter(registros)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+
+def _aplicar_lote(lote, usuario, numero_lote):
+    """Grava um lote; devolve (criados, atualizados, inalterados, ids atualizados)."""
+    # Documento repetido no mesmo lote: vale a última linha (como no update_or_create)
+    por_documento = {}
+    for numero, dados in lote:
+        por_documento[_chave_documento(dados['numero_documento'])] = (numero, dados)
+
+    existentes = _servidores_por_documento(por_documento)
+
+    novos, alterados = [], []
+    for documento, (numero, dados) in por_documento.items():
+        try:
+            importado = _servidor_importado(dados)
+        except Exception as erro:
+            raise ValueError(f"Erro na linha {numero}: {erro}. Dados: {dados}") from erro
+
+        atual = existentes.get(documento)
+        if atual is None:
+            novos.append(importado)
+            continue
+        if _campos_alterados(atual, importado):
+            for campo in CAMPOS_IMPORTACAO:
+                setattr(atual, campo, getattr(importado, campo))
+            atual._atualizar_campos_busca({})
+            alterados.append(atual)
+
+    Servidor.objects.bulk_create(novos)
+    if alterados:
+        Servidor.objects.bulk_update(
+            alterados, CAMPOS_IMPORTACAO + ['nome_normalizado', 'setor_normalizado', 'documento_digitos']
+        )
+
+    if novos or alterados:
+        detalhes = [f"Importação de servidores (lote {numero_lote}): {len(novos)} criado(s), {len(alterados)} atualizado(s)"]
+        if novos:
+            detalhes.append('Criados: ' + ', '.join(s.numero_documento for s in novos))
+        if alterados:
+            detalhes.append('Atualizados: ' + ', '.join(s.numero_documento for s in alterados))
+        LogAuditoria.objects.create(
+            usuario=usuario,
+            tipo_acao='EDICAO' if alterados else 'CRIACAO',
+            modelo='Servidor',
+            objeto_id=None,
+            detalhes='\n'.join(detalhes),
+        )
+
+    inalterados = len(por_documento) - len(novos) - len(alterados)
+    return len(novos), len(alterados), inalterados, [s.pk for s in alterados]
+
+
+def importar_servidores_em_lote(registros, usuario, tamanho_lote=TAMANHO_LOTE_IMPORTACAO):
+    """
+    Cria ou atualiza servidores a partir de (número da linha, dados) em lotes.
+
+    Servidores existentes (mesmos dígitos no documento) são reativados e
+    atualizados só quando algum campo muda; o documento cadastrado é mantido.
+
+    Args:
+        registros: Iterável de ler_planilha_servidores (ou equivalente)
+        usuario: Usuário registrado no LogAuditoria
+        tamanho_lote: Linhas por lote (uma consulta e um log por lote)
+
+    Returns:
+        Dict com as quantidades 'criados', 'atualizados' e 'inalterados'
+
+    Raises:
+        ValueError: se uma linha for inválida (nada é gravado)
+    """
+    resumo = {'criados': 0, 'atualizados': 0, 'inalterados': 0}
+    with transacao_escrita():
+        for numero_lote, lote in enumerate(_lotes(registros, tamanho_lote), start=1):
+            criados, atualizados, inalterados, ids_atualizados = _aplicar_lote(lote, usuario, numero_lote)
+            resumo['criados'] += criados
+            resumo['atualizados'] += atualizados
+            resumo['inalterados'] += inalterados
+            # Nome, setor e situação aparecem nas linhas do dashboard
+            anotar_alteracoes_servidores_dashboard(ids_atualizados)
+
+        if resumo['criados'] or resumo['atualizados']:
+            # O que os sinais de Servidor fariam a cada save()
+            transaction.on_commit(indice_servidores.invalidar)
+            transaction.on_commit(invalidar_dashboard_stats)
+    return resumo
+
+
+def comparar_importacao(registros):
+    """
+    Compara os dados da planilha com o cadastro, sem gravar nada.
+
+    Todos os documentos são buscados numa única consulta ao índice de
+    documento_digitos.
+
+    Args:
+        registros: Iterável de ler_planilha_servidores (consumido aqui)
+
+    Returns:
+        Dict com 'registros' (linhas a aplicar na confirmação) e as listas
+        'criar', 'atualizar' (com as alterações campo a campo) e 'inalterados'
+    """
+    # Documento repetido no arquivo: vale a última linha, como na importação
+    por_documento = {}
+    for numero, dados in registros:
+        por_documento[_chave_documento(dados['numero_documento'])] = (numero, dados)
+
+    existentes = _servidores_por_documento(por_documento)
+
+    previa = {'registros': list(por_documento.values()), 'criar': [], 'atualizar': [], 'inalterados': []}
+    for documento, (numero, dados) in por_documento.items():
+        importado = _servidor_importado(dados)
+        item = {
+            'linha': numero,
+            'numero_documento': dados['numero_documento'],
+            'nome': importado.nome,
+            'setor': importado.setor,
+            'veiculo': importado.veiculo or '',
+        }
+        atual = existentes.get(documento)
+        if atual is None:
+            previa['criar'].append(item)
+            continue
+        alterados = _campos_alterados(atual, importado)
+        if alterados:
+            item['alteracoes'] = [
+                {
+                    'campo': campo,
+                    'rotulo': ROTULOS_CAMPOS_IMPORTACAO[campo],
+                    'de': getattr(atual, campo),
+                    'para': getattr(importado, campo),
+                }
+                for campo in alterados
+            ]
+            previa['atualizar'].append(item)
+        else:
+            previa['inalterados'].append(item)
+    return previa
+
+
+def _previas_validas():
+    limite = timezone.now() - timedelta(seconds=VALIDADE_PREVIA_IMPORTACAO)
+    return PreviaImportacao.objects.filter(data_criacao__gte=limite)
+
+
+def guardar_previa(usuario, previa):
+    """Guarda a prévia no banco para a confirmação; devolve o token."""
+    # Prévias abandonadas (nem confirmadas nem canceladas) saem aqui
+    PreviaImportacao.objects.exclude(pk__in=_previas_validas().values('pk')).delete()
+    token = uuid.uuid4().hex
+    PreviaImportacao.objects.create(token=token, usuario=usuario, dados=previa)
+    return token
+
+
+def obter_previa(usuario, token):
+    """Prévia guardada pelo mesmo usuário, ou None se expirou/não existe."""
+    if not token:
+        return None
+    return _previas_validas().filter(token=token, usuario=usuario).values_list(
+        'dados', flat=True
+    ).first()
+
+
+def descartar_previa(token):
+    """Remove a prévia (após a confirmação ou o cancelamento)."""
+    PreviaImportacao.objects.filter(token=token).delete()
@@ -0,0 +1,387 @@
+"""
+Índice invertido em memória para a busca de servidores (autocomplete).
+
+Guarda n-gramas das palavras normalizadas de nome e setor e dos dígitos do
+documento de cada servidor ativo. É construído sob demanda na primeira busca
+e corrigido incrementalmente pelos sinais de Servidor (ver core/signals.py).
+Os resultados são ordenados por relevância e toleram erros de digitação.
+Enquanto o índice não estiver pronto, buscar() retorna None e o chamador
+resolve a busca direto no banco.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .utils import normalizar_documento, normalizar_texto, texto_contem_todas_palavras
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_NGRAMA = 3
+
+
+def gerar_ngramas(palavra, tamanho_maximo=TAMANHO_NGRAMA):
+    """Retorna todos os n-gramas de 1 até tamanho_maximo caracteres da palavra."""
+    ngramas = set()
+    for tamanho in range(1, tamanho_maximo + 1):
+        for inicio in range(len(palavra) - tamanho + 1):
+            ngramas.add(palavra[inicio:inicio + tamanho])
+    return ngramas
+
+
+# Pesos da ordenação dos resultados (maior aparece primeiro)
+PONTUACAO_DOCUMENTO_EXATO = 500
+PONTUACAO_PREFIXO_NOME = 400
+PONTUACAO_CONTEM = 300
+PONTUACAO_SETOR = 200
+PONTUACAO_APROXIMADA = 100
+
+
+def limite_erros_palavra(palavra):
+    """Quantos erros de digitação são tolerados numa palavra da busca."""
+    if len(palavra) >= 8:
+        return 2
+    if len(palavra) >= 4:
+        return 1
+    return 0
+
+
+def distancia_edicao_limitada(a, b, limite, prefixo=False):
+    """
+    Distância de Levenshtein entre a e b, interrompida ao passar de `limite`.
+
+    Com prefixo=True compara `a` com o melhor início de `b`, o que aceita
+    palavras ainda incompletas ("asunc" -> "assuncao").
+
+    Returns:
+        A distância, ou limite + 1 se ela for maior que o limite
+    """
+    if not prefixo and abs(len(a) - len(b)) > limite:
+        return limite + 1
+
+    anterior = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        atual = [i]
+        for j, char_b in enumerate(b, 1):
+            atual.append(min(
+                anterior[j] + 1,
+                atual[j - 1] + 1,
+                anterior[j - 1] + (char_a != char_b),
+            ))
+        if min(atual) > limite:
+            return limite + 1
+        anterior = atual
+
+    distancia = min(anterior) if prefixo else anterior[-1]
+    return min(distancia, limite + 1)
+
+
+def _pontuacao_palavra(palavra, palavras_texto):
+    """Melhor forma de correspondência de uma palavra da busca num texto."""
+    if any(p.startswith(palavra) for p in palavras_texto):
+        return PONTUACAO_PREFIXO_NOME
+    if any(palavra in p for p in palavras_texto):
+        return PONTUACAO_CONTEM
+
+    limite = limite_erros_palavra(palavra)
+    if limite and any(
+        distancia_edicao_limitada(palavra, p, limite, prefixo=True) <= limite
+        for p in palavras_texto
+    ):
+        return PONTUACAO_APROXIMADA
+    return 0
+
+
+def pontuar_servidor(textos, palavras, query_digitos):
+    """
+    Pontua um servidor indexado contra a busca (0 = não corresponde).
+
+    Args:
+        textos: Dict com 'nome', 'setor' e 'documento' já normalizados
+        palavras: Palavras normalizadas da busca
+        query_digitos: Dígitos da busca
+    """
+    pontuacao = 0
+
+    if len(query_digitos) >= 2 and textos['documento']:
+        if query_digitos == textos['documento']:
+            return PONTUACAO_DOCUMENTO_EXATO
+        if query_digitos in textos['documento']:
+            pontuacao = PONTUACAO_CONTEM
+
+    if palavras:
+        palavras_nome = textos['nome'].split()
+        pontuacao = max(pontuacao, min(_pontuacao_palavra(p, palavras_nome) for p in palavras))
+
+        if pontuacao < PONTUACAO_SETOR and texto_contem_todas_palavras(textos['setor'], ' '.join(palavras)):
+            pontuacao = PONTUACAO_SETOR
+
+    return pontuacao
+
+
+class IndiceServidores:
+    """
+    Índice de n-gramas dos servidores ativos, por campo pesquisável.
+
+    Para cada campo ('nome', 'setor', 'documento') mantém um dicionário
+    n-grama -> ids de servidores. Um termo com até TAMANHO_NGRAMA caracteres
+    é resolvido por uma única lista; termos maiores pela interseção das
+    listas dos seus trigramas, confirmada depois no texto completo.
+    """
+
+    CAMPOS = ('nome', 'setor', 'documento')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lock_construcao = threading.Lock()
+        self._servidores = {}
+        self._textos_indexados = {}
+        self._postings = {campo: {} for campo in self.CAMPOS}
+        self._pronto = False
+        self._construido_em = 0.0
+        self._geracao = 0
+
+    # ------------------------------------------------------------------
+    # Manutenção
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _textos(servidor):
+        """Textos indexados de um servidor, já normalizados."""
+        return {
+            'nome': servidor.nome_normalizado or normalizar_texto(servidor.nome),
+            'setor': servidor.setor_normalizado or normalizar_texto(servidor.setor),
+            'documento': servidor.documento_digitos or normalizar_documento(servidor.numero_documento),
+        }
+
+    def _ngramas_campo(self, campo, texto):
+        if campo == 'documento':
+            return gerar_ngramas(texto) if texto else set()
+        ngramas = set()
+        for palavra in texto.split():
+            ngramas |= gerar_ngramas(palavra)
+        return ngramas
+
+    def _inserir(self, servidor):
+        textos = self._textos(servidor)
+        self._servidores[servidor.pk] = servidor
+        self._textos_indexados[servidor.pk] = textos
+        for campo, texto in textos.items():
+            postings = self._postings[campo]
+            for ngrama in self._ngramas_campo(campo, texto):
+                postings.setdefault(ngrama, set()).add(servidor.pk)
+
+    def _retirar(self, servidor_id):
+        self._servidores.pop(servidor_id, None)
+        textos = self._textos_indexados.pop(servidor_id, None)
+        if textos is None:
+            return
+        for campo, texto in textos.items():
+            postings = self._postings[campo]
+            for ngrama in self._ngramas_campo(campo, texto):
+                ids = postings.get(ngrama)
+                if ids is None:
+                    continue
+                ids.discard(servidor_id)
+                if not ids:
+                    del postings[ngrama]
+
+    def construir(self):
+        """Reconstrói o índice a partir dos servidores ativos do banco."""
+        from .models import Servidor
+
+        with self._lock:
+            geracao_inicial = self._geracao
+
+        inicio = time.perf_counter()
+        servidores = list(Servidor.objects.filter(ativo=True))
+
+        with self._lock:
+            self._servidores = {}
+            self._textos_indexados = {}
+            self._postings = {campo: {} for campo in self.CAMPOS}
+            for servidor in servidores:
+                self._inserir(servidor)
+            # Alterações recebidas durante a leitura do banco podem ter ficado
+            # fora do snapshot: nesse caso o índice já nasce expirado.
+            self._pronto = True
+            self._construido_em = time.monotonic() if self._geracao == geracao_inicial else 0.0
+
+        logger.debug(
+            'Índice de busca construído com %s servidores em %.1f ms',
+            len(servidores), (time.perf_counter() - inicio) * 1000,
+        )
+
+    def atualizar(self, servidor):
+        """Aplica no índice o estado atual de um servidor salvo."""
+        with self._lock:
+            self._geracao += 1
+            if not self._pronto:
+                return
+            self._retirar(servidor.pk)
+            if servidor.ativo:
+                self._inserir(servidor)
+
+    def remover(self, servidor_id):
+        """Retira do índice um servidor excluído."""
+        with self._lock:
+            self._geracao += 1
+            if self._pronto:
+                self._retirar(servidor_id)
+
+    def invalidar(self):
+        """Descarta o índice; será reconstruído na próxima busca."""
+        with self._lock:
+            self._geracao += 1
+            self._pronto = False
+            self._servidores = {}
+            self._textos_indexados = {}
+            self._postings = {campo: {} for campo in self.CAMPOS}
+
+    def _expirado(self):
+        ttl = getattr(settings, 'BUSCA_INDICE_TTL', 300)
+        return ttl > 0 and time.monotonic() - self._construido_em > ttl
+
+    def _garantir_construido(self):
+        """
+        Constrói o índice se estiver frio ou expirado.
+
+        Só uma thread constrói por vez; as demais seguem com o índice antigo
+        (se houver) ou recebem False para cair na busca pelo banco.
+        """
+        if self._pronto and not self._expirado():
+            return True
+
+        if not self._lock_construcao.acquire(blocking=False):
+            return self._pronto
+        try:
+            if not self._pronto or self._expirado():
+                self.construir()
+        except Exception:
+            logger.exception('Falha ao construir o índice de busca de servidores')
+        finally:
+            self._lock_construcao.release()
+        return self._pronto
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def _candidatos_termo(self, campo, termo):
+        """Ids cujo campo contém todos os n-gramas do termo (superconjunto)."""
+        postings = self._postings[campo]
+        if len(termo) <= TAMANHO_NGRAMA:
+            return set(postings.get(termo, ()))
+
+        trigramas = {termo[i:i + TAMANHO_NGRAMA] for i in range(len(termo) - TAMANHO_NGRAMA + 1)}
+        resultado = None
+        # Começa pelas listas menores para a interseção encolher rápido
+        for trigrama in sorted(trigramas, key=lambda t: len(postings.get(t, ()))):
+            ids = postings.get(trigrama)
+            if not ids:
+                return set()
+            resultado = set(ids) if resultado is None else resultado & ids
+            if not resultado:
+                return set()
+        return resultado
+
+    def _ids_por_palavras(self, campo, palavras):
+        """Ids em que todas as palavras aparecem no campo."""
+        candidatos = None
+        for palavra in palavras:
+            ids = self._candidatos_termo(campo, palavra)
+            candidatos = ids if candidatos is None else candidatos & ids
+            if not candidatos:
+                return set()
+
+        query_normalizada = ' '.join(palavras)
+        return {
+            servidor_id for servidor_id in candidatos
+            if texto_contem_todas_palavras(self._textos_indexados[servidor_id][campo], query_normalizada)
+        }
+
+    def _ids_por_documento(self, digitos):
+        return {
+            servidor_id for servidor_id in self._candidatos_termo('documento', digitos)
+            if digitos in self._textos_indexados[servidor_id]['documento']
+        }
+
+    def _candidatos_aproximados(self, palavra):
+        """
+        Ids cujo nome pode conter a palavra com até N erros de digitação.
+
+        Filtro por contagem de bigramas: cada edição destrói no máximo dois
+        bigramas, então quem não compartilha ao menos len(bigramas) - 2 * N
+        bigramas distintos com a palavra não tem como estar a essa distância.
+        """
+        limite = limite_erros_palavra(palavra)
+        if not limite:
+            return set()
+
+        bigramas = {palavra[i:i + 2] for i in range(len(palavra) - 1)}
+        minimo = max(1, len(bigramas) - 2 * limite)
+
+        postings = self._postings['nome']
+        contagem = {}
+        for bigrama in bigramas:
+            for servidor_id in postings.get(bigrama, ()):
+                contagem[servidor_id] = contagem.get(servidor_id, 0) + 1
+        return {servidor_id for servidor_id, total in contagem.items() if total >= minimo}
+
+    def _ids_aproximados(self, palavras):
+        """Candidatos em que cada palavra casa exata ou aproximadamente no nome."""
+        candidatos = None
+        for palavra in palavras:
+            ids = self._candidatos_termo('nome', palavra) | self._candidatos_aproximados(palavra)
+            candidatos = ids if candidatos is None else candidatos & ids
+            if not candidatos:
+                return set()
+        return candidatos
+
+    def buscar(self, query, limite=10, excluir_egressos=False):
+        """
+        Busca servidores ativos e ordena pelo grau de correspondência.
+
+        Ordem: documento idêntico, nome com todas as palavras como início de
+        palavra, nome/documento contendo os termos, setor, e por fim nomes
+        com erros de digitação dentro do limite de limite_erros_palavra().
+        Empates são desfeitos pelo nome.
+
+        Returns:
+            Lista de Servidor (até `limite` itens), ou None se o índice ainda
+            não estiver disponível
+        """
+        if not self._garantir_construido():
+            return None
+
+        palavras = normalizar_texto(query).split()
+        query_digitos = normalizar_documento(query)
+
+        with self._lock:
+            ids = set()
+            if palavras:
+                ids |= self._ids_por_palavras('nome', palavras)
+                ids |= self._ids_por_palavras('setor', palavras)
+            if len(query_digitos) >= 2:
+                ids |= self._ids_por_documento(query_digitos)
+
+            # Só procura nomes aproximados se os resultados exatos não bastam
+            if palavras and len(ids) < limite:
+                ids |= self._ids_aproximados(palavras)
+
+            pontuados = []
+            for servidor_id in ids:
+                textos = self._textos_indexados[servidor_id]
+                if excluir_egressos and textos['nome'].startswith('egresso:'):
+                    continue
+                pontuacao = pontuar_servidor(textos, palavras, query_digitos)
+                if pontuacao:
+                    pontuados.append((pontuacao, self._servidores[servidor_id]))
+
+        pontuados.sort(key=lambda item: (-item[0], item[1].nome))
+        return [servidor for _, servidor in pontuados[:limite]]
+
+
+indice_servidores = IndiceServidores()
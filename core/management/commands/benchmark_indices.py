@@ -0,0 +1,188 @@
+"""
+Comando de gerenciamento que compara os planos das consultas frequentes
+antes e depois da migração de índices (0025_indices_consultas_frequentes).
+
+Usa um banco SQLite temporário (o banco configurado não é tocado): aplica as
+migrações com o core na 0024, popula dados sintéticos, mede as consultas,
+aplica a 0025 e mede de novo.
+"""
+
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from core.models import LogAuditoria, RegistroAcesso, RegistroDashboard, Servidor
+
+ALIAS_BENCHMARK = 'benchmark_indices'
+MIGRACAO_ANTES = '0024_tarefaexportacao'
+MIGRACAO_DEPOIS = '0025_indices_consultas_frequentes'
+
+
+class Command(BaseCommand):
+    help = 'Mostra planos e tempos das consultas frequentes antes/depois dos índices (SQLite temporário)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--registros',
+            type=int,
+            default=100000,
+            help='Registros de histórico e de log gerados (padrão: 100000)',
+        )
+        parser.add_argument(
+            '--servidores',
+            type=int,
+            default=5000,
+            help='Servidores gerados (padrão: 5000)',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=20,
+            help='Execuções de cada consulta para a mediana (padrão: 20)',
+        )
+
+    def handle(self, *args, **options):
+        caminho = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        connections.settings[ALIAS_BENCHMARK] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            ALIAS_BENCHMARK: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': caminho},
+        })[ALIAS_BENCHMARK]
+
+        try:
+            # Esquema completo e, no core, o estado anterior aos índices
+            call_command('migrate', database=ALIAS_BENCHMARK, verbosity=0)
+            call_command('migrate', 'core', MIGRACAO_ANTES, database=ALIAS_BENCHMARK, verbosity=0)
+            inicio = time.perf_counter()
+            parametros = self._popular(options['servidores'], options['registros'])
+            self.stdout.write(f'🌱 Dados gerados em {time.perf_counter() - inicio:.1f}s')
+
+            antes = self._medir(parametros, options['repeticoes'])
+            inicio = time.perf_counter()
+            call_command('migrate', 'core', MIGRACAO_DEPOIS, database=ALIAS_BENCHMARK, verbosity=0)
+            self.stdout.write(f'🛠️  Migração {MIGRACAO_DEPOIS} aplicada em {time.perf_counter() - inicio:.1f}s')
+            depois = self._medir(parametros, options['repeticoes'])
+
+            self._relatorio(antes, depois)
+        finally:
+            connections[ALIAS_BENCHMARK].close()
+            del connections.settings[ALIAS_BENCHMARK]
+            os.remove(caminho)
+
+    def _popular(self, total_servidores, total_registros):
+        """Gera servidores, histórico, dashboard e logs; devolve valores usados nas consultas."""
+        banco = ALIAS_BENCHMARK
+        aleatorio = random.Random(42)
+        operador = User.objects.db_manager(banco).create_user('benchmark', password=None)
+        setores = ['ALFA', 'BRAVO', 'CHARLIE', 'DELTA', 'ADMINISTRATIVO', 'SAÚDE']
+
+        Servidor.objects.using(banco).bulk_create([
+            Servidor(
+                nome=f'SERVIDOR {i:06d}',
+                numero_documento=f'{i:09d}',
+                setor=aleatorio.choice(setores),
+                ativo=aleatorio.random() > 0.1,
+            )
+            for i in range(total_servidores)
+        ], batch_size=1000)
+        ids_servidores = list(Servidor.objects.using(banco).values_list('id', flat=True))
+
+        agora = timezone.now()
+        RegistroAcesso.objects.using(banco).bulk_create([
+            RegistroAcesso(
+                servidor_id=aleatorio.choice(ids_servidores),
+                operador=operador,
+                tipo_acesso='ENTRADA',
+                data_hora=agora - timedelta(minutes=aleatorio.randrange(365 * 24 * 60)),
+                saida_pendente=False,
+            )
+            for _ in range(total_registros)
+        ], batch_size=1000)
+
+        RegistroDashboard.objects.using(banco).bulk_create([
+            RegistroDashboard(
+                servidor_id=servidor_id,
+                operador=operador,
+                tipo_acesso='ENTRADA',
+                data_hora=agora - timedelta(minutes=aleatorio.randrange(7 * 24 * 60)),
+                saida_pendente=aleatorio.random() > 0.8,
+            )
+            for servidor_id in aleatorio.sample(ids_servidores, min(len(ids_servidores), total_registros // 10))
+        ], batch_size=1000)
+
+        LogAuditoria.objects.using(banco).bulk_create([
+            LogAuditoria(usuario=operador, tipo_acao='EDICAO', modelo='Servidor', detalhes='benchmark')
+            for _ in range(total_registros)
+        ], batch_size=1000)
+        # data_hora é auto_now_add: espalha os logs pelo último ano
+        with connections[banco].cursor() as cursor:
+            cursor.execute(
+                "UPDATE core_logauditoria SET data_hora = datetime('now', '-' || (abs(random()) % 525600) || ' minutes')"
+            )
+
+        return {
+            'servidor_id': aleatorio.choice(ids_servidores),
+            'documento': f'{total_servidores // 2:09d}',
+            'periodo': (agora - timedelta(days=2), agora),
+        }
+
+    def _consultas(self, parametros):
+        """Consultas dos caminhos quentes, com o rótulo exibido no relatório."""
+        banco = ALIAS_BENCHMARK
+        inicio, fim = parametros['periodo']
+        return {
+            'Entrada pendente do servidor (dashboard)': RegistroDashboard.objects.using(banco).filter(
+                servidor_id=parametros['servidor_id'], saida_pendente=True
+            ),
+            'Registros abertos do dashboard': RegistroDashboard.objects.using(banco).filter(
+                saida_pendente=True
+            ).order_by('-data_hora'),
+            'Histórico por período': RegistroAcesso.objects.using(banco).filter(
+                data_hora__range=(inicio, fim)
+            ).order_by('data_hora', 'data_hora_alteracao'),
+            'Servidores ativos por nome (1ª página)': Servidor.objects.using(banco).filter(
+                ativo=True
+            ).order_by('nome', 'id')[:50],
+            'Servidor por número do documento': Servidor.objects.using(banco).filter(
+                numero_documento=parametros['documento']
+            ),
+            'Logs de auditoria por período': LogAuditoria.objects.using(banco).filter(
+                data_hora__range=(inicio, fim)
+            ).order_by('-data_hora'),
+        }
+
+    def _medir(self, parametros, repeticoes):
+        """Plano (EXPLAIN) e mediana do tempo de cada consulta, em ms."""
+        resultados = {}
+        for rotulo, consulta in self._consultas(parametros).items():
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                list(consulta.all())
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[rotulo] = (consulta.explain(), statistics.median(tempos))
+        return resultados
+
+    def _relatorio(self, antes, depois):
+        for rotulo, (plano_antes, tempo_antes) in antes.items():
+            plano_depois, tempo_depois = depois[rotulo]
+            self.stdout.write('\n' + '=' * 70)
+            self.stdout.write(self.style.SUCCESS(f'📊 {rotulo}'))
+            self.stdout.write('=' * 70)
+            self.stdout.write(f'Antes  ({tempo_antes:8.2f} ms):')
+            self.stdout.write(self._recuar(plano_antes))
+            self.stdout.write(f'Depois ({tempo_depois:8.2f} ms):')
+            self.stdout.write(self._recuar(plano_depois))
+        self.stdout.write('')
+
+    @staticmethod
+    def _recuar(plano):
+        return '\n'.join(f'    {linha}' for linha in plano.splitlines())
@@ -0,0 +1,206 @@
+"""
+Comando de gerenciamento que compara o SQLite padrão com o perfil de
+desempenho (settings.SQLITE_PERFIL_DESEMPENHO) sob escrita concorrente.
+
+Simula uma troca de plantão: vários terminais registram entradas ao mesmo
+tempo (verifica a entrada pendente e grava histórico + dashboard numa
+transação, como registrar_entrada_helper) enquanto o dashboard é consultado.
+Cada perfil roda num banco SQLite temporário; o banco configurado não é tocado.
+"""
+
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.utils import timezone
+
+from core.models import RegistroAcesso, RegistroDashboard, Servidor
+from core.utils import transacao_escrita
+
+PERFIS = {
+    'padrao': {},
+    'otimizado': settings.SQLITE_PERFIL_DESEMPENHO,
+}
+
+
+class Command(BaseCommand):
+    help = 'Mede travamentos e vazão de escrita do SQLite padrão x perfil de desempenho (bancos temporários)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--terminais',
+            type=int,
+            default=8,
+            help='Terminais registrando entradas ao mesmo tempo (padrão: 8)',
+        )
+        parser.add_argument(
+            '--entradas',
+            type=int,
+            default=200,
+            help='Entradas registradas por terminal (padrão: 200)',
+        )
+        parser.add_argument(
+            '--leitores',
+            type=int,
+            default=2,
+            help='Dashboards consultando os registros abertos durante a escrita (padrão: 2)',
+        )
+
+    def handle(self, *args, **options):
+        resultados = {}
+        for perfil, opcoes in PERFIS.items():
+            self.stdout.write(f'⏱️  Perfil {perfil}...')
+            resultados[perfil] = self._executar_perfil(perfil, opcoes, options)
+        self._relatorio(resultados, options)
+
+    def _executar_perfil(self, perfil, opcoes, options):
+        """Roda a simulação num banco temporário configurado com `opcoes`."""
+        alias = f'benchmark_sqlite_{perfil}'
+        caminho = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False).name
+        connections.settings[alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': caminho, 'OPTIONS': opcoes},
+        })[alias]
+
+        try:
+            call_command('migrate', database=alias, verbosity=0)
+            operador = User.objects.db_manager(alias).create_user('benchmark', password=None)
+            total = options['terminais'] * options['entradas']
+            Servidor.objects.using(alias).bulk_create([
+                Servidor(nome=f'SERVIDOR {i:06d}', numero_documento=f'{i:09d}', setor='ALFA')
+                for i in range(total)
+            ], batch_size=1000)
+            ids = list(Servidor.objects.using(alias).order_by('id').values_list('id', flat=True))
+            connections[alias].close()
+            return self._simular(alias, operador.pk, ids, options)
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+            for sufixo in ('', '-wal', '-shm'):
+                if os.path.exists(caminho + sufixo):
+                    os.remove(caminho + sufixo)
+
+    def _simular(self, alias, operador_id, ids, options):
+        """Dispara terminais e leitores juntos; devolve os contadores da rodada."""
+        contadores = {'gravadas': 0, 'travadas': 0, 'leituras': 0, 'leituras_travadas': 0}
+        latencias = []
+        trava = threading.Lock()
+        escrevendo = threading.Event()
+        escrevendo.set()
+        partida = threading.Barrier(options['terminais'] + options['leitores'] + 1)
+
+        def somar(chave, valor=1):
+            with trava:
+                contadores[chave] += valor
+
+        def terminal(servidores):
+            partida.wait()
+            try:
+                for servidor_id in servidores:
+                    inicio = time.perf_counter()
+                    try:
+                        self._registrar_entrada(alias, servidor_id, operador_id)
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        somar('travadas')
+                        continue
+                    with trava:
+                        latencias.append(time.perf_counter() - inicio)
+                    somar('gravadas')
+            finally:
+                connections[alias].close()
+
+        def leitor():
+            partida.wait()
+            try:
+                while escrevendo.is_set():
+                    try:
+                        list(RegistroDashboard.objects.using(alias).filter(
+                            saida_pendente=True
+                        ).select_related('servidor')[:200])
+                    except OperationalError as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        somar('leituras_travadas')
+                        continue
+                    somar('leituras')
+            finally:
+                connections[alias].close()
+
+        por_terminal = options['entradas']
+        terminais = [
+            threading.Thread(target=terminal, args=(ids[i * por_terminal:(i + 1) * por_terminal],))
+            for i in range(options['terminais'])
+        ]
+        leitores = [threading.Thread(target=leitor) for _ in range(options['leitores'])]
+        for thread in terminais + leitores:
+            thread.start()
+
+        partida.wait()
+        inicio = time.perf_counter()
+        for thread in terminais:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        escrevendo.clear()
+        for thread in leitores:
+            thread.join()
+
+        contadores['duracao'] = duracao
+        contadores['latencia_p50'] = statistics.median(latencias) * 1000 if latencias else 0
+        contadores['latencia_max'] = max(latencias) * 1000 if latencias else 0
+        return contadores
+
+    @staticmethod
+    def _registrar_entrada(alias, servidor_id, operador_id):
+        """Mesmo padrão de leitura + escrita de registrar_entrada_helper."""
+        with transacao_escrita(using=alias):
+            if RegistroDashboard.objects.using(alias).filter(
+                servidor_id=servidor_id, saida_pendente=True
+            ).exists():
+                return
+            agora = timezone.now()
+            historico = RegistroAcesso.objects.using(alias).create(
+                servidor_id=servidor_id,
+                operador_id=operador_id,
+                tipo_acesso='ENTRADA',
+                data_hora=agora,
+                saida_pendente=True,
+                status_alteracao='ORIGINAL',
+            )
+            RegistroDashboard.objects.using(alias).create(
+                servidor_id=servidor_id,
+                operador_id=operador_id,
+                tipo_acesso='ENTRADA',
+                data_hora=agora,
+                saida_pendente=True,
+                registro_historico=historico,
+            )
+
+    def _relatorio(self, resultados, options):
+        tentativas = options['terminais'] * options['entradas']
+        self.stdout.write('\n' + '=' * 70)
+        self.stdout.write(self.style.SUCCESS(
+            f"📊 {options['terminais']} terminais x {options['entradas']} entradas, "
+            f"{options['leitores']} leitor(es) do dashboard"
+        ))
+        self.stdout.write('=' * 70)
+        self.stdout.write(
+            f"{'Perfil':<10} {'Gravadas':>9} {'Travadas':>9} {'Tempo':>8} {'Entr./s':>8} "
+            f"{'p50 ms':>8} {'máx ms':>8} {'Leituras':>9} {'L.trav.':>8}"
+        )
+        for perfil, r in resultados.items():
+            vazao = r['gravadas'] / r['duracao'] if r['duracao'] else 0
+            self.stdout.write(
+                f"{perfil:<10} {r['gravadas']:>5}/{tentativas:<3} {r['travadas']:>9} {r['duracao']:>7.2f}s "
+                f"{vazao:>8.0f} {r['latencia_p50']:>8.1f} {r['latencia_max']:>8.1f} "
+                f"{r['leituras']:>9} {r['leituras_travadas']:>8}"
+            )
+        self.stdout.write('')
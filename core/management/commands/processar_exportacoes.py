@@ -0,0 +1,91 @@
+"""
+Comando de gerenciamento que executa as exportações em segundo plano.
+
+Roda continuamente ao lado do site (ou uma vez, com --uma-vez, para
+agendadores como o Agendador de Tarefas do Windows).
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tarefas import (
+    executar_tarefa, limpar_tarefas_antigas, reenfileirar_tarefas_interrompidas,
+    reservar_proxima_tarefa,
+)
+
+
+class Command(BaseCommand):
+    help = 'Executa as exportações enfileiradas (Excel, CSV, Parquet e PDF) em segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa as tarefas pendentes e encerra, em vez de aguardar novas',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos entre consultas à fila quando ela está vazia (padrão: 2)',
+        )
+        parser.add_argument(
+            '--retencao-dias',
+            type=int,
+            default=settings.EXPORTACAO_RETENCAO_DIAS,
+            help='Dias que os arquivos gerados ficam disponíveis (padrão: EXPORTACAO_RETENCAO_DIAS)',
+        )
+        parser.add_argument(
+            '--tempo-limite-minutos',
+            type=int,
+            default=settings.EXPORTACAO_TEMPO_LIMITE_MINUTOS,
+            help='Minutos em execução após os quais a tarefa é considerada interrompida '
+                 '(padrão: EXPORTACAO_TEMPO_LIMITE_MINUTOS)',
+        )
+
+    def handle(self, *args, **options):
+        tempo_limite = timedelta(minutes=options['tempo_limite_minutos'])
+        self._reenfileirar_interrompidas(tempo_limite)
+
+        removidas = limpar_tarefas_antigas(options['retencao_dias'])
+        if removidas:
+            self.stdout.write(f'🧹 {removidas} exportação(ões) antiga(s) removida(s)')
+
+        if not options['uma_vez']:
+            self.stdout.write(self.style.SUCCESS('⏳ Aguardando exportações (Ctrl+C para encerrar)'))
+
+        try:
+            while True:
+                close_old_connections()
+                tarefa = reservar_proxima_tarefa()
+                if tarefa is None:
+                    if options['uma_vez']:
+                        return
+                    # Fila vazia: recupera tarefas de workers que pararam no meio
+                    self._reenfileirar_interrompidas(tempo_limite)
+                    time.sleep(options['intervalo'])
+                    continue
+
+                inicio = time.monotonic()
+                tarefa = executar_tarefa(tarefa)
+                duracao = time.monotonic() - inicio
+                if tarefa.status == 'CONCLUIDA':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'✅ Tarefa {tarefa.pk} ({tarefa.tipo}/{tarefa.formato}) concluída em {duracao:.1f}s'
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(
+                        f'❌ Tarefa {tarefa.pk} ({tarefa.tipo}/{tarefa.formato}) falhou: {tarefa.mensagem}'
+                    ))
+        except KeyboardInterrupt:
+            self.stdout.write('\n👋 Worker de exportações encerrado')
+
+    def _reenfileirar_interrompidas(self, tempo_limite):
+        """Tarefas de um worker que parou no meio (além do tempo limite) voltam para a fila."""
+        reiniciadas = reenfileirar_tarefas_interrompidas(tempo_limite)
+        if reiniciadas:
+            self.stdout.write(self.style.WARNING(f'🔁 {reiniciadas} tarefa(s) interrompida(s) reenfileirada(s)'))
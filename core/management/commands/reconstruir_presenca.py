@@ -0,0 +1,25 @@
+"""
+Comando de gerenciamento que recalcula a projeção de presença
+(PresencaServidor) a partir do histórico e do dashboard.
+
+Necessário só quando registros foram alterados fora do ORM (SQL direto,
+restauração de backup); no uso normal os sinais mantêm a projeção em dia.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.presenca import reconstruir_presencas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a presença de cada servidor a partir do histórico (RegistroAcesso) e do dashboard'
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        servidores, dentro = reconstruir_presencas()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Presença de {servidores} servidor(es) recalculada em '
+            f'{time.perf_counter() - inicio:.1f}s ({dentro} dentro da unidade)'
+        ))
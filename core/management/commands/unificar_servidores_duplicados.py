@@ -0,0 +1,119 @@
+"""
+Comando de gerenciamento que unifica servidores com o mesmo documento.
+
+Servidores cujo documento tem os mesmos dígitos (documento_digitos) são o
+mesmo servidor: fica o cadastro mais antigo, os registros (histórico e
+dashboard) dos repetidos passam para ele, ele fica ativo se algum dos
+repetidos estava e os repetidos são excluídos. Cada unificação grava um
+LogAuditoria com os cadastros excluídos.
+
+Precisa rodar antes da migração 0030, que recusa documentos repetidos.
+"""
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from core.models import LogAuditoria, RegistroAcesso, RegistroDashboard, Servidor
+from core.presenca import reconstruir_presencas
+from core.utils import invalidar_dashboard_stats
+
+
+def _fechar_entradas_pendentes_repetidas(ids_servidores):
+    """
+    Deixa aberta só a entrada pendente mais recente dos servidores, como na
+    migração 0026: as anteriores recebem como saída o horário dessa entrada.
+    """
+    pendentes = RegistroDashboard.objects.filter(
+        servidor_id__in=ids_servidores, saida_pendente=True
+    ).order_by('-data_hora', '-id')
+    if len(pendentes) < 2:
+        return
+    mantido, *anteriores = pendentes
+    RegistroDashboard.objects.filter(id__in=[r.id for r in anteriores]).update(
+        saida_pendente=False, data_hora_saida=mantido.data_hora
+    )
+    RegistroAcesso.objects.filter(
+        id__in=[r.registro_historico_id for r in anteriores if r.registro_historico_id]
+    ).update(saida_pendente=False, data_hora_saida=mantido.data_hora)
+
+
+def unificar(documento_digitos, usuario):
+    """Unifica os servidores de um documento; devolve o servidor mantido."""
+    mantido, *repetidos = Servidor.objects.filter(documento_digitos=documento_digitos).order_by('id')
+    ids_repetidos = [servidor.id for servidor in repetidos]
+
+    # Uma entrada sem saída por servidor (dashboard_entrada_pendente_unica)
+    _fechar_entradas_pendentes_repetidas([mantido.id] + ids_repetidos)
+    historico = RegistroAcesso.objects.filter(servidor_id__in=ids_repetidos).update(servidor=mantido)
+    dashboard = RegistroDashboard.objects.filter(servidor_id__in=ids_repetidos).update(servidor=mantido)
+    if not mantido.ativo and any(servidor.ativo for servidor in repetidos):
+        mantido.ativo = True
+        mantido.save(update_fields=['ativo'])
+
+    detalhes = [
+        f"Servidores unificados pelo documento {documento_digitos}: "
+        f"mantido {mantido.nome} ({mantido.numero_documento}, id {mantido.id})",
+        f"Registros transferidos: {historico} do histórico, {dashboard} do dashboard",
+        'Excluídos: ' + ', '.join(
+            f"{servidor.nome} ({servidor.numero_documento}, id {servidor.id})" for servidor in repetidos
+        ),
+    ]
+    Servidor.objects.filter(id__in=ids_repetidos).delete()
+    LogAuditoria.objects.create(
+        usuario=usuario,
+        tipo_acao='EXCLUSAO',
+        modelo='Servidor',
+        objeto_id=mantido.id,
+        detalhes='\n'.join(detalhes),
+    )
+    return mantido
+
+
+class Command(BaseCommand):
+    help = 'Unifica servidores com o mesmo número de documento (mesmos dígitos) no cadastro mais antigo'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--usuario',
+            required=True,
+            help='Login registrado no LogAuditoria como responsável pela unificação',
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Só lista os documentos repetidos, sem alterar nada',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+
+        duplicados = list(
+            Servidor.objects.exclude(documento_digitos='').values('documento_digitos').annotate(
+                total=Count('id')
+            ).filter(total__gt=1).order_by('documento_digitos').values_list('documento_digitos', 'total')
+        )
+        if not duplicados:
+            self.stdout.write(self.style.SUCCESS('✅ Nenhum servidor com documento repetido'))
+            return
+
+        for documento, total in duplicados:
+            self.stdout.write(f'  {documento}: {total} servidores')
+        if options['simular']:
+            self.stdout.write(f'{len(duplicados)} documento(s) repetido(s); nada foi alterado (--simular)')
+            return
+
+        with transaction.atomic():
+            for documento, _ in duplicados:
+                unificar(documento, usuario)
+            # Os registros mudaram de servidor com update(), sem os sinais da presença
+            reconstruir_presencas()
+            transaction.on_commit(invalidar_dashboard_stats)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(duplicados)} documento(s) unificado(s); detalhes no log de auditoria'
+        ))
@@ -0,0 +1,81 @@
+"""Adiciona colunas normalizadas de busca aos servidores e preenche as existentes."""
+
+import unicodedata
+
+from django.db import migrations, models
+
+TAMANHO_LOTE = 500
+
+
+def _normalizar_texto(texto):
+    if not texto:
+        return ''
+    texto_sem_acento = unicodedata.normalize('NFD', str(texto))
+    texto_sem_acento = ''.join(
+        char for char in texto_sem_acento if unicodedata.category(char) != 'Mn'
+    )
+    return texto_sem_acento.lower()
+
+
+def _normalizar_documento(documento):
+    if not documento:
+        return ''
+    return ''.join(char for char in str(documento) if char.isdigit())
+
+
+def preencher_campos_busca(apps, schema_editor):
+    campos = ['nome_normalizado', 'setor_normalizado', 'documento_digitos']
+    for modelo_nome in ('Servidor', 'ServidorTreinamento'):
+        Model = apps.get_model('core', modelo_nome)
+        lote = []
+        for registro in Model.objects.all().iterator(chunk_size=TAMANHO_LOTE):
+            registro.nome_normalizado = _normalizar_texto(registro.nome)
+            registro.setor_normalizado = _normalizar_texto(registro.setor)
+            registro.documento_digitos = _normalizar_documento(registro.numero_documento)
+            lote.append(registro)
+            if len(lote) >= TAMANHO_LOTE:
+                Model.objects.bulk_update(lote, campos)
+                lote = []
+        if lote:
+            Model.objects.bulk_update(lote, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_corrigir_prefixo_egresso_nome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servidor',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='servidor',
+            name='setor_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='servidor',
+            name='documento_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='servidortreinamento',
+            name='nome_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='servidortreinamento',
+            name='setor_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='servidortreinamento',
+            name='documento_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(preencher_campos_busca, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.6 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_servidor_campos_busca_normalizados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registro_id', models.BigIntegerField(db_index=True)),
+                ('tipo', models.CharField(choices=[('ALTERACAO', 'Alteração'), ('EXCLUSAO', 'Exclusão')], max_length=10)),
+                ('data_hora', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Alteração do Dashboard',
+                'verbose_name_plural': 'Alterações do Dashboard',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.6 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_alteracaodashboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registroacessotreinamento',
+            name='data_hora_modificacao',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
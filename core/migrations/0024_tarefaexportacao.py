@@ -0,0 +1,39 @@
+# Generated by Django 6.0.6 on 2026-10-18 16:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_registroacessotreinamento_data_hora_modificacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaExportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('HISTORICO', 'Histórico'), ('DASHBOARD', 'Dashboard'), ('REGISTROS', 'Registros selecionados (admin)'), ('FALTAS', 'Relatório de faltas (PDF)')], max_length=10)),
+                ('formato', models.CharField(max_length=10)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], db_index=True, default='PENDENTE', max_length=10)),
+                ('progresso', models.PositiveSmallIntegerField(default=0)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('arquivo', models.FileField(blank=True, upload_to='exportacoes/')),
+                ('nome_arquivo', models.CharField(blank=True, default='', max_length=150)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_inicio', models.DateTimeField(blank=True, null=True)),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tarefas_exportacao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Exportação',
+                'verbose_name_plural': 'Tarefas de Exportação',
+                'ordering': ['-data_criacao'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+"""
+Índices das consultas frequentes.
+
+O documento único por servidor fica na 0030 (sobre os dígitos do documento).
+"""
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_tarefaexportacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logauditoria',
+            index=models.Index(fields=['data_hora'], name='log_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroacesso',
+            index=models.Index(fields=['data_hora', 'data_hora_alteracao'], name='registro_periodo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrodashboard',
+            index=models.Index(fields=['servidor', 'saida_pendente'], name='dashboard_servidor_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrodashboard',
+            index=models.Index(condition=models.Q(('saida_pendente', True)), fields=['data_hora'], name='dashboard_pendentes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servidor',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['nome', 'id'], name='servidor_ativo_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+"""
+No máximo uma entrada sem saída por servidor no dashboard.
+
+Entradas pendentes repetidas (cliques simultâneos em dois terminais) são
+resolvidas antes da restrição: fica aberta a mais recente e as anteriores
+recebem como saída o horário dessa nova entrada, no dashboard e no histórico.
+"""
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fechar_entradas_pendentes_repetidas(apps, schema_editor):
+    RegistroDashboard = apps.get_model('core', 'RegistroDashboard')
+    RegistroAcesso = apps.get_model('core', 'RegistroAcesso')
+
+    repetidos = RegistroDashboard.objects.filter(saida_pendente=True).values('servidor_id').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('servidor_id', flat=True)
+
+    for servidor_id in list(repetidos):
+        mantido, *anteriores = RegistroDashboard.objects.filter(
+            servidor_id=servidor_id, saida_pendente=True
+        ).order_by('-data_hora', '-id')
+        RegistroDashboard.objects.filter(id__in=[r.id for r in anteriores]).update(
+            saida_pendente=False, data_hora_saida=mantido.data_hora
+        )
+        RegistroAcesso.objects.filter(
+            id__in=[r.registro_historico_id for r in anteriores if r.registro_historico_id]
+        ).update(saida_pendente=False, data_hora_saida=mantido.data_hora)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_indices_consultas_frequentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fechar_entradas_pendentes_repetidas, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='registrodashboard',
+            name='dashboard_servidor_pend_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='registrodashboard',
+            constraint=models.UniqueConstraint(condition=models.Q(('saida_pendente', True)), fields=('servidor',), name='dashboard_entrada_pendente_unica', violation_error_message='Este servidor já possui uma entrada sem saída registrada. Registre a saída antes de fazer uma nova entrada.'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.6 on 2026-10-18 16:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_presencas(apps, schema_editor):
+    from core.presenca import reconstruir_presencas
+
+    reconstruir_presencas(using=schema_editor.connection.alias, apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_entrada_pendente_unica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresencaServidor',
+            fields=[
+                ('servidor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='presenca', serialize=False, to='core.servidor')),
+                ('dentro', models.BooleanField(default=False)),
+                ('ultima_entrada', models.DateTimeField(blank=True, null=True)),
+                ('ultima_saida', models.DateTimeField(blank=True, null=True)),
+                ('registro_pendente_id', models.BigIntegerField(blank=True, null=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Presença do Servidor',
+                'verbose_name_plural': 'Presenças dos Servidores',
+            },
+        ),
+        migrations.RunPython(popular_presencas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.6 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_presencaservidor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('operacao', models.CharField(max_length=30)),
+                ('status_code', models.PositiveSmallIntegerField(default=200)),
+                ('resposta', models.JSONField(blank=True, default=dict)),
+                ('data_hora', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('operador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chave de Idempotência',
+                'verbose_name_plural': 'Chaves de Idempotência',
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.6 on 2026-10-18 16:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_chaveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PreviaImportacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('dados', models.JSONField()),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Prévia de Importação',
+                'verbose_name_plural': 'Prévias de Importação',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+"""
+Documento único por servidor, comparado pelos dígitos (documento_digitos).
+
+"12.345.678-9" e "123456789" são o mesmo documento, como na busca e na
+importação. Documentos sem nenhum dígito ficam de fora da restrição.
+
+Se já houver servidores repetidos a migração para e lista os documentos: a
+unificação apaga cadastros e move registros, então é feita de propósito com
+`manage.py unificar_servidores_duplicados` (que grava LogAuditoria) antes de
+migrar de novo.
+"""
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_documentos_duplicados(apps, schema_editor):
+    Servidor = apps.get_model('core', 'Servidor')
+
+    duplicados = list(
+        Servidor.objects.exclude(documento_digitos='').values('documento_digitos').annotate(
+            total=Count('id')
+        ).filter(total__gt=1).order_by('documento_digitos').values_list('documento_digitos', 'total')
+    )
+    if duplicados:
+        lista = '\n'.join(f'  {documento} ({total} servidores)' for documento, total in duplicados)
+        raise RuntimeError(
+            'Há servidores com o mesmo número de documento:\n'
+            f'{lista}\n'
+            'Unifique-os com "python manage.py unificar_servidores_duplicados --usuario <login>" '
+            'e rode a migração de novo.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_previaimportacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(verificar_documentos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='servidor',
+            constraint=models.UniqueConstraint(condition=models.Q(('documento_digitos', ''), _negated=True), fields=('documento_digitos',), name='servidor_documento_unico', violation_error_message='Já existe um servidor com este número de documento.'),
+        ),
+    ]
@@ -1,9 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 
-from core.utils import texto_caixa_alta, texto_caixa_alta_nome_servidor
+from core.utils import (
+    normalizar_documento,
+    normalizar_texto,
+    texto_caixa_alta,
+    texto_caixa_alta_nome_servidor,
+)
+
+CAMPOS_ORIGEM_BUSCA = {'nome', 'setor', 'numero_documento'}
+CAMPOS_BUSCA_NORMALIZADOS = {'nome_normalizado', 'setor_normalizado', 'documento_digitos'}
 
 
 class CamposNomeSetorMaiusculasMixin:
@@ -15,6 +24,21 @@ class CamposNomeSetorMaiusculasMixin:
         if self.setor:
             self.setor = texto_caixa_alta(self.setor)
 
+    def _atualizar_campos_busca(self, save_kwargs):
+        """
+        Recalcula as colunas normalizadas usadas na busca de servidores.
+
+        Se o save() vier com update_fields tocando nome, setor ou documento,
+        as colunas derivadas entram na lista para não ficarem defasadas.
+        """
+        self.nome_normalizado = normalizar_texto(self.nome)
+        self.setor_normalizado = normalizar_texto(self.setor)
+        self.documento_digitos = normalizar_documento(self.numero_documento)
+
+        update_fields = save_kwargs.get('update_fields')
+        if update_fields is not None and CAMPOS_ORIGEM_BUSCA & set(update_fields):
+            save_kwargs['update_fields'] = set(update_fields) | CAMPOS_BUSCA_NORMALIZADOS
+
 
 class CampoSetorMaiusculasMixin:
     """Normaliza setor para caixa alta antes de persistir."""
@@ -57,10 +81,22 @@ class Servidor(CamposNomeSetorMaiusculasMixin, models.Model):
         ]
     )
     ativo = models.BooleanField(default=True)
+    # Colunas derivadas para a busca (sem acentos/minúsculas e só dígitos)
+    nome_normalizado = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    setor_normalizado = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    documento_digitos = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
 
     def save(self, *args, **kwargs):
         self._aplicar_caixa_alta_nome_setor()
+        self._atualizar_campos_busca(kwargs)
         super().save(*args, **kwargs)
+
+    def clean(self):
+        # documento_digitos não está nos formulários, então sem isto a
+        # restrição servidor_documento_unico só apareceria como IntegrityError
+        digitos = normalizar_documento(self.numero_documento)
+        if digitos and Servidor.objects.filter(documento_digitos=digitos).exclude(pk=self.pk).exists():
+            raise ValidationError({'numero_documento': 'Já existe um servidor com este número de documento.'})
     
     def __str__(self):
         return f"{self.nome} ({self.numero_documento})"
@@ -69,6 +105,19 @@ class Servidor(CamposNomeSetorMaiusculasMixin, models.Model):
         verbose_name = 'Servidor'
         verbose_name_plural = 'Servidores'
         ordering = ['nome']
+        indexes = [
+            # Listagem e busca: só servidores ativos, ordenados por nome
+            models.Index(fields=['nome', 'id'], condition=models.Q(ativo=True), name='servidor_ativo_nome_idx'),
+        ]
+        constraints = [
+            # Pelos dígitos: "12.345.678-9" e "123456789" são o mesmo documento
+            models.UniqueConstraint(
+                fields=['documento_digitos'],
+                condition=~models.Q(documento_digitos=''),
+                name='servidor_documento_unico',
+                violation_error_message='Já existe um servidor com este número de documento.',
+            ),
+        ]
 
 class RegistroAcesso(CampoSetorMaiusculasMixin, models.Model):
     TIPO_ACESSO_CHOICES = [
@@ -112,6 +161,10 @@ class RegistroAcesso(CampoSetorMaiusculasMixin, models.Model):
         verbose_name = 'Histórico'
         verbose_name_plural = 'Histórico'
         ordering = ['-data_hora']
+        indexes = [
+            # Histórico: filtro por período na ordem da tela/exportação
+            models.Index(fields=['data_hora', 'data_hora_alteracao'], name='registro_periodo_idx'),
+        ]
 
 class RegistroDashboard(CampoSetorMaiusculasMixin, models.Model):
     """
@@ -149,6 +202,98 @@ class RegistroDashboard(CampoSetorMaiusculasMixin, models.Model):
         verbose_name = 'Dashboard'
         verbose_name_plural = 'Dashboard'
         ordering = ['-data_hora']
+        indexes = [
+            # Registros ainda abertos, do mais recente para o mais antigo
+            models.Index(fields=['data_hora'], condition=models.Q(saida_pendente=True), name='dashboard_pendentes_idx'),
+        ]
+        constraints = [
+            # No máximo uma entrada sem saída por servidor (também serve de
+            # índice para a consulta da entrada pendente)
+            models.UniqueConstraint(
+                fields=['servidor'],
+                condition=models.Q(saida_pendente=True),
+                name='dashboard_entrada_pendente_unica',
+                violation_error_message=(
+                    'Este servidor já possui uma entrada sem saída registrada. '
+                    'Registre a saída antes de fazer uma nova entrada.'
+                ),
+            ),
+        ]
+
+class AlteracaoDashboard(models.Model):
+    """
+    Log sequencial das alterações em RegistroDashboard.
+
+    O id autoincremental funciona como cursor do feed incremental de
+    registros_plantao: o cliente pede o que mudou depois do último id que
+    recebeu. Exclusões ficam registradas como marcas (tombstones) para que o
+    cliente remova as linhas correspondentes.
+    """
+    TIPO_CHOICES = [
+        ('ALTERACAO', 'Alteração'),
+        ('EXCLUSAO', 'Exclusão'),
+    ]
+
+    registro_id = models.BigIntegerField(db_index=True)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    data_hora = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} do registro {self.registro_id} ({self.id})"
+
+    class Meta:
+        verbose_name = 'Alteração do Dashboard'
+        verbose_name_plural = 'Alterações do Dashboard'
+        ordering = ['id']
+
+class PresencaServidor(models.Model):
+    """
+    Estado de presença de cada servidor (uma linha por servidor).
+
+    Projeção mantida pelos sinais de RegistroDashboard, na mesma transação do
+    registro (ver core/presenca.py): "o servidor está na unidade?" vira uma
+    busca pela chave primária, sem percorrer o histórico.
+    Reconstruída com manage.py reconstruir_presenca.
+    """
+    servidor = models.OneToOneField(
+        Servidor, on_delete=models.CASCADE, primary_key=True, related_name='presenca'
+    )
+    dentro = models.BooleanField(default=False)
+    ultima_entrada = models.DateTimeField(null=True, blank=True)
+    ultima_saida = models.DateTimeField(null=True, blank=True)
+    # Id do RegistroDashboard da entrada sem saída (sem FK, como em
+    # AlteracaoDashboard: a linha do dashboard pode ser excluída)
+    registro_pendente_id = models.BigIntegerField(null=True, blank=True)
+    data_atualizacao = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.servidor.nome} - {'dentro' if self.dentro else 'fora'}"
+
+    class Meta:
+        verbose_name = 'Presença do Servidor'
+        verbose_name_plural = 'Presenças dos Servidores'
+
+class ChaveIdempotencia(models.Model):
+    """
+    Chave gerada pelo terminal da portaria para cada ação de registro.
+
+    A retentativa de uma requisição (rede instável, fila offline) repete a
+    chave; o índice único faz a repetição devolver a resposta gravada em vez
+    de registrar de novo (ver core/idempotencia.py).
+    """
+    chave = models.CharField(max_length=64, unique=True)
+    operador = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    operacao = models.CharField(max_length=30)
+    status_code = models.PositiveSmallIntegerField(default=200)
+    resposta = models.JSONField(default=dict, blank=True)
+    data_hora = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.operacao} - {self.chave}"
+
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
 
 class LogAuditoria(models.Model):
     TIPO_ACAO_CHOICES = [
@@ -171,6 +316,9 @@ class LogAuditoria(models.Model):
         verbose_name = 'Log de Auditoria'
         verbose_name_plural = 'Logs de Auditoria'
         ordering = ['-data_hora']
+        indexes = [
+            models.Index(fields=['data_hora'], name='log_data_hora_idx'),
+        ]
 
 class ServidorTreinamento(CamposNomeSetorMaiusculasMixin, models.Model):
     """
@@ -208,9 +356,14 @@ class ServidorTreinamento(CamposNomeSetorMaiusculasMixin, models.Model):
         ]
     )
     ativo = models.BooleanField(default=True)
+    # Colunas derivadas para a busca (sem acentos/minúsculas e só dígitos)
+    nome_normalizado = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    setor_normalizado = models.CharField(max_length=100, blank=True, default='', editable=False, db_index=True)
+    documento_digitos = models.CharField(max_length=20, blank=True, default='', editable=False, db_index=True)
 
     def save(self, *args, **kwargs):
         self._aplicar_caixa_alta_nome_setor()
+        self._atualizar_campos_busca(kwargs)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -242,6 +395,8 @@ class RegistroAcessoTreinamento(CampoSetorMaiusculasMixin, models.Model):
     operador_saida = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name='registros_saida_treinamento')
     observacao_saida = models.TextField(null=True, blank=True)
     saida_pendente = models.BooleanField(default=True)
+    # Usada na versão (ETag) de registros_plantao_treinamento
+    data_hora_modificacao = models.DateTimeField(auto_now=True, null=True, editable=False)
     
     def __str__(self):
         return f"{self.servidor.nome} - {self.get_tipo_acesso_display()} em {self.data_hora}"
@@ -344,3 +499,65 @@ class PerfilUsuario(models.Model):
     class Meta:
         verbose_name = 'Perfil de Usuário'
         verbose_name_plural = 'Perfis de Usuários'
+
+
+class TarefaExportacao(models.Model):
+    """
+    Exportação executada em segundo plano pelo worker (manage.py processar_exportacoes).
+
+    A própria tabela é a fila: a view cria a tarefa PENDENTE e o worker a
+    executa, gravando o arquivo em MEDIA_ROOT/exportacoes/.
+    """
+    TIPO_CHOICES = [
+        ('HISTORICO', 'Histórico'),
+        ('DASHBOARD', 'Dashboard'),
+        ('REGISTROS', 'Registros selecionados (admin)'),
+        ('FALTAS', 'Relatório de faltas (PDF)'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tarefas_exportacao')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    formato = models.CharField(max_length=10)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDENTE', db_index=True)
+    progresso = models.PositiveSmallIntegerField(default=0)
+    mensagem = models.TextField(blank=True, default='')
+    arquivo = models.FileField(upload_to='exportacoes/', blank=True)
+    nome_arquivo = models.CharField(max_length=150, blank=True, default='')
+    data_criacao = models.DateTimeField(auto_now_add=True)
+    data_inicio = models.DateTimeField(null=True, blank=True)
+    data_conclusao = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.formato}) - {self.get_status_display()}"
+
+    class Meta:
+        verbose_name = 'Tarefa de Exportação'
+        verbose_name_plural = 'Tarefas de Exportação'
+        ordering = ['-data_criacao']
+
+class PreviaImportacao(models.Model):
+    """
+    Prévia da importação de servidores aguardando confirmação (core/importacao.py).
+
+    Fica no banco, e não no cache em memória, para sobreviver à reciclagem do
+    processo entre a prévia e a confirmação. Expira após
+    VALIDADE_PREVIA_IMPORTACAO.
+    """
+    token = models.CharField(max_length=32, unique=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    dados = models.JSONField()
+    data_criacao = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Prévia {self.token} ({self.usuario})"
+
+    class Meta:
+        verbose_name = 'Prévia de Importação'
+        verbose_name_plural = 'Prévias de Importação'
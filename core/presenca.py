@@ -0,0 +1,146 @@
+"""
+Projeção de presença dos servidores (PresencaServidor).
+
+Os sinais de RegistroDashboard chamam aplicar_registro_dashboard e
+remover_registro_dashboard na mesma transação do registro (entrada, saída,
+saída definitiva, edição e exclusão), então a linha do servidor acompanha o
+dashboard sem consultar o histórico. As verificações de "está na unidade?"
+(servidor_esta_dentro, verificar_entrada, determinar_tipo_acesso) viram uma
+busca pela chave primária.
+
+Alterações fora do ORM (SQL direto, restauração de backup) deixam a projeção
+desatualizada: manage.py reconstruir_presenca recalcula tudo.
+"""
+
+from django.apps import apps as django_apps
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import PresencaServidor
+
+
+def _gravar(servidor_id, using, **campos):
+    """Atualiza a linha do servidor com `campos`, criando-a se ainda não existir."""
+    campos['data_atualizacao'] = timezone.now()
+    presencas = PresencaServidor.objects.using(using)
+    if not presencas.filter(servidor_id=servidor_id).update(**campos):
+        presencas.create(servidor_id=servidor_id, **campos)
+
+
+def aplicar_registro_dashboard(registro, using=DEFAULT_DB_ALIAS):
+    """Reflete na presença do servidor um RegistroDashboard criado ou alterado."""
+    if registro.tipo_acesso == 'SAIDA':
+        # Saída definitiva: não há entrada associada
+        _gravar(registro.servidor_id, using, ultima_saida=registro.data_hora)
+    elif registro.saida_pendente:
+        _gravar(
+            registro.servidor_id,
+            using,
+            dentro=True,
+            ultima_entrada=registro.data_hora,
+            registro_pendente_id=registro.pk,
+        )
+    else:
+        # Saída registrada (ou incluída numa edição) na entrada pendente
+        PresencaServidor.objects.using(using).filter(
+            servidor_id=registro.servidor_id, registro_pendente_id=registro.pk
+        ).update(
+            dentro=False,
+            registro_pendente_id=None,
+            ultima_saida=registro.data_hora_saida,
+            data_atualizacao=timezone.now(),
+        )
+
+
+def aplicar_entradas_em_lote(registros, using=DEFAULT_DB_ALIAS):
+    """Presença das entradas gravadas com bulk_create, que não dispara os sinais."""
+    agora = timezone.now()
+    PresencaServidor.objects.using(using).bulk_create(
+        [
+            PresencaServidor(
+                servidor_id=registro.servidor_id,
+                dentro=True,
+                ultima_entrada=registro.data_hora,
+                registro_pendente_id=registro.pk,
+                data_atualizacao=agora,
+            )
+            for registro in registros
+        ],
+        update_conflicts=True,
+        unique_fields=['servidor'],
+        update_fields=['dentro', 'ultima_entrada', 'registro_pendente_id', 'data_atualizacao'],
+    )
+
+
+def remover_registro_dashboard(registro, using=DEFAULT_DB_ALIAS):
+    """Entrada pendente excluída do dashboard: o servidor deixa de constar dentro."""
+    PresencaServidor.objects.using(using).filter(
+        servidor_id=registro.servidor_id, registro_pendente_id=registro.pk
+    ).update(dentro=False, registro_pendente_id=None, data_atualizacao=timezone.now())
+
+
+def presenca_do_servidor(servidor_id):
+    """PresencaServidor do servidor ou None se ele nunca teve registro."""
+    return PresencaServidor.objects.filter(pk=servidor_id).first()
+
+
+def servidor_esta_dentro(servidor_id):
+    """True se o servidor tem uma entrada sem saída."""
+    return PresencaServidor.objects.filter(pk=servidor_id, dentro=True).exists()
+
+
+def reconstruir_presencas(using=DEFAULT_DB_ALIAS, apps=None):
+    """
+    Recalcula a projeção de todos os servidores.
+
+    Última entrada e última saída vêm do histórico (RegistroAcesso, sem os
+    excluídos); "dentro" e o registro pendente vêm da entrada sem saída do
+    dashboard, a mesma que registrar_entrada_helper respeita.
+
+    Args:
+        using: Alias do banco
+        apps: Registro de modelos (o da migração, ao rodar dentro de uma)
+
+    Returns:
+        Tuple (servidores: int, dentro: int)
+    """
+    apps = apps or django_apps
+    Servidor = apps.get_model('core', 'Servidor')
+    RegistroAcesso = apps.get_model('core', 'RegistroAcesso')
+    RegistroDashboard = apps.get_model('core', 'RegistroDashboard')
+    Presenca = apps.get_model('core', 'PresencaServidor')
+
+    historico = RegistroAcesso.objects.using(using).exclude(status_alteracao='EXCLUIDO')
+    ultimas_entradas = dict(
+        historico.filter(tipo_acesso='ENTRADA').values('servidor_id').annotate(
+            ultima=Max('data_hora')
+        ).values_list('servidor_id', 'ultima')
+    )
+    ultimas_saidas = dict(
+        historico.filter(data_hora_saida__isnull=False).values('servidor_id').annotate(
+            ultima=Max('data_hora_saida')
+        ).values_list('servidor_id', 'ultima')
+    )
+    pendentes = dict(
+        RegistroDashboard.objects.using(using).filter(
+            tipo_acesso='ENTRADA', saida_pendente=True
+        ).values_list('servidor_id', 'id')
+    )
+
+    agora = timezone.now()
+    with transaction.atomic(using=using):
+        Presenca.objects.using(using).all().delete()
+        Presenca.objects.using(using).bulk_create([
+            Presenca(
+                servidor_id=servidor_id,
+                dentro=servidor_id in pendentes,
+                ultima_entrada=ultimas_entradas.get(servidor_id),
+                ultima_saida=ultimas_saidas.get(servidor_id),
+                registro_pendente_id=pendentes.get(servidor_id),
+                data_atualizacao=agora,
+            )
+            for servidor_id in Servidor.objects.using(using).values_list('id', flat=True).iterator()
+        ], batch_size=1000)
+
+    return Presenca.objects.using(using).count(), len(pendentes)
@@ -0,0 +1,71 @@
+"""
+Sinais do app core.
+
+Mantêm caches em memória e projeções (feed do dashboard, presença) coerentes
+com o banco após gravações feitas pelo ORM.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .indice_busca import indice_servidores
+from .presenca import aplicar_registro_dashboard, remover_registro_dashboard
+from .models import AlteracaoDashboard, RegistroAcessoTreinamento, RegistroDashboard, Servidor
+from .utils import anotar_alteracoes_servidores_dashboard, invalidar_dashboard_stats
+
+
+@receiver(post_save, sender=Servidor)
+def atualizar_indice_servidor(sender, instance, **kwargs):
+    """Reflete no índice de busca o servidor recém-salvo (após o commit)."""
+    transaction.on_commit(lambda: indice_servidores.atualizar(instance))
+    # Nome, setor e situação aparecem nas linhas do dashboard
+    anotar_alteracoes_servidores_dashboard([instance.pk])
+    # Ativar/inativar um servidor muda quais registros contam no dashboard
+    transaction.on_commit(invalidar_dashboard_stats)
+
+
+@receiver(post_delete, sender=Servidor)
+def remover_indice_servidor(sender, instance, **kwargs):
+    """Retira do índice de busca o servidor excluído (após o commit)."""
+    servidor_id = instance.pk
+    transaction.on_commit(lambda: indice_servidores.remover(servidor_id))
+
+
+@receiver(post_save, sender=RegistroDashboard)
+@receiver(post_delete, sender=RegistroDashboard)
+def invalidar_totais_dashboard(sender, **kwargs):
+    """Descarta os contadores em cache do dashboard de produção."""
+    transaction.on_commit(invalidar_dashboard_stats)
+
+
+@receiver(post_save, sender=RegistroDashboard)
+def registrar_alteracao_dashboard(sender, instance, using, **kwargs):
+    """Anota no feed incremental que o registro foi criado ou alterado."""
+    # Gravado no mesmo banco e transação: se ela for desfeita, a anotação também é
+    AlteracaoDashboard.objects.using(using).create(registro_id=instance.pk, tipo='ALTERACAO')
+
+
+@receiver(post_delete, sender=RegistroDashboard)
+def registrar_exclusao_dashboard(sender, instance, using, **kwargs):
+    """Anota no feed incremental a remoção do registro (tombstone)."""
+    AlteracaoDashboard.objects.using(using).create(registro_id=instance.pk, tipo='EXCLUSAO')
+
+
+@receiver(post_save, sender=RegistroDashboard)
+def atualizar_presenca_servidor(sender, instance, using, **kwargs):
+    """Atualiza a presença do servidor na mesma transação do registro."""
+    aplicar_registro_dashboard(instance, using)
+
+
+@receiver(post_delete, sender=RegistroDashboard)
+def remover_presenca_servidor(sender, instance, using, **kwargs):
+    """Entrada pendente excluída: o servidor deixa de constar dentro."""
+    remover_registro_dashboard(instance, using)
+
+
+@receiver(post_save, sender=RegistroAcessoTreinamento)
+@receiver(post_delete, sender=RegistroAcessoTreinamento)
+def invalidar_totais_treinamento(sender, **kwargs):
+    """Descarta os contadores em cache do dashboard de treinamento."""
+    transaction.on_commit(lambda: invalidar_dashboard_stats(is_treinamento=True))
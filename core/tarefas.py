@@ -0,0 +1,266 @@
+"""
+Fila de exportações em segundo plano, apoiada no próprio banco.
+
+A view cria uma TarefaExportacao PENDENTE e responde na hora; o worker
+(manage.py processar_exportacoes) reserva a tarefa com um UPDATE condicional,
+gera o arquivo em MEDIA_ROOT/exportacoes/ e registra progresso e status.
+Não há broker: basta o worker rodar ao lado do site (ver
+docs/INSTALACAO_PRODUCAO.md).
+
+O arquivo recebe um nome aleatório, pois o MEDIA é servido sem autenticação;
+o download passa pela view download_exportacao, que confere o dono.
+"""
+
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+import pytz
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .exportacao import gravar_csv, gravar_parquet, gravar_xlsx, parquet_disponivel
+from .models import TarefaExportacao
+
+logger = logging.getLogger(__name__)
+
+# Extensão do arquivo gerado por formato
+EXTENSOES = {'excel': 'xlsx', 'csv': 'csv', 'parquet': 'parquet', 'pdf': 'pdf'}
+
+# Linhas processadas entre duas gravações do progresso
+INTERVALO_PROGRESSO = 500
+
+# Executores registrados por tipo de tarefa (ver @executor)
+EXECUTORES = {}
+
+
+def executor(tipo):
+    """Registra a função que gera o arquivo das tarefas de `tipo`."""
+    def registrar(funcao):
+        EXECUTORES[tipo] = funcao
+        return funcao
+    return registrar
+
+
+def enfileirar_exportacao(usuario, tipo, formato, parametros=None):
+    """
+    Cria uma tarefa PENDENTE para o worker.
+
+    Args:
+        usuario: Usuário que solicitou (único, além de superusuários, que pode baixar)
+        tipo: Um de TarefaExportacao.TIPO_CHOICES
+        formato: Chave de EXTENSOES
+        parametros: Dict serializável em JSON com os filtros da exportação
+
+    Returns:
+        TarefaExportacao criada
+    """
+    if tipo not in EXECUTORES:
+        raise ValueError(f'Tipo de exportação desconhecido: {tipo}')
+    if formato not in EXTENSOES:
+        raise ValueError(f'Formato de exportação desconhecido: {formato}')
+    return TarefaExportacao.objects.create(
+        usuario=usuario, tipo=tipo, formato=formato, parametros=parametros or {}
+    )
+
+
+def reservar_proxima_tarefa():
+    """
+    Reserva a tarefa PENDENTE mais antiga para este worker.
+
+    O UPDATE só vale se a tarefa ainda estiver PENDENTE, então dois workers
+    nunca executam a mesma tarefa.
+
+    Returns:
+        TarefaExportacao reservada ou None se a fila estiver vazia
+    """
+    while True:
+        tarefa_id = TarefaExportacao.objects.filter(
+            status='PENDENTE'
+        ).order_by('data_criacao', 'id').values_list('id', flat=True).first()
+        if tarefa_id is None:
+            return None
+        reservada = TarefaExportacao.objects.filter(pk=tarefa_id, status='PENDENTE').update(
+            status='EXECUTANDO', data_inicio=timezone.now(), progresso=0
+        )
+        if reservada:
+            return TarefaExportacao.objects.select_related('usuario').get(pk=tarefa_id)
+
+
+def reenfileirar_tarefas_interrompidas(tempo_limite):
+    """
+    Devolve à fila as tarefas EXECUTANDO reservadas há mais de `tempo_limite`.
+
+    Só o tempo distingue um worker que parou no meio de um que ainda está
+    gerando o arquivo, então o limite precisa ser maior que a exportação mais
+    longa (EXPORTACAO_TEMPO_LIMITE_MINUTOS). Tarefas recentes de outro worker
+    em execução não são tocadas.
+
+    Returns:
+        Quantidade de tarefas reenfileiradas
+    """
+    return TarefaExportacao.objects.filter(
+        status='EXECUTANDO', data_inicio__lt=timezone.now() - tempo_limite
+    ).update(status='PENDENTE', progresso=0, data_inicio=None)
+
+
+def _acompanhar(tarefa, linhas, total):
+    """Repassa as linhas, gravando o progresso (até 99%) a cada INTERVALO_PROGRESSO."""
+    for indice, linha in enumerate(linhas, start=1):
+        if total and indice % INTERVALO_PROGRESSO == 0:
+            progresso = min(99, indice * 100 // total)
+            TarefaExportacao.objects.filter(pk=tarefa.pk).update(progresso=progresso)
+        yield linha
+
+
+def executar_tarefa(tarefa):
+    """
+    Gera o arquivo de uma tarefa já reservada e registra o resultado.
+
+    Erros não são propagados: a tarefa fica com status ERRO e a mensagem.
+    """
+    extensao = EXTENSOES[tarefa.formato]
+    caminho_relativo = f'exportacoes/{uuid.uuid4().hex}.{extensao}'
+    caminho = default_storage.path(caminho_relativo)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    try:
+        with open(caminho, 'wb') as destino:
+            nome_arquivo = EXECUTORES[tarefa.tipo](tarefa, destino)
+    except Exception as exc:
+        logger.exception('Falha na exportação em segundo plano %s', tarefa.pk)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        tarefa.status = 'ERRO'
+        tarefa.mensagem = str(exc)
+        tarefa.data_conclusao = timezone.now()
+        tarefa.save(update_fields=['status', 'mensagem', 'data_conclusao'])
+        return tarefa
+
+    tarefa.arquivo.name = caminho_relativo
+    tarefa.nome_arquivo = nome_arquivo
+    tarefa.status = 'CONCLUIDA'
+    tarefa.progresso = 100
+    tarefa.data_conclusao = timezone.now()
+    tarefa.save(update_fields=['arquivo', 'nome_arquivo', 'status', 'progresso', 'data_conclusao'])
+    return tarefa
+
+
+def serializar_tarefa(tarefa):
+    """Dados de status da tarefa para o JSON consultado pelo navegador."""
+    return {
+        'id': tarefa.pk,
+        'tipo': tarefa.tipo,
+        'formato': tarefa.formato,
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'progresso': tarefa.progresso,
+        'mensagem': tarefa.mensagem,
+        'nome_arquivo': tarefa.nome_arquivo,
+        'status_url': reverse('status_exportacao', args=[tarefa.pk]),
+        'download_url': (
+            reverse('download_exportacao', args=[tarefa.pk])
+            if tarefa.status == 'CONCLUIDA' else None
+        ),
+    }
+
+
+def limpar_tarefas_antigas(dias):
+    """
+    Remove tarefas finalizadas há mais de `dias` dias, junto com os arquivos.
+
+    Returns:
+        Quantidade de tarefas removidas
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    antigas = TarefaExportacao.objects.filter(
+        Q(status__in=['CONCLUIDA', 'ERRO']),
+        Q(data_conclusao__lt=limite) | Q(data_conclusao__isnull=True, data_criacao__lt=limite),
+    )
+    total = 0
+    for tarefa in antigas:
+        if tarefa.arquivo:
+            tarefa.arquivo.delete(save=False)
+        tarefa.delete()
+        total += 1
+    return total
+
+
+@executor('HISTORICO')
+def _exportar_historico(tarefa, destino):
+    """Histórico filtrado (filtros efetivos da tela, com o intervalo resolvido) em Excel, CSV ou Parquet."""
+    from .utils import COLUNAS_EXPORTACAO_HISTORICO, filtrar_historico, linhas_exportacao_historico
+
+    tz = pytz.timezone('America/Manaus')
+    registros, filtros = filtrar_historico(tarefa.parametros, tz)
+    linhas = _acompanhar(tarefa, linhas_exportacao_historico(registros, tz), registros.count())
+    cabecalho = list(COLUNAS_EXPORTACAO_HISTORICO.values())
+
+    if tarefa.formato == 'excel':
+        gravar_xlsx(destino, linhas, cabecalho, titulo_planilha='Histórico')
+    elif tarefa.formato == 'csv':
+        gravar_csv(destino, linhas, cabecalho)
+    elif tarefa.formato == 'parquet':
+        if not parquet_disponivel():
+            raise ImportError('o pacote pyarrow não está instalado no servidor')
+        gravar_parquet(destino, linhas, cabecalho)
+    else:
+        raise ValueError(f'Formato não suportado para o histórico: {tarefa.formato}')
+
+    extensao = EXTENSOES[tarefa.formato]
+    return f"historico_{filtros['data_inicio']}_{filtros['data_fim']}.{extensao}"
+
+
+@executor('DASHBOARD')
+def _exportar_dashboard(tarefa, destino):
+    """Registros ativos do dashboard de produção em Excel."""
+    from .utils import (
+        COLUNAS_EXPORTACAO_DASHBOARD, dashboard_registros_ativos, linhas_exportacao_dashboard,
+    )
+
+    tz = pytz.timezone('America/Manaus')
+    agora = timezone.localtime(timezone.now(), tz)
+    registros = dashboard_registros_ativos().select_related(
+        'servidor', 'operador', 'operador_saida'
+    ).order_by('data_hora', 'id')
+    gravar_xlsx(
+        destino,
+        linhas_exportacao_dashboard(registros, tz, agora),
+        COLUNAS_EXPORTACAO_DASHBOARD,
+        titulo_planilha='Registros',
+        ajustar_larguras=True,
+    )
+    return f'dashboard_controle_acesso_{agora.strftime("%Y%m%d_%H%M")}.xlsx'
+
+
+@executor('REGISTROS')
+def _exportar_registros(tarefa, destino):
+    """Registros selecionados no admin (parametros 'modelo' e 'ids') em CSV."""
+    from .models import RegistroAcesso, RegistroDashboard
+    from .utils import COLUNAS_EXPORTACAO_REGISTROS, linhas_exportacao_registros
+
+    modelos = {'RegistroAcesso': RegistroAcesso, 'RegistroDashboard': RegistroDashboard}
+    modelo = modelos[tarefa.parametros.get('modelo', 'RegistroAcesso')]
+    registros = modelo.objects.filter(
+        pk__in=tarefa.parametros.get('ids', [])
+    ).select_related('servidor', 'operador')
+    gravar_csv(
+        destino,
+        _acompanhar(tarefa, linhas_exportacao_registros(registros), registros.count()),
+        COLUNAS_EXPORTACAO_REGISTROS,
+    )
+    return f'registros_acesso_{timezone.localtime().strftime("%Y%m%d_%H%M%S")}.csv'
+
+
+@executor('FALTAS')
+def _exportar_faltas(tarefa, destino):
+    """Relatório de faltas do plantão atual em PDF."""
+    from .utils import calcular_plantao_atual, escrever_pdf_faltas, listas_faltas_plantao
+
+    nome_plantao = calcular_plantao_atual()['nome']
+    listas = listas_faltas_plantao(nome_plantao, tarefa.parametros.get('nome', ''))
+    escrever_pdf_faltas(destino, nome_plantao, *listas)
+    return f'relatorio_faltas_{timezone.localtime().strftime("%Y%m%d")}.pdf'
@@ -24,15 +24,22 @@ urlpatterns = [
     path('servidor/<int:pk>/excluir/', views.servidor_delete, name='servidor_delete'),
     path('buscar-servidor/', views.buscar_servidor, name='buscar_servidor'),
     path('registro-acesso/criar/', views.registro_acesso_create, name='registro_acesso_create'),
+    path('registro-acesso/leitura/', views.registrar_leitura, name='registrar_leitura'),
+    path('registro-acesso/lote/', views.registrar_entradas_lote, name='registrar_entradas_lote'),
+    path('registro-acesso/sincronizar/', views.sincronizar_terminal, name='sincronizar_terminal'),
     path('registro-acesso/atualizar/<int:registro_id>/', views.registro_acesso_update, name='registro_acesso_update_alt'),
     path('registro-manual/criar/', views.registro_manual_create, name='registro_manual_create'),
     path('registros-plantao/', views.registros_plantao, name='registros_plantao'),
+    path('eventos/dashboard/', views.eventos_dashboard, name='eventos_dashboard'),
+    path('ocupacao/', views.ocupacao_unidade, name='ocupacao_unidade'),
     path('registro/<int:registro_id>/', views.registro_detalhe, name='registro_detalhe'),
     path('registro/<int:registro_id>/editar/', views.registro_acesso_update, name='registro_acesso_update'),
     path('registro/<int:registro_id>/excluir/', views.excluir_registro, name='excluir_registro'),
     path('registro/<int:registro_id>/registrar-saida/', views.registrar_saida, name='registrar_saida'),
     path('retirar-faltas/', views.retirar_faltas, name='retirar_faltas'),
     path('exportar-excel/', views.exportar_excel, name='exportar_excel'),
+    path('exportacoes/<int:pk>/', views.status_exportacao, name='status_exportacao'),
+    path('exportacoes/<int:pk>/download/', views.download_exportacao, name='download_exportacao'),
     path('usuarios/', views.user_list, name='user_list'),
     path('usuarios/novo/', views.user_create, name='user_create'),
     path('usuarios/<int:pk>/editar/', views.user_update, name='user_update'),
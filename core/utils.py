@@ -3,8 +3,15 @@ from django.utils import timezone
 import os
 import pytz
 import unicodedata
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import Dict, Any
 
+from .eventos import publicar_evento_dashboard
+
+logger = logging.getLogger(__name__)
+
 PREFIXO_EGRESSO = 'Egresso: '
 
 
@@ -130,24 +137,62 @@ def eh_servidor_egresso(nome):
     return normalizar_texto(nome).startswith('egresso:')
 
 
-def servidor_corresponde_busca(servidor, query, query_normalizada):
+def filtro_busca_servidor(query):
     """
-    Aplica as regras de correspondência por nome, documento e setor.
+    Monta o filtro SQL da busca de servidores sobre as colunas normalizadas.
 
     - Nome/setor: todas as palavras digitadas devem aparecer no texto
     - Documento: busca apenas pelos dígitos, ignorando pontos e traços
+
+    Returns:
+        Q com as condições de correspondência, ou None se a query não
+        tiver nenhum termo pesquisável
+    """
+    from django.db.models import Q
+
+    condicoes = []
+
+    palavras = normalizar_texto(query).split()
+    if palavras:
+        nome_match = Q()
+        setor_match = Q()
+        for palavra in palavras:
+            nome_match &= Q(nome_normalizado__contains=palavra)
+            setor_match &= Q(setor_normalizado__contains=palavra)
+        condicoes.extend([nome_match, setor_match])
+
+    query_digitos = normalizar_documento(query)
+    if len(query_digitos) >= 2:
+        condicoes.append(Q(documento_digitos__contains=query_digitos))
+
+    if not condicoes:
+        return None
+
+    filtro = condicoes[0]
+    for condicao in condicoes[1:]:
+        filtro |= condicao
+    return filtro
+
+
+def relevancia_busca_servidor(query):
     """
-    nome_normalizado = normalizar_texto(servidor.nome)
-    setor_normalizado = normalizar_texto(servidor.setor or '')
+    Expressão SQL de relevância para ordenar a busca feita no banco.
 
-    nome_match = texto_contem_todas_palavras(nome_normalizado, query_normalizada)
-    setor_match = texto_contem_todas_palavras(setor_normalizado, query_normalizada)
+    Aproxima a ordenação do índice em memória: documento idêntico primeiro,
+    depois nomes que começam pelo primeiro termo digitado.
+    """
+    from django.db.models import Case, IntegerField, Value, When
 
+    casos = []
     query_digitos = normalizar_documento(query)
-    documento_digitos = normalizar_documento(servidor.numero_documento)
-    documento_match = len(query_digitos) >= 2 and query_digitos in documento_digitos
+    if len(query_digitos) >= 2:
+        casos.append(When(documento_digitos=query_digitos, then=Value(2)))
+
+    palavras = normalizar_texto(query).split()
+    if palavras:
+        casos.append(When(nome_normalizado__startswith=palavras[0], then=Value(1)))
 
-    return nome_match or documento_match or setor_match
+    return Case(*casos, default=Value(0), output_field=IntegerField())
 
 
 def dashboard_registros_ativos():
@@ -157,6 +202,42 @@ def dashboard_registros_ativos():
     return RegistroDashboard.objects.filter(servidor__ativo=True)
 
 
+def anotar_alteracoes_servidores_dashboard(servidor_ids):
+    """
+    Anota no feed incremental os registros do dashboard dos servidores dados.
+
+    Usado quando o cadastro muda (nome, setor, ativo) sem tocar nos registros:
+    servidores inativos saem do dashboard, então seus registros viram exclusões.
+    """
+    from .models import AlteracaoDashboard, RegistroDashboard
+
+    registros = RegistroDashboard.objects.filter(
+        servidor_id__in=servidor_ids
+    ).values_list('id', 'servidor__ativo')
+    AlteracaoDashboard.objects.bulk_create([
+        AlteracaoDashboard(registro_id=registro_id, tipo='ALTERACAO' if ativo else 'EXCLUSAO')
+        for registro_id, ativo in registros
+    ])
+
+
+def podar_alteracoes_dashboard(retencao=timedelta(days=1)):
+    """
+    Remove do feed incremental as anotações mais antigas que a retenção.
+
+    A anotação mais recente é sempre mantida para que o cursor não volte a zero;
+    clientes com cursor anterior ao que restou recebem uma recarga completa.
+    """
+    from .models import AlteracaoDashboard
+
+    ultima = AlteracaoDashboard.objects.order_by('-id').values_list('id', flat=True).first()
+    if ultima is None:
+        return 0
+    removidas, _ = AlteracaoDashboard.objects.filter(
+        id__lt=ultima, data_hora__lt=timezone.now() - retencao
+    ).delete()
+    return removidas
+
+
 def desativar_servidor(servidor):
     """
     Exclusão operacional: inativa o cadastro e remove do dashboard atual.
@@ -189,6 +270,39 @@ def extrair_plantao_do_setor(setor):
             return plantao
     return None
 
+# Plantões se repetem a cada 4 dias a partir do ALFA de 01/01/2025 às 07:30h.
+# Manaus não tem horário de verão, então o cálculo é feito em segundos desde a
+# época (UTC) e o dia de plantão é uma divisão inteira.
+NOMES_PLANTOES = ('ALFA', 'BRAVO', 'CHARLIE', 'DELTA')
+FUSO_PLANTAO = pytz.timezone('America/Manaus')
+SEGUNDOS_DIA = 24 * 60 * 60
+REFERENCIA_PLANTAO_EPOCH = int(
+    FUSO_PLANTAO.localize(datetime.combine(date(2025, 1, 1), time(7, 30))).timestamp()
+)
+
+
+def dia_plantao(data_hora: datetime) -> int:
+    """
+    Número do dia de plantão (0 = ALFA de 01/01/2025) que contém a data/hora.
+
+    Datas sem timezone são tratadas como horário de Manaus.
+    """
+    if timezone.is_naive(data_hora):
+        data_hora = FUSO_PLANTAO.localize(data_hora)
+    return (int(data_hora.timestamp()) - REFERENCIA_PLANTAO_EPOCH) // SEGUNDOS_DIA
+
+
+@lru_cache(maxsize=1024)
+def _plantao_do_dia(dia: int) -> Dict[str, Any]:
+    inicio = REFERENCIA_PLANTAO_EPOCH + dia * SEGUNDOS_DIA
+    return {
+        'nome': NOMES_PLANTOES[dia % 4],
+        'inicio': datetime.fromtimestamp(inicio, FUSO_PLANTAO),
+        # Fim do plantão (07:29:59 do dia seguinte)
+        'fim': datetime.fromtimestamp(inicio + SEGUNDOS_DIA - 1, FUSO_PLANTAO),
+    }
+
+
 def calcular_plantao_atual(data_hora: datetime = None) -> Dict[str, Any]:
     """
     Calcula o plantão baseado na data/hora fornecida ou atual.
@@ -198,6 +312,7 @@ def calcular_plantao_atual(data_hora: datetime = None) -> Dict[str, Any]:
     
     Args:
         data_hora: Data/hora opcional para calcular o plantão. Se não informada, usa a data/hora atual.
+            Sem timezone, é considerada no horário de Manaus (UTC-4).
     
     Returns:
         Dict contendo:
@@ -205,56 +320,48 @@ def calcular_plantao_atual(data_hora: datetime = None) -> Dict[str, Any]:
         - inicio: Datetime do início do plantão
         - fim: Datetime do fim do plantão
     """
-    # Define o timezone UTC-4
-    tz = pytz.timezone('America/Manaus')
-    
-    # Data/hora de referência: 01/01/2025 07:30h (início do plantão ALFA)
-    data_referencia = datetime.combine(date(2025, 1, 1), time(7, 30))
-    data_referencia = tz.localize(data_referencia)
-    
-    # Momento atual em UTC-4 (ou data/hora fornecida)
     if data_hora is None:
-        agora = timezone.localtime(timezone.now(), tz)
-    else:
-        # Se a data_hora já estiver com timezone, converte para UTC-4
-        if timezone.is_aware(data_hora):
-            agora = timezone.localtime(data_hora, tz)
-        # Se a data_hora não tiver timezone, assume que já está em UTC-4
-        else:
-            agora = tz.localize(data_hora)
-    
-    # Se estamos antes das 07:30h, consideramos que ainda é o plantão do dia anterior
-    hora_atual = agora.time()
-    if hora_atual < time(7, 30):
-        # O plantão começou às 07:30h do dia anterior
-        data_plantao = agora.date() - timedelta(days=1)
-    else:
-        # O plantão começou às 07:30h do dia atual
-        data_plantao = agora.date()
-    
-    # Início do plantão (07:30h do dia do plantão)
-    inicio_plantao = datetime.combine(data_plantao, time(7, 30))
-    inicio_plantao = tz.localize(inicio_plantao)
-    
-    # Fim do plantão (07:29:59 do dia seguinte)
-    fim_plantao = inicio_plantao + timedelta(days=1) - timedelta(seconds=1)
-    
-    # Calcula quantos dias se passaram desde a data de referência até o dia do plantão
-    dias_passados = (data_plantao - data_referencia.date()).days
-    
-    # Calcula qual plantão é (ciclo de 4 dias)
-    # 0 = ALFA, 1 = BRAVO, 2 = CHARLIE, 3 = DELTA
-    indice_plantao = dias_passados % 4
-    
-    # Lista de nomes dos plantões na ordem
-    nomes_plantoes = ['ALFA', 'BRAVO', 'CHARLIE', 'DELTA']
-    nome_plantao = nomes_plantoes[indice_plantao]
-    
-    return {
-        'nome': nome_plantao,
-        'inicio': inicio_plantao,
-        'fim': fim_plantao
-    }
+        data_hora = timezone.now()
+    # Cópia: o dicionário em cache é compartilhado entre chamadas
+    return dict(_plantao_do_dia(dia_plantao(data_hora)))
+
+
+def calcular_plantoes(datas) -> list:
+    """
+    Plantão de cada data/hora de uma sequência, para exportações em lote.
+
+    Aceita uma lista de datetimes (None é permitido) ou um array NumPy /
+    Series / DatetimeIndex do pandas; nestes, datas sem timezone são UTC,
+    como no banco. O cálculo é vetorizado e cada dia de plantão distinto é
+    montado uma única vez.
+
+    Returns:
+        Lista alinhada com a entrada, com o dict de calcular_plantao_atual
+        (nome, inicio, fim; compartilhado, não alterar) ou None onde a data for nula
+    """
+    if not hasattr(datas, 'dtype'):
+        return [
+            _plantao_do_dia(dia_plantao(data_hora)) if data_hora is not None else None
+            for data_hora in datas
+        ]
+
+    import numpy as np
+
+    if getattr(datas, 'dt', None) is not None and datas.dt.tz is not None:
+        datas = datas.dt.tz_convert('UTC').dt.tz_localize(None)
+    elif getattr(datas, 'tz', None) is not None:
+        datas = datas.tz_convert('UTC').tz_localize(None)
+    valores = np.asarray(datas, dtype='datetime64[s]')
+    nulos = np.isnat(valores)
+    segundos = valores.astype('int64')
+    dias = np.where(nulos, 0, (segundos - REFERENCIA_PLANTAO_EPOCH) // SEGUNDOS_DIA)
+
+    dias_unicos, posicoes = np.unique(dias, return_inverse=True)
+    plantoes = [_plantao_do_dia(int(dia)) for dia in dias_unicos]
+    return [
+        None if nulo else plantoes[posicao]
+        for nulo, posicao in zip(nulos.tolist(), posicoes.ravel().tolist())
+    ]
 
 
 def verificar_plantao_servidor(servidor):
@@ -283,29 +390,20 @@ def verificar_saida_pendente(servidor):
     """
     Verifica se o servidor tem uma saída pendente (mais de 10 horas desde a última entrada).
     """
-    # Define o timezone UTC-4
-    tz = pytz.timezone('America/Manaus')
-    
-    ultima_entrada = servidor.registroacesso_set.filter(
-        tipo_acesso='ENTRADA'
-    ).order_by('-data_hora').first()
+    from .presenca import presenca_do_servidor
     
-    if ultima_entrada:
-        agora = timezone.localtime(timezone.now(), tz)
-        ultima_entrada_local = timezone.localtime(ultima_entrada.data_hora, tz)
-        tempo_decorrido = agora - ultima_entrada_local
-        return tempo_decorrido > timedelta(hours=10)
+    presenca = presenca_do_servidor(servidor.pk)
+    if presenca and presenca.dentro and presenca.ultima_entrada:
+        return timezone.now() - presenca.ultima_entrada > timedelta(hours=10)
     return False
 
 def determinar_tipo_acesso(servidor):
     """
-    Determina automaticamente o tipo de acesso com base no último registro.
+    Determina automaticamente o tipo de acesso com base na presença atual.
     """
-    ultimo_registro = servidor.registroacesso_set.order_by('-data_hora').first()
+    from .presenca import servidor_esta_dentro
     
-    if not ultimo_registro or ultimo_registro.tipo_acesso == 'SAIDA':
-        return 'ENTRADA'
-    return 'SAIDA'
+    return 'SAIDA' if servidor_esta_dentro(servidor.pk) else 'ENTRADA'
 
 def formatar_registros_para_json(registros, modelo_dashboard=None, is_treinamento=False):
     """
@@ -367,36 +465,179 @@ def formatar_registros_para_json(registros, modelo_dashboard=None, is_treinament
 
 def calcular_totais_registros(registros, is_treinamento=False):
     """
-    Calcula totais de registros de forma padronizada.
+    Calcula os totais dos cards do dashboard em uma única consulta agregada.
     
     Args:
-        registros: QuerySet de registros
+        registros: QuerySet de registros (RegistroDashboard ou RegistroAcessoTreinamento)
         is_treinamento: Boolean indicando se é ambiente de treinamento
     
     Returns:
         Dict com total_entradas, total_saidas, total_pendentes
     """
+    from django.db.models import Count, Q
+
     if is_treinamento:
-        # Para treinamento, conta todos os registros
-        total_entradas = registros.filter(tipo_acesso='ENTRADA').count()
-        total_saidas = registros.filter(data_hora_saida__isnull=False).count()
-        total_pendentes = registros.filter(tipo_acesso='ENTRADA', saida_pendente=True).count()
+        # Para treinamento, como o endpoint que atualiza os cards: saídas são
+        # os registros do tipo SAIDA
+        return registros.aggregate(
+            total_entradas=Count('id', filter=Q(tipo_acesso='ENTRADA')),
+            total_saidas=Count('id', filter=Q(tipo_acesso='SAIDA')),
+            total_pendentes=Count('id', filter=Q(saida_pendente=True)),
+        )
+    # Para produção, todos os registros do dashboard contam como entradas
+    return registros.aggregate(
+        total_entradas=Count('id'),
+        total_saidas=Count('id', filter=Q(data_hora_saida__isnull=False)),
+        total_pendentes=Count('id', filter=Q(saida_pendente=True)),
+    )
+
+
+def _chave_dashboard_stats(is_treinamento, plantao):
+    ambiente = 'treinamento' if is_treinamento else 'producao'
+    return f"dashboard_stats:{ambiente}:{plantao['inicio']:%Y%m%d%H%M}"
+
+
+def dashboard_stats(is_treinamento=False, usar_cache=True):
+    """
+    Contadores do dashboard (entradas, saídas e pendentes) do ambiente.
+
+    O resultado fica em cache até o fim do plantão atual e é descartado
+    pelos sinais de gravação do dashboard (ver core/signals.py).
+
+    Args:
+        is_treinamento: Boolean indicando se é ambiente de treinamento
+        usar_cache: Se False, sempre consulta o banco
+
+    Returns:
+        Dict com total_entradas, total_saidas, total_pendentes
+    """
+    from django.core.cache import cache
+
+    plantao = calcular_plantao_atual()
+    chave = _chave_dashboard_stats(is_treinamento, plantao)
+
+    if usar_cache:
+        totais = cache.get(chave)
+        if totais is not None:
+            return totais
+
+    if is_treinamento:
+        from .models import RegistroAcessoTreinamento
+        registros = RegistroAcessoTreinamento.objects.all()
     else:
-        # Para produção, usa a lógica específica do dashboard
-        total_entradas = registros.count()  # Todos os registros do dashboard são entradas
-        total_saidas = registros.filter(data_hora_saida__isnull=False).count()
-        total_pendentes = registros.filter(saida_pendente=True).count()
-    
-    return {
-        'total_entradas': total_entradas,
-        'total_saidas': total_saidas,
-        'total_pendentes': total_pendentes
+        registros = dashboard_registros_ativos()
+
+    totais = calcular_totais_registros(registros, is_treinamento)
+
+    if usar_cache:
+        segundos_restantes = (plantao['fim'] - timezone.now()).total_seconds()
+        cache.set(chave, totais, max(1, int(segundos_restantes) + 1))
+
+    return totais
+
+
+def versao_dashboard(is_treinamento=False):
+    """
+    Token barato que muda sempre que o conteúdo do dashboard muda (usado como ETag).
+
+    Produção: maior id, total de linhas e o último id do log AlteracaoDashboard,
+    que já registra edições e mudanças de cadastro que não alteram id nem total.
+    Treinamento: maior id, total de linhas e a última data de modificação.
+    """
+    from django.db.models import Count, Max
+
+    if is_treinamento:
+        from .models import RegistroAcessoTreinamento
+        versao = RegistroAcessoTreinamento.objects.aggregate(
+            ultimo_id=Max('id'), total=Count('id'), modificado=Max('data_hora_modificacao')
+        )
+        modificado = versao['modificado'].timestamp() if versao['modificado'] else 0
+        return f"t-{versao['ultimo_id'] or 0}-{versao['total']}-{modificado:.6f}"
+
+    from .models import AlteracaoDashboard, RegistroDashboard
+    versao = RegistroDashboard.objects.aggregate(ultimo_id=Max('id'), total=Count('id'))
+    cursor = AlteracaoDashboard.objects.aggregate(ultimo=Max('id'))['ultimo']
+    return f"p-{versao['ultimo_id'] or 0}-{versao['total']}-{cursor or 0}"
+
+
+def invalidar_dashboard_stats(is_treinamento=False):
+    """Descarta os contadores em cache do plantão atual (e a ocupação, na produção)."""
+    from django.core.cache import cache
+
+    cache.delete(_chave_dashboard_stats(is_treinamento, calcular_plantao_atual()))
+    if not is_treinamento:
+        cache.delete(CHAVE_OCUPACAO)
+
+
+CHAVE_OCUPACAO = 'ocupacao_atual:producao'
+# Teto do cache da ocupação: gravações deste processo já a descartam na hora;
+# o teto cobre gravações feitas por outros processos
+OCUPACAO_CACHE_SEGUNDOS = 60
+
+
+def _agrupar_ocupacao(contagens):
+    """Dict rótulo -> total, do maior para o menor (empate em ordem alfabética)."""
+    return dict(sorted(contagens.items(), key=lambda item: (-item[1], item[0])))
+
+
+def ocupacao_atual(usar_cache=True):
+    """
+    Quem está dentro da unidade agora, agrupado por setor, plantão, tipo de
+    funcionário e ISV.
+
+    Uma única consulta agregada sobre as entradas sem saída do dashboard
+    (índice parcial dashboard_pendentes_idx); o plantão sai do setor via
+    extrair_plantao_do_setor. O resultado fica em cache até o próximo registro
+    (os mesmos sinais que descartam dashboard_stats), então painéis que
+    consultam a cada poucos segundos não chegam ao banco.
+
+    Returns:
+        Dict com total, por_setor, por_plantao, por_tipo_funcionario, isv e atualizado_em
+    """
+    from collections import Counter
+    from django.core.cache import cache
+    from django.db.models import Count
+    from .models import Servidor
+
+    if usar_cache:
+        ocupacao = cache.get(CHAVE_OCUPACAO)
+        if ocupacao is not None:
+            return ocupacao
+
+    grupos = dashboard_registros_ativos().filter(
+        tipo_acesso='ENTRADA', saida_pendente=True
+    ).values('setor', 'servidor__tipo_funcionario', 'isv').annotate(total=Count('id')).order_by()
+
+    rotulos_tipo = dict(Servidor.TIPO_FUNCIONARIO_CHOICES)
+    por_setor, por_plantao, por_tipo = Counter(), Counter(), Counter()
+    isv = {'isv': 0, 'nao_isv': 0}
+    for grupo in grupos:
+        total = grupo['total']
+        por_setor[grupo['setor'] or 'SEM SETOR'] += total
+        por_plantao[extrair_plantao_do_setor(grupo['setor']) or 'SEM PLANTÃO'] += total
+        tipo = grupo['servidor__tipo_funcionario']
+        por_tipo[rotulos_tipo.get(tipo, tipo) or 'Não informado'] += total
+        isv['isv' if grupo['isv'] else 'nao_isv'] += total
+
+    ocupacao = {
+        'total': sum(por_setor.values()),
+        'por_setor': _agrupar_ocupacao(por_setor),
+        'por_plantao': _agrupar_ocupacao(por_plantao),
+        'por_tipo_funcionario': _agrupar_ocupacao(por_tipo),
+        'isv': isv,
+        'atualizado_em': timezone.localtime(timezone.now(), FUSO_PLANTAO).isoformat(),
     }
+    if usar_cache:
+        cache.set(CHAVE_OCUPACAO, ocupacao, OCUPACAO_CACHE_SEGUNDOS)
+    return ocupacao
 
 def buscar_servidores_helper(query, formato='detalhado', excluir_egressos=False):
     """
     Função auxiliar para buscar servidores de forma padronizada.
-    Busca normalizada (sem acentos, case-insensitive).
+    Busca normalizada (sem acentos, case-insensitive), atendida pelo índice
+    em memória (core.indice_busca), que ordena por relevância e tolera erros
+    de digitação, ou, enquanto ele não estiver pronto, no banco sobre as
+    colunas nome_normalizado/setor_normalizado/documento_digitos.
 
     Args:
         query: String de busca
@@ -406,24 +647,30 @@ def buscar_servidores_helper(query, formato='detalhado', excluir_egressos=False)
     Returns:
         List de dicionários com dados dos servidores
     """
+    from .indice_busca import indice_servidores
     from .models import Servidor
 
     if len(query) < 2:
         return []
 
-    query_normalizada = normalizar_texto(query)
-    servidores_raw = Servidor.objects.filter(ativo=True).order_by('nome')
+    servidores_filtrados = indice_servidores.buscar(
+        query, limite=10, excluir_egressos=excluir_egressos
+    )
 
-    servidores_filtrados = []
-    for servidor in servidores_raw:
-        if excluir_egressos and eh_servidor_egresso(servidor.nome):
-            continue
+    if servidores_filtrados is None:
+        # Índice em memória ainda frio: resolve a busca direto no banco
+        filtro = filtro_busca_servidor(query)
+        if filtro is None:
+            return []
 
-        if servidor_corresponde_busca(servidor, query, query_normalizada):
-            servidores_filtrados.append(servidor)
+        servidores = Servidor.objects.filter(filtro, ativo=True)
+        if excluir_egressos:
+            servidores = servidores.exclude(nome_normalizado__startswith='egresso:')
 
-        if len(servidores_filtrados) >= 10:
-            break
+        servidores_filtrados = list(
+            servidores.annotate(relevancia=relevancia_busca_servidor(query))
+            .order_by('-relevancia', 'nome')[:10]
+        )
     
     resultados = []
     
@@ -451,36 +698,25 @@ def buscar_servidores_helper(query, formato='detalhado', excluir_egressos=False)
     
     return resultados
 
-def exportar_excel_helper(registros, nome_arquivo, is_treinamento=False):
-    """
-    Função auxiliar para exportar registros para Excel de forma padronizada.
-    
-    Args:
-        registros: QuerySet de registros (RegistroDashboard ou RegistroAcessoTreinamento)
-        nome_arquivo: Prefixo do nome do arquivo
-        is_treinamento: Boolean indicando se é ambiente de treinamento
-    
-    Returns:
-        HttpResponse com arquivo Excel
-    """
-    from django.http import HttpResponse
-    from django.utils import timezone
-    import pandas as pd
-    import pytz
-    
-    # Define o timezone UTC-4
-    tz = pytz.timezone('America/Manaus')
-    agora = timezone.localtime(timezone.now(), tz)
-    
-    # Processa os registros
-    data = []
-    for registro in registros:
+COLUNAS_EXPORTACAO_DASHBOARD = [
+    'ORD', 'Plantão', 'Data', 'Operador', 'Servidor', 'Documento',
+    'Setor', 'Veículo', 'ISV', 'Entrada', 'Saída'
+]
+
+
+def linhas_exportacao_dashboard(registros, tz, agora, is_treinamento=False):
+    """Gera as linhas da planilha do dashboard, na ordem de COLUNAS_EXPORTACAO_DASHBOARD."""
+    # Processa os registros (plantões calculados em lote)
+    registros = list(registros)
+    plantoes = calcular_plantoes([registro.data_hora for registro in registros])
+    ordem = 0
+    for registro, plantao in zip(registros, plantoes):
         # Converte os horários para UTC-4
         data_hora = timezone.localtime(registro.data_hora, tz) if registro.data_hora else None
         data_hora_saida = timezone.localtime(registro.data_hora_saida, tz) if registro.data_hora_saida else None
         
         # Identifica o plantão do registro
-        plantao_registro = calcular_plantao_atual(data_hora)['nome'] if data_hora else "N/A"
+        plantao_registro = plantao['nome'] if plantao else "N/A"
         
         # Processa veículo
         veiculo = '-'
@@ -491,83 +727,577 @@ def exportar_excel_helper(registros, nome_arquivo, is_treinamento=False):
         
         # Se for uma entrada normal
         if registro.tipo_acesso == 'ENTRADA':
-            data.append({
-                'ORD': len(data) + 1,
-                'Plantão': plantao_registro,
-                'Data': data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A',
-                'Operador': registro.operador.get_full_name() or registro.operador.username,
-                'Servidor': registro.servidor.nome,
-                'Documento': registro.servidor.numero_documento,
-                'Setor': registro.servidor.setor or '-',
-                'Veículo': veiculo,
-                'ISV': 'Sim' if registro.isv else 'Não',
-                'Entrada': data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A',
-                'Saída': data_hora_saida.strftime('%d/%m/%Y %H:%M') if data_hora_saida else 'Pendente'
-            })
+            servidor_nome = registro.servidor.nome
+            setor = registro.servidor.setor or '-'
+            entrada = data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A'
+            saida = data_hora_saida.strftime('%d/%m/%Y %H:%M') if data_hora_saida else 'Pendente'
         # Se for uma saída definitiva
         elif registro.tipo_acesso == 'SAIDA':
             servidor_nome = registro.servidor.nome
             if not servidor_nome.startswith('Egresso:'):
                 servidor_nome = f"Egresso: {servidor_nome}"
-                
-            data.append({
-                'ORD': len(data) + 1,
-                'Plantão': plantao_registro,
-                'Data': data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A',
-                'Operador': registro.operador.get_full_name() or registro.operador.username,
-                'Servidor': servidor_nome,
-                'Documento': registro.servidor.numero_documento,
-                'Setor': registro.setor or '-',  # Aqui estará a justificativa
-                'Veículo': veiculo,
-                'ISV': 'Sim' if registro.isv else 'Não',
-                'Entrada': '-',
-                'Saída': data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A'
-            })
+            setor = registro.setor or '-'  # Aqui estará a justificativa
+            entrada = '-'
+            saida = data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A'
+        else:
+            continue
+        
+        ordem += 1
+        yield [
+            ordem,
+            plantao_registro,
+            data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A',
+            registro.operador.get_full_name() or registro.operador.username,
+            servidor_nome,
+            registro.servidor.numero_documento,
+            setor,
+            veiculo,
+            'Sim' if registro.isv else 'Não',
+            entrada,
+            saida,
+        ]
     
     # Se não houver registros no treinamento, cria dados de exemplo
-    if is_treinamento and not data:
-        data = [
-            {
-                'ORD': 1,
-                'Plantão': 'DIURNO',
-                'Data': agora.strftime('%d/%m/%Y'),
-                'Operador': 'USUÁRIO TREINAMENTO',
-                'Servidor': 'SERVIDOR EXEMPLO',
-                'Documento': '12345678900',
-                'Setor': 'EXEMPLO',
-                'Veículo': 'ABC-1234',
-                'ISV': 'Não',
-                'Entrada': f"{agora.strftime('%d/%m/%Y')} 08:00",
-                'Saída': 'Pendente'
-            }
+    if is_treinamento and not ordem:
+        yield [
+            1, 'DIURNO', agora.strftime('%d/%m/%Y'), 'USUÁRIO TREINAMENTO',
+            'SERVIDOR EXEMPLO', '12345678900', 'EXEMPLO', 'ABC-1234', 'Não',
+            f"{agora.strftime('%d/%m/%Y')} 08:00", 'Pendente'
         ]
+
+
+COLUNAS_EXPORTACAO_REGISTROS = [
+    'Data/Hora', 'Servidor', 'Documento', 'Tipo Acesso', 'Setor',
+    'Veículo', 'ISV', 'Operador', 'Status', 'Observação'
+]
+
+
+def linhas_exportacao_registros(registros):
+    """Gera as linhas do CSV de registros de acesso do admin (mais recentes primeiro)."""
+    for reg in registros.order_by('-data_hora').iterator(chunk_size=2000):
+        yield [
+            reg.data_hora.strftime('%d/%m/%Y %H:%M:%S'),
+            reg.servidor.nome,
+            reg.servidor.numero_documento,
+            reg.get_tipo_acesso_display(),
+            reg.setor or reg.servidor.setor,
+            reg.veiculo or reg.servidor.veiculo,
+            'Sim' if reg.isv else 'Não',
+            reg.operador.username,
+            'Pendente' if reg.saida_pendente else 'Completo',
+            reg.observacao or ''
+        ]
+
+
+# Colunas da exportação do histórico: chave do registro formatado -> título
+COLUNAS_EXPORTACAO_HISTORICO = {
+    'plantao': 'Plantão',
+    'data_hora': 'Data',
+    'operador': 'Operador',
+    'servidor': 'Servidor',
+    'numero_documento': 'Documento',
+    'setor': 'Setor',
+    'veiculo': 'Veículo',
+    'isv': 'ISV',
+    'entrada': 'Entrada',
+    'observacao': 'OBS Entrada',
+    'saida': 'Saída',
+    'observacao_saida': 'OBS Saída',
+    'status_alteracao': 'Alteração',
+    'data_hora_alteracao': 'Data/Hora Alteração',
+    'justificativa': 'Justificativa'
+}
+
+
+def formatar_registro_historico(registro, plantao, tz):
+    """Converte um RegistroAcesso no dicionário exibido/exportado pelo histórico."""
+    # Converte os horários para UTC-4
+    data_hora = registro.data_hora.astimezone(tz) if registro.data_hora else None
+    data_hora_saida = registro.data_hora_saida.astimezone(tz) if registro.data_hora_saida else None
+    data_hora_alteracao = registro.data_hora_alteracao.astimezone(tz) if registro.data_hora_alteracao else None
     
-    # Cria o DataFrame
-    df = pd.DataFrame(data, columns=[
-        'ORD', 'Plantão', 'Data', 'Operador', 'Servidor', 'Documento', 
-        'Setor', 'Veículo', 'ISV', 'Entrada', 'Saída'
-    ])
-    
-    # Cria a resposta HTTP
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename={nome_arquivo}_{agora.strftime("%Y%m%d_%H%M")}.xlsx'
+    return {
+        'id': registro.id,
+        'plantao': plantao['nome'] if plantao else "N/A",
+        'data_hora': data_hora,
+        'operador': registro.operador.get_full_name() or registro.operador.username if registro.operador else "N/A",
+        'servidor': registro.servidor.nome if registro.servidor else "N/A",
+        'numero_documento': registro.servidor.numero_documento if registro.servidor else "N/A",
+        'setor': registro.servidor.setor or '-' if registro.servidor else "N/A",
+        'veiculo': registro.veiculo if registro.veiculo and registro.veiculo.strip() else registro.servidor.veiculo if registro.servidor and registro.servidor.veiculo and registro.servidor.veiculo.strip() else '-',
+        'isv': 'Sim' if registro.isv else 'Não',
+        'entrada': data_hora.strftime('%H:%M') if data_hora and registro.tipo_acesso == 'ENTRADA' else '-',
+        'observacao': registro.observacao or '-',
+        'saida': data_hora_saida.strftime('%H:%M') if data_hora_saida else '-',
+        'observacao_saida': registro.observacao_saida or '-',
+        'status_alteracao': registro.status_alteracao or 'Original',
+        'data_hora_alteracao': data_hora_alteracao.strftime('%d/%m/%Y %H:%M') if data_hora_alteracao else '-',
+        'justificativa': registro.justificativa or '-'
+    }
+
+
+def formatar_registros_historico(registros, tz):
+    """Gera os registros formatados lendo o queryset em lotes (plantões em lote)."""
+    from .exportacao import iterar_em_lotes
     
-    # Escreve o Excel
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Registros')
+    for lote in iterar_em_lotes(registros):
+        plantoes = calcular_plantoes([registro.data_hora for registro in lote])
+        for registro, plantao in zip(lote, plantoes):
+            try:
+                yield formatar_registro_historico(registro, plantao, tz)
+            except Exception:
+                logger.warning('Falha ao formatar o registro %s do histórico', registro.id, exc_info=True)
+                continue  # Pula este registro e continua com o próximo
+
+
+def linhas_exportacao_historico(registros, tz):
+    """Linhas da planilha do histórico, na ordem de COLUNAS_EXPORTACAO_HISTORICO."""
+    for registro in formatar_registros_historico(registros, tz):
+        data_hora = registro['data_hora']
+        registro['data_hora'] = data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A'
+        yield [registro[chave] for chave in COLUNAS_EXPORTACAO_HISTORICO]
+
+
+def filtrar_historico(parametros, tz):
+    """
+    Aplica os filtros do histórico (datas, servidor, plantão, filtro rápido).
+
+    Args:
+        parametros: QueryDict/dict com os parâmetros GET do histórico, ou os
+            filtros efetivos de uma chamada anterior (com 'inicio' e 'fim')
+        tz: Timezone usado nas datas (America/Manaus)
+
+    Returns:
+        Tuple (queryset de RegistroAcesso, dict com os filtros efetivos); 'inicio'
+        e 'fim' trazem o intervalo resolvido em ISO, já com o filtro rápido
+    """
+    from django.db.models import Q
+    from .models import RegistroAcesso
+    
+    # Obtém os parâmetros do filtro
+    data_inicio = parametros.get('data_inicio')
+    data_fim = parametros.get('data_fim')
+    servidor = parametros.get('servidor', '')
+    plantao = parametros.get('plantao', '')
+    filtro_rapido = parametros.get('filtro_rapido', '')
+    inicio = parametros.get('inicio')
+    fim = parametros.get('fim')
+    
+    # Define datas padrão se não fornecidas
+    if not data_inicio:
+        data_inicio = (datetime.now(tz) - timedelta(days=1)).strftime('%Y-%m-%d')
+    if not data_fim:
+        data_fim = datetime.now(tz).strftime('%Y-%m-%d')
         
-        # Ajusta a largura das colunas
-        worksheet = writer.sheets['Registros']
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(col)
+    # Converte as strings de data para objetos datetime
+    data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d').replace(tzinfo=tz)
+    data_fim_dt = datetime.strptime(data_fim, '%Y-%m-%d').replace(hour=23, minute=59, second=59, tzinfo=tz)
+    
+    if inicio and fim:
+        # Intervalo resolvido quando o pedido foi feito (exportação em fila):
+        # o filtro rápido não pode mudar de plantão enquanto a tarefa espera
+        data_inicio_dt = datetime.fromisoformat(inicio)
+        data_fim_dt = datetime.fromisoformat(fim)
+    # Aplica filtro rápido se solicitado
+    elif filtro_rapido:
+        agora = datetime.now(tz)
+        hora_atual = agora.hour
+        
+        # Determina o início do plantão atual
+        if 7 <= hora_atual < 19:  # Plantão diurno
+            inicio_plantao = agora.replace(hour=7, minute=30, second=0, microsecond=0)
+        else:  # Plantão noturno
+            if hora_atual < 7:  # Se for antes das 7h, o plantão começou no dia anterior
+                inicio_plantao = (agora - timedelta(days=1)).replace(hour=19, minute=30, second=0, microsecond=0)
+            else:  # Se for depois das 19h, o plantão começou no mesmo dia
+                inicio_plantao = agora.replace(hour=19, minute=30, second=0, microsecond=0)
+        
+        if filtro_rapido == 'atual':
+            data_inicio_dt = inicio_plantao
+            data_fim_dt = agora
+        elif filtro_rapido == 'anterior':
+            if 7 <= hora_atual < 19:  # Se estamos no plantão diurno
+                data_fim_dt = inicio_plantao - timedelta(minutes=1)  # 07:29 do dia atual
+                data_inicio_dt = data_fim_dt - timedelta(hours=12)  # 19:30 do dia anterior
+            else:  # Se estamos no plantão noturno
+                data_fim_dt = inicio_plantao - timedelta(minutes=1)  # 19:29 do dia atual
+                data_inicio_dt = data_fim_dt.replace(hour=7, minute=30)  # 07:30 do mesmo dia
+    
+    # Filtra os registros
+    registros = RegistroAcesso.objects.filter(
+        data_hora__range=(data_inicio_dt, data_fim_dt)
+    ).select_related('servidor', 'operador', 'operador_saida').order_by('data_hora', 'data_hora_alteracao')
+    
+    # Aplica filtro por servidor
+    if servidor:
+        registros = registros.filter(
+            Q(servidor__nome__icontains=servidor) |
+            Q(servidor__numero_documento__icontains=servidor)
+        )
+    
+    # Aplica filtro por plantão
+    if plantao:
+        registros = registros.filter(servidor__plantao=plantao)
+    
+    return registros, {
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'servidor': servidor,
+        'plantao': plantao,
+        'inicio': data_inicio_dt.isoformat(),
+        'fim': data_fim_dt.isoformat(),
+    }
+
+
+# Constantes para configuração do PDF de faltas
+PDF_TITLE_FONT_SIZE = 16
+PDF_SUBTITLE_FONT_SIZE = 14
+PDF_NORMAL_FONT_SIZE = 12
+PDF_TABLE_FONT_SIZE = 10
+TABLE_PADDING = 6
+
+
+def listas_faltas_plantao(nome_plantao, filtro_nome=''):
+    """
+    Monta as listas do relatório de faltas do plantão.
+
+    Returns:
+        Tuple (faltosos, isvs_presentes, permutas_reposicao), cada uma ordenada
+        por nome e com o número de ordem em 'ord'
+    """
+    from django.db.models import Q
+    from .models import RegistroDashboard, Servidor
+    
+    # Busca servidores do plantão atual (setor contém o nome do plantão)
+    servidores_plantao = Servidor.objects.filter(
+        setor__icontains=nome_plantao,
+        ativo=True
+    ).order_by('nome')
+    
+    # Aplica filtro por nome se fornecido
+    if filtro_nome:
+        servidores_plantao = servidores_plantao.filter(
+            Q(nome__icontains=filtro_nome) |
+            Q(numero_documento__icontains=filtro_nome)
+        )
+    
+    # Busca TODOS os registros que estão no dashboard (com saída pendente)
+    registros_hoje = RegistroDashboard.objects.filter(
+        tipo_acesso='ENTRADA',
+        saida_pendente=True  # Todos os registros ativos no dashboard
+    ).select_related('servidor')
+    
+    servidores_presentes = set(registro.servidor_id for registro in registros_hoje)
+    
+    # Processa ISVs presentes
+    isvs_presentes = []
+    for registro in registros_hoje:
+        if registro.isv:
+            hora_entrada = timezone.localtime(registro.data_hora).strftime('%H:%M')
+            isvs_presentes.append({
+                'ord': len(isvs_presentes) + 1,
+                'nome': registro.servidor.nome,
+                'documento': registro.servidor.numero_documento,
+                'setor': registro.servidor.setor,
+                'hora_entrada': hora_entrada
+            })
+    
+    # Processa Permutas/Reposição de hora
+    # Servidores que entraram, não são ISV e têm plantão diferente do atual
+    permutas_reposicao = []
+    logger.debug('Permutas: plantão atual %s, %d registro(s) hoje', nome_plantao, len(registros_hoje))
+    
+    for registro in registros_hoje:
+        servidor = registro.servidor
+    
+        # Extrai o plantão do setor
+        plantao_servidor = extrair_plantao_do_setor(servidor.setor)
+    
+        # Verifica se não é ISV e tem plantão diferente do atual
+        if not registro.isv and plantao_servidor and plantao_servidor != nome_plantao:
+            hora_entrada = timezone.localtime(registro.data_hora).strftime('%H:%M')
+            permutas_reposicao.append({
+                'ord': len(permutas_reposicao) + 1,
+                'nome': servidor.nome,
+                'documento': servidor.numero_documento,
+                'setor': servidor.setor,
+                'plantao_servidor': plantao_servidor,
+                'plantao_atual': nome_plantao,
+                'hora_entrada': hora_entrada
+            })
+        else:
+            logger.debug(
+                'Permutas: %s (%s) ignorado - ISV=%s, plantão=%s',
+                servidor.nome, servidor.numero_documento, registro.isv, plantao_servidor,
             )
-            worksheet.column_dimensions[chr(65 + idx)].width = max_length + 2
     
-    return response
+    logger.debug('Permutas encontradas: %d', len(permutas_reposicao))
+    
+    # Processa faltosos (servidores do plantão atual que não entraram)
+    faltosos = []
+    for servidor in servidores_plantao:
+        if servidor.id not in servidores_presentes:
+            faltosos.append({
+                'ord': len(faltosos) + 1,
+                'id': servidor.id,
+                'nome': servidor.nome,
+                'documento': servidor.numero_documento,
+                'setor': servidor.setor
+            })
+    
+    # Ordena as listas por nome
+    faltosos.sort(key=lambda x: x['nome'])
+    isvs_presentes.sort(key=lambda x: x['nome'])
+    permutas_reposicao.sort(key=lambda x: x['nome'])
+    
+    # Atualiza números de ordem após ordenação
+    for i, faltoso in enumerate(faltosos, 1):
+        faltoso['ord'] = i
+    for i, isv in enumerate(isvs_presentes, 1):
+        isv['ord'] = i
+    for i, permuta in enumerate(permutas_reposicao, 1):
+        permuta['ord'] = i
+    
+    return faltosos, isvs_presentes, permutas_reposicao
+
+
+def escrever_pdf_faltas(destino, nome_plantao, faltosos, isvs_presentes, permutas_reposicao):
+    """Grava o PDF do relatório de faltas em `destino` (arquivo binário ou caminho)."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+    
+    # Cria documento
+    doc = SimpleDocTemplate(destino, pagesize=letter)
+    elements = []
+    
+    # Define estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=PDF_TITLE_FONT_SIZE,
+        spaceAfter=30,
+        alignment=1
+    )
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=PDF_SUBTITLE_FONT_SIZE,
+        spaceAfter=20,
+        spaceBefore=30,
+        alignment=1
+    )
+    date_style = ParagraphStyle(
+        'DateStyle',
+        parent=styles['Normal'],
+        fontSize=PDF_NORMAL_FONT_SIZE,
+        spaceAfter=20,
+        alignment=1
+    )
+    
+    # Adiciona título
+    title = Paragraph(f"Relatório do Plantão {nome_plantao}", title_style)
+    elements.append(title)
+    
+    # Adiciona data/hora
+    current_datetime = timezone.localtime().strftime("%d/%m/%Y %H:%M:%S")
+    date_paragraph = Paragraph(f"Gerado em: {current_datetime}", date_style)
+    elements.append(date_paragraph)
+    
+    # Seção de Faltas
+    if faltosos:
+        elements.append(Paragraph("Lista de Faltas", subtitle_style))
+    
+        # Dados da tabela
+        table_data = [['ORD', 'Nome', 'Documento']]
+        for faltoso in faltosos:
+            table_data.append([
+                str(faltoso['ord']),
+                faltoso['nome'],
+                faltoso['documento']
+            ])
+    
+        # Cria e estiliza tabela
+        table = Table(table_data, colWidths=[50, 350, 150])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), PDF_NORMAL_FONT_SIZE),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), TABLE_PADDING * 2),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), PDF_TABLE_FONT_SIZE),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
+            ('TOPPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('LEFTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+        ]))
+        elements.append(table)
+    else:
+        # Mensagem quando não há faltosos
+        no_data_style = ParagraphStyle(
+            'NoData',
+            parent=styles['Normal'],
+            fontSize=PDF_NORMAL_FONT_SIZE,
+            spaceAfter=20,
+            alignment=1
+        )
+        no_data = Paragraph("Não há faltas registradas para o plantão atual!", no_data_style)
+        elements.append(no_data)
+    
+    # Seção de ISVs
+    if isvs_presentes:
+        elements.append(Paragraph("Lista de ISVs Presentes", subtitle_style))
+    
+        # Dados da tabela
+        table_data = [['ORD', 'Nome', 'Documento', 'Hora']]
+        for isv in isvs_presentes:
+            table_data.append([
+                str(isv['ord']),
+                isv['nome'],
+                isv['documento'],
+                isv['hora_entrada']
+            ])
+    
+        # Cria e estiliza tabela
+        table = Table(table_data, colWidths=[50, 300, 150, 50])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#006400')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), PDF_NORMAL_FONT_SIZE),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), TABLE_PADDING * 2),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), PDF_TABLE_FONT_SIZE),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (-1, 0), (-1, -1), 'CENTER'),
+            ('TOPPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('LEFTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+        ]))
+        elements.append(table)
+    
+    # Seção de Permutas/Reposição de hora
+    if permutas_reposicao:
+        elements.append(Paragraph("Permutas/Reposição de Hora", subtitle_style))
+    
+        # Dados da tabela
+        table_data = [['ORD', 'Nome', 'Documento', 'Plantão', 'Hora']]
+        for permuta in permutas_reposicao:
+            table_data.append([
+                str(permuta['ord']),
+                permuta['nome'],
+                permuta['documento'],
+                f"{permuta['plantao_servidor']} -> {permuta['plantao_atual']}",
+                permuta['hora_entrada']
+            ])
+    
+        # Cria e estiliza tabela
+        table = Table(table_data, colWidths=[50, 280, 120, 80, 50])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FF8C00')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), PDF_NORMAL_FONT_SIZE),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), TABLE_PADDING * 2),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), PDF_TABLE_FONT_SIZE),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGN', (1, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (-1, 0), (-1, -1), 'CENTER'),
+            ('TOPPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('LEFTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), TABLE_PADDING),
+        ]))
+        elements.append(table)
+    
+    # Gera PDF
+    doc.build(elements)
+
+
+def exportar_excel_helper(registros, nome_arquivo, is_treinamento=False):
+    """
+    Função auxiliar para exportar registros para Excel de forma padronizada.
+    
+    Args:
+        registros: QuerySet de registros (RegistroDashboard ou RegistroAcessoTreinamento)
+        nome_arquivo: Prefixo do nome do arquivo
+        is_treinamento: Boolean indicando se é ambiente de treinamento
+    
+    Returns:
+        FileResponse com arquivo Excel
+    """
+    from .exportacao import resposta_xlsx
+    
+    # Define o timezone UTC-4
+    tz = pytz.timezone('America/Manaus')
+    agora = timezone.localtime(timezone.now(), tz)
+    
+    # Linhas geradas e larguras das colunas medidas numa única passada
+    return resposta_xlsx(
+        linhas_exportacao_dashboard(registros, tz, agora, is_treinamento),
+        COLUNAS_EXPORTACAO_DASHBOARD,
+        f'{nome_arquivo}_{agora.strftime("%Y%m%d_%H%M")}.xlsx',
+        titulo_planilha='Registros',
+        ajustar_larguras=True,
+    )
+
+MENSAGEM_ENTRADA_PENDENTE = (
+    'Este servidor já possui uma entrada sem saída registrada. '
+    'Registre a saída antes de fazer uma nova entrada.'
+)
+MENSAGEM_SAIDA_ANTERIOR_ENTRADA = 'O horário da saída é anterior ao da entrada sem saída deste servidor.'
+
+@contextmanager
+def transacao_escrita(using='default'):
+    """
+    transaction.atomic() que, no SQLite, já começa reservando a escrita (BEGIN IMMEDIATE).
 
-def registrar_entrada_helper(servidor, operador, observacao, isv, is_treinamento=False):
+    Usado só nos caminhos que leem e depois gravam sob concorrência (registro
+    de entrada/saída e importação): o terminal espera a vez até o busy timeout
+    em vez de receber "database is locked" ao passar da leitura para a escrita
+    no meio da transação. As demais transações continuam DEFERRED e não
+    disputam a escrita. Dentro de outra transação é só um savepoint.
+    """
+    from django.db import connections, transaction
+
+    conexao = connections[using]
+    if conexao.vendor != 'sqlite' or conexao.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    conexao.ensure_connection()
+    modo = conexao.transaction_mode
+    conexao.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            conexao.transaction_mode = modo
+            yield
+    finally:
+        conexao.transaction_mode = modo
+
+
+def registrar_entrada_helper(servidor, operador, observacao, isv, is_treinamento=False, data_hora=None):
     """
     Função auxiliar para registrar entradas de forma padronizada.
     
@@ -577,12 +1307,17 @@ def registrar_entrada_helper(servidor, operador, observacao, isv, is_treinamento
         observacao: Observação do registro
         isv: Boolean indicando se é ISV
         is_treinamento: Boolean indicando se é ambiente de treinamento
+        data_hora: Horário da entrada (padrão: agora; a fila offline dos
+            terminais informa o horário original da leitura)
     
     Returns:
         Tuple (sucesso: bool, mensagem: str)
     """
+    from django.db import IntegrityError
     from django.utils import timezone
     
+    data_hora = data_hora or timezone.now()
+    
     if is_treinamento:
         from .models import Servidor, ServidorTreinamento
         
@@ -593,10 +1328,10 @@ def registrar_entrada_helper(servidor, operador, observacao, isv, is_treinamento
         ).exists()
         
         if entrada_pendente:
-            return False, 'Este servidor já possui uma entrada sem saída registrada. Registre a saída antes de fazer uma nova entrada.'
+            return False, MENSAGEM_ENTRADA_PENDENTE
         
         # Cria o registro de entrada
-        ServidorTreinamento.objects.create(
+        registro = ServidorTreinamento.objects.create(
             servidor=servidor,
             operador=operador,
             tipo_acesso='ENTRADA',
@@ -606,53 +1341,285 @@ def registrar_entrada_helper(servidor, operador, observacao, isv, is_treinamento
             setor=servidor.setor,
             saida_pendente=True,
             status_alteracao='ORIGINAL',
-            data_hora=timezone.now()
+            data_hora=data_hora
         )
+        publicar_evento_dashboard('entrada', registro.pk, is_treinamento=True)
         
         return True, 'Entrada registrada com sucesso!'
     
     else:
         from .models import RegistroAcesso, RegistroDashboard
+        from .presenca import servidor_esta_dentro
         
-        # Verifica se já existe uma entrada sem saída no dashboard
-        entrada_pendente = RegistroDashboard.objects.filter(
-            servidor=servidor,
-            saida_pendente=True
-        ).exists()
-        
-        if entrada_pendente:
-            return False, 'Este servidor já possui uma entrada sem saída registrada. Registre a saída antes de fazer uma nova entrada.'
+        # Verifica se já existe uma entrada sem saída (projeção de presença)
+        if servidor_esta_dentro(servidor.pk):
+            return False, MENSAGEM_ENTRADA_PENDENTE
         
-        # Cria registro no histórico
-        registro_historico = RegistroAcesso.objects.create(
-            servidor=servidor,
-            operador=operador,
-            tipo_acesso='ENTRADA',
-            observacao=observacao,
-            isv=isv,
-            veiculo=servidor.veiculo,
-            setor=servidor.setor,
-            saida_pendente=True,
-            status_alteracao='ORIGINAL',
-            data_hora=timezone.now()
-        )
-        
-        # Cria registro no dashboard
-        RegistroDashboard.objects.create(
-            servidor=servidor,
-            operador=operador,
-            tipo_acesso='ENTRADA',
-            isv=isv,
-            veiculo=servidor.veiculo,
-            setor=servidor.setor,
-            data_hora=registro_historico.data_hora,
-            saida_pendente=True,
-            registro_historico=registro_historico
-        )
+        # Histórico e dashboard gravados juntos. Se outro terminal registrou a
+        # entrada entre a verificação acima e aqui, a restrição
+        # dashboard_entrada_pendente_unica recusa o segundo registro e a
+        # transação desfaz também o histórico.
+        try:
+            with transacao_escrita():
+                registro_historico = RegistroAcesso.objects.create(
+                    servidor=servidor,
+                    operador=operador,
+                    tipo_acesso='ENTRADA',
+                    observacao=observacao,
+                    isv=isv,
+                    veiculo=servidor.veiculo,
+                    setor=servidor.setor,
+                    saida_pendente=True,
+                    status_alteracao='ORIGINAL',
+                    data_hora=data_hora
+                )
+                
+                registro = RegistroDashboard.objects.create(
+                    servidor=servidor,
+                    operador=operador,
+                    tipo_acesso='ENTRADA',
+                    isv=isv,
+                    veiculo=servidor.veiculo,
+                    setor=servidor.setor,
+                    data_hora=registro_historico.data_hora,
+                    saida_pendente=True,
+                    registro_historico=registro_historico
+                )
+        except IntegrityError:
+            return False, MENSAGEM_ENTRADA_PENDENTE
+        publicar_evento_dashboard('entrada', registro.pk)
         
         return True, 'Entrada registrada com sucesso!'
 
-def registrar_saida_helper(servidor, operador, observacao, is_treinamento=False):
+# Máximo de servidores por lote de entradas (troca de plantão)
+LIMITE_LOTE_ENTRADAS = 500
+
+def registrar_entradas_em_lote_helper(servidor_ids, operador, observacao='', isv=False):
+    """
+    Registra as entradas de vários servidores numa única transação (troca de plantão).
+    
+    Histórico e dashboard são gravados com bulk_create; como ele não dispara
+    os sinais, o feed incremental, a presença e o cache dos contadores são
+    atualizados aqui. Itens em conflito (servidor inexistente ou inativo,
+    repetido na lista ou já com entrada sem saída) são recusados sem afetar
+    os demais.
+    
+    Args:
+        servidor_ids: Lista de ids de Servidor
+        operador: Usuário que está registrando
+        observacao: Observação aplicada a todas as entradas
+        isv: Boolean indicando se as entradas são ISV
+    
+    Returns:
+        Lista de dicts (servidor_id, nome, status, message, registro_id), na ordem recebida
+    """
+    from django.db import IntegrityError, transaction
+    from django.utils import timezone
+    from .models import AlteracaoDashboard, RegistroAcesso, RegistroDashboard, Servidor
+    from .presenca import aplicar_entradas_em_lote
+    
+    def resultado(servidor_id, sucesso, mensagem, registro_id=None, servidor=None):
+        return {
+            'servidor_id': servidor_id,
+            'nome': servidor.nome if servidor else None,
+            'status': 'success' if sucesso else 'error',
+            'message': mensagem,
+            'registro_id': registro_id,
+        }
+    
+    try:
+        with transacao_escrita():
+            servidores = Servidor.objects.filter(ativo=True).in_bulk(set(servidor_ids))
+            pendentes = set(RegistroDashboard.objects.filter(
+                servidor_id__in=servidores, saida_pendente=True
+            ).values_list('servidor_id', flat=True))
+            
+            resultados = []
+            aceitos = []
+            for servidor_id in servidor_ids:
+                if servidor_id not in servidores:
+                    resultados.append(resultado(servidor_id, False, 'Servidor não encontrado ou inativo.'))
+                elif servidor_id in pendentes:
+                    # Também cobre o mesmo servidor repetido na lista
+                    resultados.append(resultado(
+                        servidor_id, False, MENSAGEM_ENTRADA_PENDENTE, servidor=servidores[servidor_id]
+                    ))
+                else:
+                    pendentes.add(servidor_id)
+                    aceitos.append(servidores[servidor_id])
+                    resultados.append(None)
+            
+            if aceitos:
+                agora = timezone.now()
+                historicos = [
+                    RegistroAcesso(
+                        servidor=servidor,
+                        operador=operador,
+                        tipo_acesso='ENTRADA',
+                        observacao=observacao,
+                        isv=isv,
+                        veiculo=servidor.veiculo,
+                        setor=servidor.setor,
+                        saida_pendente=True,
+                        status_alteracao='ORIGINAL',
+                        data_hora=agora,
+                    )
+                    for servidor in aceitos
+                ]
+                for registro in historicos:
+                    registro._aplicar_caixa_alta_setor()
+                RegistroAcesso.objects.bulk_create(historicos)
+                
+                registros = [
+                    RegistroDashboard(
+                        servidor=historico.servidor,
+                        operador=operador,
+                        tipo_acesso='ENTRADA',
+                        isv=isv,
+                        veiculo=historico.veiculo,
+                        setor=historico.setor,
+                        data_hora=agora,
+                        saida_pendente=True,
+                        registro_historico=historico,
+                    )
+                    for historico in historicos
+                ]
+                RegistroDashboard.objects.bulk_create(registros)
+                
+                # O que os sinais de RegistroDashboard fariam linha a linha
+                AlteracaoDashboard.objects.bulk_create([
+                    AlteracaoDashboard(registro_id=registro.pk, tipo='ALTERACAO') for registro in registros
+                ])
+                aplicar_entradas_em_lote(registros)
+                transaction.on_commit(invalidar_dashboard_stats)
+                publicar_evento_dashboard('entrada')
+                
+                por_servidor = {registro.servidor_id: registro.pk for registro in registros}
+                resultados = [
+                    item or resultado(
+                        servidor_id, True, 'Entrada registrada com sucesso!',
+                        por_servidor[servidor_id], servidores[servidor_id]
+                    )
+                    for servidor_id, item in zip(servidor_ids, resultados)
+                ]
+            return resultados
+    except IntegrityError:
+        # Outro terminal registrou algum dos servidores entre a verificação e a
+        # gravação: refaz item a item, recusando só os conflitantes
+        resultados = []
+        for servidor_id in servidor_ids:
+            servidor = Servidor.objects.filter(pk=servidor_id, ativo=True).first()
+            if servidor is None:
+                resultados.append(resultado(servidor_id, False, 'Servidor não encontrado ou inativo.'))
+                continue
+            sucesso, mensagem = registrar_entrada_helper(servidor, operador, observacao, isv)
+            registro_id = RegistroDashboard.objects.filter(
+                servidor_id=servidor_id, saida_pendente=True
+            ).values_list('id', flat=True).first() if sucesso else None
+            resultados.append(resultado(servidor_id, sucesso, mensagem, registro_id, servidor))
+        return resultados
+
+# Máximo de eventos por sincronização da fila offline de um terminal
+LIMITE_EVENTOS_SINCRONIZACAO = 500
+
+def sincronizar_eventos_terminal_helper(eventos, operador):
+    """
+    Aplica a fila offline de um terminal da portaria, na ordem do horário original.
+    
+    Cada evento é um dict {chave, tipo_acesso ('ENTRADA' ou 'SAIDA'),
+    servidor_id ou documento, data_hora (ISO 8601), observacao, isv} e é
+    registrado na sua própria transação com o horário da leitura (horários no
+    futuro viram agora). A chave deduplica os reenvios: um evento já aplicado,
+    inclusive pela requisição original cuja resposta se perdeu, devolve o
+    resultado gravado. Recusas pelo estado atual (409) não ficam gravadas e o
+    reenvio tenta de novo.
+    
+    Args:
+        eventos: Lista de dicts recebida do terminal
+        operador: Usuário do terminal
+    
+    Returns:
+        Lista de dicts (chave, status, message, repetido, reenviar), na ordem
+        aplicada; eventos malformados vêm primeiro, recusados sem registrar
+        nada. reenviar=True só quando o evento falhou por erro do servidor e
+        deve continuar na fila do terminal.
+    """
+    from django.utils.dateparse import parse_datetime
+    from .idempotencia import executar_idempotente
+    from .models import Servidor
+    
+    agora = timezone.now()
+    
+    def resultado(chave, status, mensagem, repetido=False, reenviar=False):
+        return {
+            'chave': chave, 'status': status, 'message': mensagem,
+            'repetido': repetido, 'reenviar': reenviar,
+        }
+    
+    resultados = []
+    fila = []
+    for evento in eventos:
+        chave = str(evento.get('chave') or '').strip() if isinstance(evento, dict) else ''
+        if not chave:
+            resultados.append(resultado(chave, 'error', 'Evento sem chave de idempotência.'))
+            continue
+        if evento.get('tipo_acesso') not in ('ENTRADA', 'SAIDA'):
+            resultados.append(resultado(chave, 'error', 'Tipo de acesso inválido.'))
+            continue
+        try:
+            data_hora = parse_datetime(str(evento.get('data_hora') or ''))
+        except ValueError:
+            data_hora = None
+        if data_hora is None:
+            resultados.append(resultado(chave, 'error', 'Horário do evento inválido.'))
+            continue
+        if timezone.is_naive(data_hora):
+            data_hora = timezone.make_aware(data_hora)
+        fila.append((min(data_hora, agora), chave, evento))
+    
+    def localizar_servidor(evento):
+        servidores = Servidor.objects.filter(ativo=True)
+        if evento.get('servidor_id'):
+            return servidores.filter(pk=evento['servidor_id']).first()
+        digitos = normalizar_documento(str(evento.get('documento') or ''))
+        return servidores.filter(documento_digitos=digitos).first() if digitos else None
+    
+    def aplicar(evento, data_hora):
+        servidor = localizar_servidor(evento)
+        if servidor is None:
+            return 404, {'status': 'error', 'message': 'Servidor não encontrado ou inativo.'}
+        observacao = str(evento.get('observacao') or '')
+        if evento['tipo_acesso'] == 'ENTRADA':
+            sucesso, mensagem = registrar_entrada_helper(
+                servidor, operador, observacao, bool(evento.get('isv')), data_hora=data_hora
+            )
+        else:
+            sucesso, mensagem = registrar_saida_helper(servidor, operador, observacao, data_hora=data_hora)
+        return (200 if sucesso else 409), {
+            'status': 'success' if sucesso else 'error',
+            'message': f'{servidor.nome}: {mensagem}',
+        }
+    
+    # sort é estável: eventos com o mesmo horário mantêm a ordem da fila
+    for data_hora, chave, evento in sorted(fila, key=lambda item: item[0]):
+        try:
+            _, resposta, repetido = executar_idempotente(
+                chave, operador, f"sincronizacao_{evento['tipo_acesso'].lower()}",
+                lambda: aplicar(evento, data_hora),
+            )
+        except Exception:
+            # Nada foi gravado (nem a chave): o terminal pode reenviar o evento
+            logger.exception('Erro ao sincronizar o evento %s', chave)
+            resultados.append(resultado(
+                chave, 'error', 'Erro ao aplicar o evento. Reenvie mais tarde.', reenviar=True
+            ))
+            continue
+        resultados.append(resultado(
+            chave, resposta.get('status', 'error'), resposta.get('message', ''), repetido
+        ))
+    return resultados
+
+def registrar_saida_helper(servidor, operador, observacao, is_treinamento=False, data_hora=None):
     """
     Função auxiliar para registrar saídas de forma padronizada.
     
@@ -661,12 +1628,15 @@ def registrar_saida_helper(servidor, operador, observacao, is_treinamento=False)
         operador: Usuário que está registrando
         observacao: Observação do registro
         is_treinamento: Boolean indicando se é ambiente de treinamento
+        data_hora: Horário da saída (padrão: agora), como em registrar_entrada_helper
     
     Returns:
         Tuple (sucesso: bool, mensagem: str)
     """
     from django.utils import timezone
     
+    data_hora = data_hora or timezone.now()
+    
     if is_treinamento:
         from .models import ServidorTreinamento
         
@@ -678,13 +1648,16 @@ def registrar_saida_helper(servidor, operador, observacao, is_treinamento=False)
         
         if not entrada_pendente:
             return False, 'Não foi encontrada uma entrada sem saída para este servidor. Registre uma entrada primeiro.'
+        if data_hora < entrada_pendente.data_hora:
+            return False, MENSAGEM_SAIDA_ANTERIOR_ENTRADA
         
         # Atualiza o registro existente
-        entrada_pendente.data_hora_saida = timezone.now()
+        entrada_pendente.data_hora_saida = data_hora
         entrada_pendente.operador_saida = operador
         entrada_pendente.observacao_saida = observacao
         entrada_pendente.saida_pendente = False
         entrada_pendente.save()
+        publicar_evento_dashboard('saida', entrada_pendente.pk, is_treinamento=True)
         
         return True, 'Saída registrada com sucesso!'
     
@@ -699,20 +1672,23 @@ def registrar_saida_helper(servidor, operador, observacao, is_treinamento=False)
         
         if not entrada_pendente:
             return False, 'Não foi encontrada uma entrada sem saída para este servidor. Registre uma entrada primeiro.'
+        if data_hora < entrada_pendente.data_hora:
+            return False, MENSAGEM_SAIDA_ANTERIOR_ENTRADA
         
-        # Atualiza o registro histórico
-        registro_historico = entrada_pendente.registro_historico
-        registro_historico.data_hora_saida = timezone.now()
-        registro_historico.operador_saida = operador
-        registro_historico.observacao_saida = observacao
-        registro_historico.saida_pendente = False
-        registro_historico.save()
-        
-        # Atualiza o registro no dashboard
-        entrada_pendente.data_hora_saida = registro_historico.data_hora_saida
-        entrada_pendente.operador_saida = operador
-        entrada_pendente.saida_pendente = False
-        entrada_pendente.save()
+        # Histórico, dashboard e presença atualizados juntos
+        with transacao_escrita():
+            registro_historico = entrada_pendente.registro_historico
+            registro_historico.data_hora_saida = data_hora
+            registro_historico.operador_saida = operador
+            registro_historico.observacao_saida = observacao
+            registro_historico.saida_pendente = False
+            registro_historico.save()
+            
+            entrada_pendente.data_hora_saida = registro_historico.data_hora_saida
+            entrada_pendente.operador_saida = operador
+            entrada_pendente.saida_pendente = False
+            entrada_pendente.save()
+        publicar_evento_dashboard('saida', entrada_pendente.pk)
         
         return True, 'Saída registrada com sucesso!'
 
@@ -817,7 +1793,7 @@ def saida_definitiva_helper(request, is_treinamento=False):
             
             # Cria o registro de saída definitiva
             data_hora = timezone.now()
-            RegistroAcessoTreinamento.objects.create(
+            registro = RegistroAcessoTreinamento.objects.create(
                 servidor=servidor,
                 tipo_acesso='SAIDA',
                 operador=request.user,
@@ -832,49 +1808,55 @@ def saida_definitiva_helper(request, is_treinamento=False):
         else:
             from .models import Servidor, RegistroAcesso, RegistroDashboard
             
-            # Busca ou cria o servidor
-            servidor, created = Servidor.objects.get_or_create(
-                numero_documento=numero_documento,
-                defaults={
-                    'nome': nome_completo,
-                    'setor': justificativa,
-                    'ativo': True,
-                    'veiculo': None
-                }
-            )
+            # Servidor, histórico, dashboard e presença gravados juntos
+            with transacao_escrita():
+                # Busca ou cria o servidor (pelos dígitos, como a restrição de documento único)
+                digitos = normalizar_documento(numero_documento)
+                busca = {'documento_digitos': digitos} if digitos else {'numero_documento': numero_documento}
+                servidor, created = Servidor.objects.get_or_create(
+                    **busca,
+                    defaults={
+                        'numero_documento': numero_documento,
+                        'nome': nome_completo,
+                        'setor': justificativa,
+                        'ativo': True,
+                        'veiculo': None
+                    }
+                )
             
-            if not created:
-                servidor.nome = nome_completo
-                servidor.setor = justificativa
-                servidor.save()
+                if not created:
+                    servidor.nome = nome_completo
+                    servidor.setor = justificativa
+                    servidor.save()
             
-            # Cria o registro no histórico
-            data_hora = timezone.now()
-            registro_historico = RegistroAcesso.objects.create(
-                servidor=servidor,
-                tipo_acesso='SAIDA',
-                operador=request.user,
-                observacao=justificativa,
-                data_hora=data_hora,
-                data_hora_saida=data_hora,
-                veiculo=servidor.veiculo,
-                setor=servidor.setor,
-                status_alteracao='ORIGINAL',
-                saida_pendente=False
-            )
+                # Cria o registro no histórico
+                data_hora = timezone.now()
+                registro_historico = RegistroAcesso.objects.create(
+                    servidor=servidor,
+                    tipo_acesso='SAIDA',
+                    operador=request.user,
+                    observacao=justificativa,
+                    data_hora=data_hora,
+                    data_hora_saida=data_hora,
+                    veiculo=servidor.veiculo,
+                    setor=servidor.setor,
+                    status_alteracao='ORIGINAL',
+                    saida_pendente=False
+                )
             
-            # Cria o registro no dashboard
-            RegistroDashboard.objects.create(
-                servidor=servidor,
-                tipo_acesso='SAIDA',
-                operador=request.user,
-                data_hora=data_hora,
-                data_hora_saida=data_hora,
-                veiculo=servidor.veiculo,
-                setor=servidor.setor,
-                saida_pendente=False,
-                registro_historico=registro_historico
-            )
+                # Cria o registro no dashboard
+                registro = RegistroDashboard.objects.create(
+                    servidor=servidor,
+                    tipo_acesso='SAIDA',
+                    operador=request.user,
+                    data_hora=data_hora,
+                    data_hora_saida=data_hora,
+                    veiculo=servidor.veiculo,
+                    setor=servidor.setor,
+                    saida_pendente=False,
+                    registro_historico=registro_historico
+                )
+        publicar_evento_dashboard('saida', registro.pk, is_treinamento=is_treinamento)
         
         return {
             'status': 'success',
@@ -899,6 +1881,7 @@ def limpar_dashboard_helper(request, is_treinamento=False):
         Dict com status e mensagem para JsonResponse
     """
     from django.db.models import Q
+    from .idempotencia import podar_chaves_idempotencia
     
     senha = request.POST.get('senha')
     
@@ -950,8 +1933,11 @@ def limpar_dashboard_helper(request, is_treinamento=False):
             registros_excluidos = RegistroDashboard.objects.filter(
                 Q(saida_pendente=False) | Q(tipo_acesso='SAIDA')
             ).delete()
+            podar_alteracoes_dashboard()
+            podar_chaves_idempotencia()
         
         excluidos_count = registros_excluidos[0] if registros_excluidos else 0
+        publicar_evento_dashboard('exclusao', is_treinamento=is_treinamento)
         
         ambiente = "treinamento" if is_treinamento else "produção"
         return {
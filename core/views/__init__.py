@@ -15,9 +15,16 @@ from .registro_views import (
     registro_acesso_create, registro_manual_create, registros_plantao,
     registro_detalhe, registro_acesso_update, excluir_registro,
     registrar_saida, saida_definitiva, limpar_dashboard, exportar_excel,
-    retirar_faltas
+    retirar_faltas, ocupacao_unidade, registrar_leitura, registrar_entradas_lote,
+    sincronizar_terminal
 )
 
+# Push do dashboard (Server-Sent Events)
+from .eventos_views import eventos_dashboard
+
+# Exportações em segundo plano
+from .exportacao_views import status_exportacao, download_exportacao
+
 # Views de usuários refatoradas
 from .user_views import (
     user_list, user_create, user_update, user_delete,
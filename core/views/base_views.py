@@ -20,8 +20,8 @@ from django.utils import timezone
 import pytz
 
 from core.authentication import CanaimeAuthBackend
-from core.models import PerfilUsuario, RegistroDashboard, Servidor
-from core.utils import calcular_plantao_atual, dashboard_registros_ativos
+from core.models import PerfilUsuario
+from core.utils import calcular_plantao_atual, dashboard_stats
 
 
 def login_view(request):
@@ -154,7 +154,6 @@ def home(request):
     Exibe:
     - Resumo do plantão atual
     - Estatísticas de entradas, saídas e pendentes
-    - Lista de servidores ativos
     - Controles de acordo com permissões do usuário
     """
     # Define o timezone UTC-4
@@ -173,16 +172,8 @@ def home(request):
     
     plantao_atual = calcular_plantao_atual()
     
-    # Filtra registros do plantão atual
-    registros = dashboard_registros_ativos().select_related('servidor', 'operador')
-    
-    # Calcula totais para os cards
-    total_entradas = registros.filter(tipo_acesso='ENTRADA').count()  # Total de entradas
-    total_saidas = registros.filter(data_hora_saida__isnull=False).count()  # Total de saídas normais
-    total_pendentes = registros.filter(tipo_acesso='ENTRADA', saida_pendente=True).count()  # Entradas sem saída
-    
-    # Lista de servidores para os modais
-    servidores = Servidor.objects.filter(ativo=True).order_by('nome')
+    # Calcula totais para os cards (uma consulta agregada, em cache por plantão)
+    totais = dashboard_stats(is_treinamento=False)
     
     # Verifica permissões do usuário
     try:
@@ -202,10 +193,7 @@ def home(request):
 
     context = {
         'plantao_atual': plantao_atual,
-        'total_entradas': total_entradas,
-        'total_saidas': total_saidas,
-        'total_pendentes': total_pendentes,
-        'servidores': servidores,
+        **totais,
         'mostrar_aviso_plantao': mostrar_aviso,
         'hora_atual': f"{hora_atual:02d}:{minuto_atual:02d}",
         'is_superuser': request.user.is_superuser,
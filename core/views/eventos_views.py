@@ -0,0 +1,57 @@
+"""
+Views de push do dashboard via Server-Sent Events.
+
+Responsável por:
+- Stream de eventos de entrada/saída/edição/exclusão para os terminais
+"""
+
+import asyncio
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from ..eventos import canal_dashboard
+
+# Comentário periódico que mantém a conexão viva atrás do IIS
+INTERVALO_HEARTBEAT = 15
+
+
+async def _fluxo_eventos(fila, ambiente):
+    """Gera o stream SSE de uma conexão até o cliente desconectar."""
+    try:
+        # Tempo de reconexão automática do EventSource (ms)
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=INTERVALO_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if evento['ambiente'] != ambiente:
+                continue
+            yield f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+    finally:
+        canal_dashboard.cancelar(fila)
+
+
+@login_required
+async def eventos_dashboard(request):
+    """
+    Stream SSE com as mudanças do dashboard (?ambiente=treinamento para o treino).
+
+    Só funciona sob ASGI (uvicorn em produção). No runserver (WSGI) responde
+    204, o que faz o EventSource desistir sem ficar reconectando.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    ambiente = 'treinamento' if request.GET.get('ambiente') == 'treinamento' else 'producao'
+    fila = canal_dashboard.assinar()
+    response = StreamingHttpResponse(
+        _fluxo_eventos(fila, ambiente), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,63 @@
+"""
+Views das exportações em segundo plano.
+
+Responsável por:
+- Status/progresso das tarefas de exportação (JSON)
+- Download do arquivo gerado pelo worker
+- Resposta padrão das views que enfileiram exportações
+"""
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.html import format_html
+
+from ..exportacao import ArquivoEmFluxo
+from ..models import TarefaExportacao
+from ..tarefas import serializar_tarefa
+
+
+def _tarefa_do_usuario(request, pk):
+    """Busca a tarefa; só o solicitante ou um superusuário pode vê-la."""
+    tarefa = get_object_or_404(TarefaExportacao, pk=pk)
+    if tarefa.usuario_id != request.user.id and not request.user.is_superuser:
+        raise Http404('Exportação não encontrada')
+    return tarefa
+
+
+def responder_tarefa_enfileirada(request, tarefa, destino):
+    """
+    Resposta das views que enfileiram uma exportação.
+
+    AJAX recebe 202 com o status (para acompanhar o progresso); a navegação
+    normal volta para `destino` com um aviso contendo o link da tarefa.
+    """
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse(serializar_tarefa(tarefa), status=202)
+
+    messages.info(request, format_html(
+        'Exportação enviada para segundo plano. <a href="{}">Acompanhar / baixar</a>',
+        serializar_tarefa(tarefa)['status_url'],
+    ))
+    return redirect(destino)
+
+
+@login_required
+def status_exportacao(request, pk):
+    """Status e progresso de uma exportação em segundo plano."""
+    return JsonResponse(serializar_tarefa(_tarefa_do_usuario(request, pk)))
+
+
+@login_required
+def download_exportacao(request, pk):
+    """Entrega o arquivo de uma exportação concluída."""
+    tarefa = _tarefa_do_usuario(request, pk)
+    if tarefa.status != 'CONCLUIDA' or not tarefa.arquivo:
+        return JsonResponse(serializar_tarefa(tarefa), status=409)
+
+    try:
+        arquivo = tarefa.arquivo.open('rb')
+    except FileNotFoundError:
+        raise Http404('Arquivo da exportação não encontrado')
+    return ArquivoEmFluxo(arquivo, as_attachment=True, filename=tarefa.nome_arquivo)
@@ -2,8 +2,10 @@
 Views de gerenciamento de registros de acesso (produção).
 
 Responsável por:
-- Criação de registros de acesso
+- Criação de registros de acesso (formulário, leitura de crachá e em lote)
+- Sincronização da fila offline dos terminais (idempotente)
 - Listagem e detalhes dos registros
+- Ocupação atual da unidade (JSON)
 - Edição e exclusão de registros
 - Saída de servidores
 - Limpeza do dashboard
@@ -11,6 +13,7 @@ Responsável por:
 - Relatório de faltas e ISVs
 """
 
+import json
 import pytz
 import logging
 from datetime import datetime
@@ -18,9 +21,13 @@ from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db.models import Max, Min
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 
-from ..models import RegistroDashboard, RegistroAcesso, Servidor
+from ..eventos import publicar_evento_dashboard
+from ..models import AlteracaoDashboard, RegistroDashboard, RegistroAcesso, Servidor
 from ..decorators import (
     pode_registrar_acesso, pode_excluir_registros, 
     pode_saida_definitiva, pode_limpar_dashboard
@@ -28,8 +35,15 @@ from ..decorators import (
 from ..utils import (
     processar_registro_acesso_helper, exportar_excel_helper,
     saida_definitiva_helper, limpar_dashboard_helper,
-    dashboard_registros_ativos,
+    dashboard_registros_ativos, versao_dashboard, ocupacao_atual,
+    normalizar_documento, registrar_entrada_helper, registrar_saida_helper,
+    registrar_entradas_em_lote_helper, LIMITE_LOTE_ENTRADAS,
+    sincronizar_eventos_terminal_helper, LIMITE_EVENTOS_SINCRONIZACAO, transacao_escrita,
 )
+from ..idempotencia import chave_da_requisicao, executar_idempotente
+from ..presenca import presenca_do_servidor
+from ..tarefas import enfileirar_exportacao
+from .exportacao_views import responder_tarefa_enfileirada
 from .registro_extended import registro_acesso_update, retirar_faltas
 
 logger = logging.getLogger(__name__)
@@ -38,20 +52,179 @@ logger = logging.getLogger(__name__)
 @login_required
 @pode_registrar_acesso
 def registro_acesso_create(request):
-    """Cria um novo registro de acesso."""
+    """
+    Cria um novo registro de acesso.
+
+    Com idempotency_key (campo do formulário ou cabeçalho Idempotency-Key), o
+    reenvio do mesmo formulário mostra o resultado original sem registrar de novo.
+    """
     if request.method == 'POST':
-        sucesso, mensagem, redirect_url = processar_registro_acesso_helper(request, is_treinamento=False)
+        def registrar():
+            sucesso, mensagem, redirect_url = processar_registro_acesso_helper(request, is_treinamento=False)
+            return (200 if sucesso else 409), {
+                'status': 'success' if sucesso else 'error',
+                'message': mensagem,
+                'redirect_url': redirect_url,
+            }
+        
+        _, resposta, repetida = executar_idempotente(
+            chave_da_requisicao(request), request.user, 'registro_acesso_create', registrar
+        )
         
-        if sucesso:
-            messages.success(request, mensagem)
+        if repetida:
+            messages.info(request, f"Registro já processado: {resposta['message']}")
+        elif resposta['status'] == 'success':
+            messages.success(request, resposta['message'])
         else:
-            messages.error(request, mensagem)
+            messages.error(request, resposta['message'])
         
-        return redirect(redirect_url)
+        return redirect(resposta.get('redirect_url', 'home'))
     
     return redirect('home')
 
 
+@login_required
+@pode_registrar_acesso
+@require_POST
+def registrar_leitura(request):
+    """
+    Registro em uma leitura (leitor de crachá/código de barras da portaria).
+
+    Recebe o documento como lido (qualquer pontuação), localiza o servidor
+    ativo pelos dígitos (coluna indexada documento_digitos), decide entre
+    ENTRADA e SAÍDA pela presença atual e grava na hora::
+
+        POST documento=123.456.789-00 [isv=on] [observacao=...]
+        -> {"status": "success", "tipo_acesso": "ENTRADA", "message": "...",
+            "registro": {linha do dashboard, como em registros_plantao}}
+
+    Erros: 400 sem documento, 404 servidor não encontrado, 409 registro
+    recusado (ex.: outro terminal registrou antes).
+    """
+    digitos = normalizar_documento(request.POST.get('documento', ''))
+    if not digitos:
+        return JsonResponse({'status': 'error', 'message': 'Documento não informado.'}, status=400)
+
+    # documento_digitos é único (migração 0030)
+    servidor = Servidor.objects.filter(documento_digitos=digitos, ativo=True).first()
+    if servidor is None:
+        return JsonResponse(
+            {'status': 'error', 'message': f'Nenhum servidor ativo com o documento {digitos}.'},
+            status=404,
+        )
+
+    observacao = request.POST.get('observacao', '')
+    presenca = presenca_do_servidor(servidor.pk)
+    if presenca and presenca.dentro:
+        tipo_acesso = 'SAIDA'
+        registro_id = presenca.registro_pendente_id
+        sucesso, mensagem = registrar_saida_helper(servidor, request.user, observacao)
+    else:
+        tipo_acesso = 'ENTRADA'
+        sucesso, mensagem = registrar_entrada_helper(
+            servidor, request.user, observacao, request.POST.get('isv') == 'on'
+        )
+        registro_id = presenca_do_servidor(servidor.pk).registro_pendente_id if sucesso else None
+
+    if not sucesso:
+        return JsonResponse({'status': 'error', 'message': mensagem}, status=409)
+
+    registro = RegistroDashboard.objects.select_related('servidor').get(pk=registro_id)
+    return JsonResponse({
+        'status': 'success',
+        'tipo_acesso': tipo_acesso,
+        'message': f'{servidor.nome}: {mensagem}',
+        'registro': _serializar_registro_dashboard(registro, pytz.timezone('America/Manaus')),
+    })
+
+
+@login_required
+@pode_registrar_acesso
+@require_POST
+def registrar_entradas_lote(request):
+    """
+    Entradas de vários servidores numa única transação (troca de plantão).
+
+    POST servidores=<id> (repetido para cada servidor) [isv=on] [observacao=...]
+    -> {"status": "success", "registrados": 18, "recusados": 2,
+        "resultados": [{"servidor_id": 7, "status": "success", "message": "...",
+                        "registro_id": 301}, ...]}
+    """
+    try:
+        servidor_ids = [int(valor) for valor in request.POST.getlist('servidores')]
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Lista de servidores inválida.'}, status=400)
+    if not servidor_ids:
+        return JsonResponse({'status': 'error', 'message': 'Nenhum servidor selecionado.'}, status=400)
+    if len(servidor_ids) > LIMITE_LOTE_ENTRADAS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Selecione no máximo {LIMITE_LOTE_ENTRADAS} servidores por vez.',
+        }, status=400)
+
+    resultados = registrar_entradas_em_lote_helper(
+        servidor_ids,
+        request.user,
+        request.POST.get('observacao', ''),
+        request.POST.get('isv') == 'on',
+    )
+    registrados = sum(1 for item in resultados if item['status'] == 'success')
+    return JsonResponse({
+        'status': 'success',
+        'registrados': registrados,
+        'recusados': len(resultados) - registrados,
+        'resultados': resultados,
+    })
+
+
+@login_required
+@pode_registrar_acesso
+@require_POST
+def sincronizar_terminal(request):
+    """
+    Reenvio da fila offline de um terminal da portaria, numa requisição.
+
+    O terminal continua registrando sem rede e guarda cada ação com uma chave
+    de idempotência e o horário da leitura; ao reconectar envia tudo (JSON):
+
+        {"eventos": [{"chave": "9f1c...", "tipo_acesso": "ENTRADA",
+                      "servidor_id": 7, "data_hora": "2026-10-18T07:02:11-04:00",
+                      "observacao": "", "isv": false}, ...]}
+        -> {"status": "success", "aplicados": 40, "repetidos": 2, "recusados": 1,
+            "resultados": [{"chave": "9f1c...", "status": "success",
+                            "message": "...", "repetido": false,
+                            "reenviar": false}, ...]}
+
+    Os eventos são aplicados na ordem do horário original e podem trazer
+    "documento" no lugar de "servidor_id" (leitor de crachá). Reenviar a
+    mesma fila é seguro: eventos já aplicados voltam com "repetido": true.
+    O terminal tira da fila tudo que voltou com "reenviar": false (a fila do
+    dashboard em home.html faz isso).
+    """
+    try:
+        eventos = json.loads(request.body).get('eventos')
+    except (ValueError, AttributeError):
+        eventos = None
+    if not isinstance(eventos, list):
+        return JsonResponse({'status': 'error', 'message': 'Envie {"eventos": [...]} em JSON.'}, status=400)
+    if len(eventos) > LIMITE_EVENTOS_SINCRONIZACAO:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Envie no máximo {LIMITE_EVENTOS_SINCRONIZACAO} eventos por vez.',
+        }, status=400)
+
+    resultados = sincronizar_eventos_terminal_helper(eventos, request.user)
+    novos = [item for item in resultados if not item['repetido']]
+    aplicados = sum(1 for item in novos if item['status'] == 'success')
+    return JsonResponse({
+        'status': 'success',
+        'aplicados': aplicados,
+        'repetidos': len(resultados) - len(novos),
+        'recusados': len(novos) - aplicados,
+        'resultados': resultados,
+    })
+
+
 @login_required
 def registro_manual_create(request):
     """Cria um registro manual de entrada/saída."""
@@ -96,53 +269,127 @@ def registro_manual_create(request):
     return redirect('home')
 
 
+def _serializar_registro_dashboard(registro, tz):
+    """Converte um RegistroDashboard na linha exibida pela tabela do dashboard."""
+    # Converte os horários para UTC-4
+    data_hora = timezone.localtime(registro.data_hora, tz)
+    data_hora_saida = timezone.localtime(registro.data_hora_saida, tz) if registro.data_hora_saida else None
+
+    # Se for uma saída definitiva
+    if registro.tipo_acesso == 'SAIDA':
+        return {
+            'id': registro.id,
+            'servidor_id': registro.servidor_id,
+            'servidor_nome': f"Egresso: {registro.servidor.nome}" if not registro.servidor.nome.startswith('Egresso:') else registro.servidor.nome,
+            'servidor_documento': registro.servidor.numero_documento,
+            'setor': registro.setor or '-',
+            'veiculo': registro.veiculo or '-',
+            'isv': registro.isv,
+            'hora_entrada': '-',
+            'hora_saida': data_hora.strftime('%d/%m/%Y %H:%M'),
+            'tipo_acesso': registro.tipo_acesso,
+            'saida_pendente': False,
+            'data_hora_iso': data_hora.isoformat(),
+        }
+
+    # Entrada normal
+    return {
+        'id': registro.id,
+        'servidor_id': registro.servidor_id,
+        'servidor_nome': registro.servidor.nome,
+        'servidor_documento': registro.servidor.numero_documento,
+        'setor': registro.servidor.setor or '-',
+        'veiculo': registro.veiculo or '-',
+        'isv': registro.isv,
+        'hora_entrada': data_hora.strftime('%d/%m/%Y %H:%M'),
+        'hora_saida': data_hora_saida.strftime('%d/%m/%Y %H:%M') if data_hora_saida else None,
+        'tipo_acesso': registro.tipo_acesso,
+        'saida_pendente': registro.saida_pendente,
+        'data_hora_iso': data_hora.isoformat(),
+    }
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+def ocupacao_unidade(request):
+    """
+    Ocupação atual da unidade em JSON, para o painel do dashboard e telas de parede::
+
+        {"total": 42, "por_setor": {"ALFA": 30, ...}, "por_plantao": {"ALFA": 30, ...},
+         "por_tipo_funcionario": {"Plantonista": 35, ...},
+         "isv": {"isv": 3, "nao_isv": 39}, "atualizado_em": "2026-10-18T12:00:00-04:00"}
+
+    Agregado em cache (ver ocupacao_atual): pode ser consultado a cada poucos segundos.
+    """
+    return JsonResponse(ocupacao_atual())
+
+
+def _etag_registros_plantao(request):
+    return versao_dashboard(is_treinamento=False)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_registros_plantao)
 def registros_plantao(request):
-    """API que retorna todos os registros do dashboard em JSON."""
-    # Obtém todos os registros do dashboard
+    """
+    API que retorna os registros do dashboard em JSON.
+
+    Sem parâmetros devolve a lista completa. Com ``since=<cursor>`` devolve só
+    o que mudou depois do cursor informado::
+
+        {"cursor": 42, "completo": false, "registros": [...], "removidos": [7, 9]}
+
+    ``completo`` indica que o cursor não pôde ser atendido (zero, futuro ou já
+    podado) e que ``registros`` traz o dashboard inteiro. O cursor atual também
+    vai no cabeçalho ``X-Dashboard-Cursor``. Responde 304 quando o ETag
+    enviado em If-None-Match ainda corresponde à versão do dashboard.
+    """
+    tz = pytz.timezone('America/Manaus')
     registros = dashboard_registros_ativos().select_related(
         'servidor', 'operador', 'operador_saida'
     ).order_by('data_hora', 'id')
-    
-    # Define o timezone UTC-4
-    tz = pytz.timezone('America/Manaus')
-    
-    data = []
-    for registro in registros:
-        # Converte os horários para UTC-4
-        data_hora = timezone.localtime(registro.data_hora, tz)
-        data_hora_saida = timezone.localtime(registro.data_hora_saida, tz) if registro.data_hora_saida else None
-        
-        # Se for uma entrada normal
-        if registro.tipo_acesso == 'ENTRADA':
-            data.append({
-                'id': registro.id,
-                'servidor_nome': registro.servidor.nome,
-                'servidor_documento': registro.servidor.numero_documento,
-                'setor': registro.servidor.setor or '-',
-                'veiculo': registro.veiculo or '-',
-                'isv': registro.isv,
-                'hora_entrada': data_hora.strftime('%d/%m/%Y %H:%M'),
-                'hora_saida': data_hora_saida.strftime('%d/%m/%Y %H:%M') if data_hora_saida else None,
-                'tipo_acesso': registro.tipo_acesso,
-                'saida_pendente': registro.saida_pendente
-            })
-        # Se for uma saída definitiva
-        elif registro.tipo_acesso == 'SAIDA':
-            data.append({
-                'id': registro.id,
-                'servidor_nome': f"Egresso: {registro.servidor.nome}" if not registro.servidor.nome.startswith('Egresso:') else registro.servidor.nome,
-                'servidor_documento': registro.servidor.numero_documento,
-                'setor': registro.setor or '-',
-                'veiculo': registro.veiculo or '-',
-                'isv': registro.isv,
-                'hora_entrada': '-',
-                'hora_saida': data_hora.strftime('%d/%m/%Y %H:%M'),
-                'tipo_acesso': registro.tipo_acesso,
-                'saida_pendente': False
-            })
-    
-    return JsonResponse(data, safe=False)
+
+    # Lido antes dos registros: mudanças concorrentes só podem ser reenviadas, nunca perdidas
+    limites = AlteracaoDashboard.objects.aggregate(primeiro=Min('id'), ultimo=Max('id'))
+    cursor = limites['ultimo'] or 0
+
+    since = request.GET.get('since')
+    if since is None:
+        data = [_serializar_registro_dashboard(registro, tz) for registro in registros]
+        response = JsonResponse(data, safe=False)
+        response['X-Dashboard-Cursor'] = str(cursor)
+        return response
+
+    try:
+        since = int(since)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Cursor inválido.'}, status=400)
+
+    completo = since <= 0 or since > cursor or since < (limites['primeiro'] or 0) - 1
+    if completo:
+        data = [_serializar_registro_dashboard(registro, tz) for registro in registros]
+        removidos = []
+    else:
+        alterados = set(
+            AlteracaoDashboard.objects.filter(id__gt=since, id__lte=cursor)
+            .values_list('registro_id', flat=True)
+        )
+        data = [
+            _serializar_registro_dashboard(registro, tz)
+            for registro in registros.filter(id__in=alterados)
+        ]
+        # Excluídos ou cujo servidor saiu do dashboard
+        removidos = sorted(alterados - {linha['id'] for linha in data})
+
+    response = JsonResponse({
+        'cursor': cursor,
+        'completo': completo,
+        'registros': data,
+        'removidos': removidos,
+    })
+    response['X-Dashboard-Cursor'] = str(cursor)
+    return response
 
 
 @login_required
@@ -209,7 +456,9 @@ def excluir_registro(request, registro_id):
             )
             
             # Remove o registro do dashboard
+            registro_id = registro_dashboard.pk
             registro_dashboard.delete()
+            publicar_evento_dashboard('exclusao', registro_id)
             
             return JsonResponse({'status': 'success'})
             
@@ -224,7 +473,11 @@ def excluir_registro(request, registro_id):
 
 @login_required
 def exportar_excel(request):
-    """Exporta os registros do dashboard para Excel."""
+    """Exporta os registros do dashboard para Excel (?segundo_plano=1 usa o worker)."""
+    if request.GET.get('segundo_plano'):
+        tarefa = enfileirar_exportacao(request.user, 'DASHBOARD', 'excel')
+        return responder_tarefa_enfileirada(request, tarefa, 'home')
+    
     registros = dashboard_registros_ativos().select_related(
         'servidor', 'operador', 'operador_saida'
     ).order_by('data_hora', 'id')
@@ -273,42 +526,55 @@ def limpar_dashboard(request):
 
 @login_required
 def registrar_saida(request, registro_id):
-    """Registra a saída diretamente para um registro pendente."""
+    """
+    Registra a saída diretamente para um registro pendente.
+
+    Aceita o cabeçalho Idempotency-Key: a retentativa devolve a resposta
+    original (com "repetido": true) em vez de "não está pendente de saída".
+    """
     if request.method == 'POST':
-        try:
-            # Obtém o registro do dashboard
-            registro_dashboard = get_object_or_404(RegistroDashboard, id=registro_id)
+        def registrar():
+            # Obtém o registro do dashboard (registro inexistente é resposta
+            # definitiva; já fechado depende do estado atual, então 409)
+            registro_dashboard = RegistroDashboard.objects.filter(id=registro_id).first()
+            if registro_dashboard is None:
+                return 404, {'status': 'error', 'message': 'Registro não encontrado.'}
             
             # Verifica se o registro está pendente
             if not registro_dashboard.saida_pendente:
-                return JsonResponse({
+                return 409, {
                     'status': 'error',
                     'message': 'Este registro não está pendente de saída.'
-                }, status=400)
+                }
             
-            # Define o timezone UTC-4
-            tz = pytz.timezone('America/Manaus')
             agora = timezone.now()
             
-            # Atualiza o registro histórico
-            registro_historico = registro_dashboard.registro_historico
-            registro_historico.data_hora_saida = agora
-            registro_historico.operador_saida = request.user
-            registro_historico.saida_pendente = False
-            registro_historico.save()
-            
-            # Atualiza o registro no dashboard
-            registro_dashboard.data_hora_saida = agora
-            registro_dashboard.operador_saida = request.user
-            registro_dashboard.saida_pendente = False
-            registro_dashboard.save()
-            
-            return JsonResponse({'status': 'success'})
+            # Histórico e dashboard atualizados juntos
+            with transacao_escrita():
+                registro_historico = registro_dashboard.registro_historico
+                registro_historico.data_hora_saida = agora
+                registro_historico.operador_saida = request.user
+                registro_historico.saida_pendente = False
+                registro_historico.save()
+                
+                registro_dashboard.data_hora_saida = agora
+                registro_dashboard.operador_saida = request.user
+                registro_dashboard.saida_pendente = False
+                registro_dashboard.save()
+            publicar_evento_dashboard('saida', registro_dashboard.pk)
             
+            return 200, {'status': 'success', 'message': 'Saída registrada com sucesso!'}
+        
+        try:
+            status_code, resposta, repetida = executar_idempotente(
+                chave_da_requisicao(request), request.user, 'registrar_saida', registrar
+            )
         except Exception as e:
             return JsonResponse({
                 'status': 'error',
                 'message': str(e)
             }, status=400)
+        
+        return JsonResponse({**resposta, 'repetido': repetida}, status=status_code)
     
     return JsonResponse({'status': 'error', 'message': 'Método não permitido'}, status=405) 
\ No newline at end of file
@@ -4,67 +4,87 @@ Views de gerenciamento de servidores.
 Responsável por:
 - CRUD completo de servidores
 - Busca de servidores
-- Importação via CSV
+- Importação via CSV ou XLSX (com prévia das alterações)
 - Limpeza do banco de servidores
 - Verificação de entradas pendentes
 """
 
 import csv
+from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.db.models import Q
 
-from ..models import Servidor, RegistroDashboard, LogAuditoria
+from ..models import Servidor, RegistroDashboard, LogAuditoria, PresencaServidor
 from ..forms import ServidorForm
+from ..importacao import (
+    COLUNAS_IMPORTACAO, comparar_importacao, descartar_previa, guardar_previa,
+    importar_servidores_em_lote, ler_planilha_servidores, obter_previa,
+)
 from ..decorators import pode_gerenciar_servidores, admin_required
-from ..utils import buscar_servidores_helper, desativar_servidor, colapsar_espacos
+from ..utils import (
+    buscar_servidores_helper, desativar_servidor, filtro_busca_servidor,
+)
 
+SERVIDORES_POR_PAGINA = 50
+ITENS_POR_PAGINA_PREVIA = 25
 
-def _normalizar_nome_coluna_csv(coluna: str | None) -> str:
-    """Normaliza cabecalhos e celulas CSV (BOM, NBSP, espacos extras)."""
-    return colapsar_espacos(coluna)
+# Listas da prévia de importação, na ordem das abas
+TIPOS_PREVIA_IMPORTACAO = {
+    'atualizar': 'Alterados',
+    'criar': 'Novos',
+    'inalterados': 'Sem alteração',
+}
 
 
 @login_required
 @pode_gerenciar_servidores
 def servidor_list(request):
-    """Lista todos os servidores com filtro de busca normalizada (sem acentos, case-insensitive)."""
-    from ..utils import normalizar_texto
-    
-    query = request.GET.get('q', '')
-    servidores = Servidor.objects.filter(ativo=True).order_by('nome')
-    
+    """
+    Lista os servidores ativos em páginas, com busca normalizada no banco.
+
+    Requisições AJAX (X-Requested-With) recebem a página em JSON para a
+    rolagem infinita da tabela.
+    """
+    query = request.GET.get('q', '').strip()
+    servidores = Servidor.objects.filter(ativo=True).order_by('nome', 'id')
+
     if query:
-        print(f"Busca realizada com o termo: '{query}'")
-        
-        # Normaliza a query para busca sem acentos
-        query_normalizada = normalizar_texto(query)
-        
-        # Busca todos os servidores e filtra no Python com normalização
-        servidores_raw = list(servidores)
-        servidores_filtrados = []
-        
-        for servidor in servidores_raw:
-            nome_normalizado = normalizar_texto(servidor.nome)
-            documento_normalizado = normalizar_texto(servidor.numero_documento)
-            setor_normalizado = normalizar_texto(servidor.setor or '')
-            
-            if (query_normalizada in nome_normalizado or 
-                query_normalizada in documento_normalizado or
-                query_normalizada in setor_normalizado):
-                servidores_filtrados.append(servidor)
-        
-        # Converte de volta para um objeto que o template pode iterar
-        servidores = servidores_filtrados
-        print(f"Resultados encontrados: {len(servidores)}")
-    
+        filtro = filtro_busca_servidor(query)
+        servidores = servidores.filter(filtro) if filtro is not None else servidores.none()
+
+    paginator = Paginator(servidores, SERVIDORES_POR_PAGINA)
+    pagina = paginator.get_page(request.GET.get('page'))
+
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'status': 'success',
+            'resultados': [
+                {
+                    'id': servidor.id,
+                    'nome': servidor.nome,
+                    'numero_documento': servidor.numero_documento,
+                    'setor': servidor.setor or '-',
+                    'veiculo': servidor.veiculo or '-',
+                }
+                for servidor in pagina
+            ],
+            'pagina': pagina.number,
+            'inicio': pagina.start_index(),
+            'total': paginator.count,
+            'proxima_pagina': pagina.next_page_number() if pagina.has_next() else None,
+        })
+
     context = {
-        'servidores': servidores,
+        'servidores': pagina,
+        'pagina': pagina,
+        'total': paginator.count,
         'query': query,
     }
-    
+
     return render(request, 'core/servidor_list.html', context)
 
 
@@ -159,141 +179,100 @@ def buscar_servidor(request):
 @login_required
 def verificar_entrada(request, servidor_id):
     """Verifica se existe uma entrada sem saída para o servidor."""
-    tem_entrada = RegistroDashboard.objects.filter(
+    tem_entrada = PresencaServidor.objects.filter(
         servidor_id=servidor_id,
         servidor__ativo=True,
-        tipo_acesso='ENTRADA',
-        saida_pendente=True,
+        dentro=True,
     ).exists()
     
     return JsonResponse({'tem_entrada': tem_entrada})
 
 
+def _resposta_previa_importacao(request, previa, token):
+    """Página da prévia (contagens e amostra paginada de um tipo de alteração)."""
+    tipo = request.GET.get('tipo')
+    if tipo not in TIPOS_PREVIA_IMPORTACAO:
+        # Abre na primeira lista com itens (alterações primeiro)
+        tipo = next((t for t in TIPOS_PREVIA_IMPORTACAO if previa[t]), 'atualizar')
+    pagina = Paginator(previa[tipo], ITENS_POR_PAGINA_PREVIA).get_page(request.GET.get('page'))
+    totais = {t: len(previa[t]) for t in TIPOS_PREVIA_IMPORTACAO}
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'status': 'success',
+            'token': token,
+            'totais': totais,
+            'tipo': tipo,
+            'itens': list(pagina.object_list),
+            'pagina': pagina.number,
+            'total_paginas': pagina.paginator.num_pages,
+        })
+    
+    return render(request, 'core/importar_servidores.html', {
+        'previa_token': token,
+        'previa_tipo': tipo,
+        'previa_abas': [
+            (t, rotulo, totais[t]) for t, rotulo in TIPOS_PREVIA_IMPORTACAO.items()
+        ],
+        'previa_total': sum(totais.values()),
+        'pagina': pagina,
+    })
+
+
 @login_required
 @admin_required
 def importar_servidores(request):
-    """Importa servidores via arquivo CSV."""
+    """
+    Importa servidores via arquivo CSV ou XLSX (em lotes, numa única transação).
+    
+    Com acao=previa o arquivo é lido e comparado ao cadastro sem gravar nada;
+    a prévia fica guardada sob um token e acao=confirmar aplica as linhas
+    já validadas, sem reenviar o arquivo.
+    """
     if request.method == 'POST':
+        acao = request.POST.get('acao', 'importar')
+        token = request.POST.get('token', '')
         try:
-            arquivo = request.FILES['arquivo']
-            
-            # Tentativa de leitura com diferentes codificações (utf-8-sig remove BOM do Excel)
-            encodings = ['utf-8-sig', 'utf-8', 'latin1', 'iso-8859-1', 'windows-1252']
-            decoded_file = None
-            successful_encoding = None
-            
-            for encoding in encodings:
-                try:
-                    # Tenta decodificar com a codificação atual
-                    arquivo.seek(0)  # Reseta o ponteiro do arquivo
-                    decoded_file = arquivo.read().decode(encoding).splitlines()
-                    successful_encoding = encoding
-                    break
-                except UnicodeDecodeError:
-                    # Se falhar, continua para a próxima codificação
-                    continue
-            
-            if decoded_file is None:
-                raise Exception(f"Não foi possível ler o arquivo com nenhuma das codificações suportadas ({', '.join(encodings)}). Certifique-se de salvar o arquivo como CSV com codificação UTF-8.")
-                
-            print(f"Arquivo CSV lido com sucesso usando codificação: {successful_encoding}")
-            
-            # Tenta identificar o delimitador (vírgula ou ponto-e-vírgula)
-            primeira_linha = decoded_file[0] if decoded_file else ""
-            delimiter = ';' if ';' in primeira_linha else ','
-            print(f"Delimitador identificado: {delimiter}")
+            if acao == 'cancelar':
+                descartar_previa(token)
+                messages.info(request, 'Importação cancelada.')
+                return redirect('importar_servidores')
             
-            # Usa o delimitador detectado
-            reader = csv.DictReader(decoded_file, delimiter=delimiter)
+            if acao == 'confirmar':
+                previa = obter_previa(request.user, token)
+                if previa is None:
+                    messages.error(request, 'A prévia expirou ou não foi encontrada. Envie o arquivo novamente.')
+                    return redirect('importar_servidores')
+                resumo = importar_servidores_em_lote(previa['registros'], request.user)
+                descartar_previa(token)
+            else:
+                registros = ler_planilha_servidores(request.FILES['arquivo'])
+                if acao == 'previa':
+                    previa = comparar_importacao(registros)
+                    token = guardar_previa(request.user, previa)
+                    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                        return _resposta_previa_importacao(request, previa, token)
+                    return redirect(f"{reverse('importar_servidores')}?previa={token}")
+                resumo = importar_servidores_em_lote(registros, request.user)
             
-            # Verificação e normalização dos nomes das colunas
-            colunas_esperadas = ['Nome', 'Número do Documento', 'Setor', 'Veículo']
-            colunas_reader = reader.fieldnames
-
-            # Verificar se há colunas necessárias no CSV
-            if not colunas_reader:
-                raise Exception("Arquivo CSV não contém cabeçalhos de colunas")
-
-            # Criar mapeamento para normalizar nomes de colunas (BOM, espacos, acentos)
-            mapeamento_colunas = {}
-            colunas_limpas = {
-                _normalizar_nome_coluna_csv(col): col for col in colunas_reader if col
-            }
-
-            for coluna_esperada in colunas_esperadas:
-                if coluna_esperada in colunas_reader:
-                    mapeamento_colunas[coluna_esperada] = coluna_esperada
-                    continue
-
-                coluna_limpa_esperada = _normalizar_nome_coluna_csv(coluna_esperada)
-                if coluna_limpa_esperada in colunas_limpas:
-                    mapeamento_colunas[coluna_esperada] = colunas_limpas[coluna_limpa_esperada]
-                    continue
-
-                coluna_normalizada = coluna_esperada.lower().replace('ú', 'u').replace('í', 'i')
-                for coluna in colunas_reader:
-                    coluna_cmp = _normalizar_nome_coluna_csv(coluna).lower().replace('ú', 'u').replace('í', 'i')
-                    if coluna_cmp == coluna_normalizada:
-                        mapeamento_colunas[coluna_esperada] = coluna
-                        break
-            
-            # Verifica se todas as colunas necessárias foram encontradas
-            colunas_faltantes = [col for col in colunas_esperadas if col not in mapeamento_colunas]
-            if colunas_faltantes:
-                colunas_encontradas = ", ".join([f"'{c}'" for c in colunas_reader if c])
-                colunas_necessarias = ", ".join([f"'{c}'" for c in colunas_faltantes])
-                raise Exception(f"Colunas não encontradas: {colunas_necessarias}. Colunas disponíveis: {colunas_encontradas}")
-            
-            servidores_criados = 0
-            servidores_atualizados = 0
-            
-            for row in reader:
-                try:
-                    # Verifica se a linha tem dados válidos
-                    if not row[mapeamento_colunas['Nome']] or not row[mapeamento_colunas['Número do Documento']]:
-                        continue  # Pula linhas vazias ou sem dados essenciais
-
-                    nome = _normalizar_nome_coluna_csv(row[mapeamento_colunas['Nome']])
-                    documento = _normalizar_nome_coluna_csv(
-                        row[mapeamento_colunas['Número do Documento']]
-                    )
-                    setor = _normalizar_nome_coluna_csv(row[mapeamento_colunas['Setor']])
-                    veiculo_raw = row.get(mapeamento_colunas['Veículo']) or ''
-                    veiculo = _normalizar_nome_coluna_csv(veiculo_raw) or None
-
-                    servidor, created = Servidor.objects.update_or_create(
-                        numero_documento=documento,
-                        defaults={
-                            'nome': nome,
-                            'setor': setor,
-                            'veiculo': veiculo,
-                            'ativo': True
-                        }
-                    )
-                    
-                    if created:
-                        servidores_criados += 1
-                    else:
-                        servidores_atualizados += 1
-                    
-                    LogAuditoria.objects.create(
-                        usuario=request.user,
-                        tipo_acao='CRIACAO' if created else 'EDICAO',
-                        modelo='Servidor',
-                        objeto_id=servidor.id,
-                        detalhes=f"{'Criação' if created else 'Atualização'} de servidor via importação: {servidor.nome}"
-                    )
-                except Exception as row_error:
-                    # Adiciona informações sobre a linha que falhou
-                    raise Exception(f"Erro na linha {reader.line_num}: {str(row_error)}. Dados: {row}")
-            
-            messages.success(request, f'{servidores_criados} servidores criados e {servidores_atualizados} atualizados com sucesso!')
+            mensagem = f"{resumo['criados']} servidores criados e {resumo['atualizados']} atualizados com sucesso!"
+            if resumo['inalterados']:
+                mensagem += f" {resumo['inalterados']} já estavam atualizados."
+            messages.success(request, mensagem)
             return redirect('servidor_list')
             
         except Exception as e:
             messages.error(request, f'Erro ao importar servidores: {str(e)}')
             return redirect('importar_servidores')
     
+    token = request.GET.get('previa')
+    if token:
+        previa = obter_previa(request.user, token)
+        if previa is None:
+            messages.error(request, 'A prévia expirou ou não foi encontrada. Envie o arquivo novamente.')
+            return redirect('importar_servidores')
+        return _resposta_previa_importacao(request, previa, token)
+    
     return render(request, 'core/importar_servidores.html')
 
 
@@ -308,7 +287,7 @@ def download_modelo_importacao(request):
     response.write('\ufeff')
     
     # Estas colunas DEVEM corresponder exatamente às esperadas na função importar_servidores
-    colunas = ['Nome', 'Número do Documento', 'Setor', 'Veículo']
+    colunas = COLUNAS_IMPORTACAO
     
     # Configura o CSV para usar ponto-e-vírgula como delimitador (melhor compatibilidade com Excel brasileiro)
     writer = csv.writer(response, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
@@ -2,7 +2,6 @@
 
 from datetime import datetime
 
-import pandas as pd
 import pytz
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -10,6 +9,8 @@ from django.db.models import Q
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from io import BytesIO
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
@@ -17,7 +18,10 @@ from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
 
 from ..models import RegistroAcessoTreinamento, Servidor, ServidorTreinamento
-from ..utils import calcular_plantao_atual, extrair_plantao_do_setor
+from ..utils import (
+    calcular_plantao_atual, dashboard_stats, exportar_excel_helper, extrair_plantao_do_setor,
+    versao_dashboard,
+)
 
 @login_required
 def ambiente_treinamento(request):
@@ -29,16 +33,8 @@ def ambiente_treinamento(request):
     # Obtém o plantão atual
     plantao_atual = calcular_plantao_atual()
     
-    # Filtra registros do plantão atual (todos os registros para treinamento)
-    registros = RegistroAcessoTreinamento.objects.all().select_related('servidor', 'operador')
-    
-    # Calcula totais para os cards (similar ao dashboard principal)
-    total_entradas = registros.filter(tipo_acesso='ENTRADA').count()  # Total de entradas
-    total_saidas = registros.filter(data_hora_saida__isnull=False).count()  # Total de saídas normais
-    total_pendentes = registros.filter(tipo_acesso='ENTRADA', saida_pendente=True).count()  # Entradas sem saída
-    
-    # Lista de servidores para os modais (do banco principal)
-    servidores = Servidor.objects.filter(ativo=True).order_by('nome')
+    # Calcula totais para os cards (mesma consulta agregada do dashboard principal)
+    totais = dashboard_stats(is_treinamento=True)
     
     # Define mostrar_aviso como False para desativar o aviso de troca de plantão
     mostrar_aviso = False
@@ -50,10 +46,7 @@ def ambiente_treinamento(request):
     # No ambiente de treinamento, todos têm permissão total
     context = {
         'plantao_atual': plantao_atual,
-        'total_entradas': total_entradas,
-        'total_saidas': total_saidas,
-        'total_pendentes': total_pendentes,
-        'servidores': servidores,
+        **totais,
         'mostrar_aviso_plantao': mostrar_aviso,
         'hora_atual': f"{hora_atual:02d}:{minuto_atual:02d}",
         'agora': agora,
@@ -67,9 +60,19 @@ def ambiente_treinamento(request):
     
     return render(request, 'core/treinamento.html', context)
 
+def _etag_registros_plantao_treinamento(request):
+    return versao_dashboard(is_treinamento=True)
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_registros_plantao_treinamento)
 def registros_plantao_treinamento(request):
-    """View para obter os registros do plantão atual no ambiente de treinamento."""
+    """
+    View para obter os registros do plantão atual no ambiente de treinamento.
+
+    Responde 304 quando o ETag enviado em If-None-Match ainda é o atual.
+    """
     try:
         print(f"\n\n[DEBUG TREINAMENTO] ======= INÍCIO CARREGAMENTO DE REGISTROS =======")
         print(f"[DEBUG TREINAMENTO] Requisição recebida de: {request.user}")
@@ -146,22 +149,15 @@ def registros_plantao_treinamento(request):
             registros_formatados.append(registro_formatado)
         
         # Calcula os totais
-        total_entradas = registros.filter(tipo_acesso='ENTRADA').count()
-        total_saidas = registros.filter(tipo_acesso='SAIDA').count()
-        total_pendentes = registros.filter(saida_pendente=True).count()
+        totais = dashboard_stats(is_treinamento=True)
         
-        print(f"[DEBUG TREINAMENTO] Total de entradas: {total_entradas}")
-        print(f"[DEBUG TREINAMENTO] Total de saídas: {total_saidas}")
-        print(f"[DEBUG TREINAMENTO] Total de pendentes: {total_pendentes}")
         print(f"[DEBUG TREINAMENTO] Total de registros formatados: {len(registros_formatados)}")
         
         # Prepara a resposta
         resposta = {
             'status': 'success',
             'registros': registros_formatados,
-            'total_entradas': total_entradas,
-            'total_saidas': total_saidas,
-            'total_pendentes': total_pendentes
+            **totais,
         }
         
         print(f"[DEBUG TREINAMENTO] Resposta preparada com sucesso")
@@ -327,92 +323,7 @@ def exportar_excel_treinamento(request):
         'servidor', 'operador', 'operador_saida'
     ).order_by('data_hora', 'id')
     
-    # Define o timezone UTC-4
-    tz = pytz.timezone('America/Manaus')
-    agora = timezone.localtime(timezone.now(), tz)
-    
-    # Cria um DataFrame com os registros
-    data = []
-    for registro in registros:
-        # Converte os horários para UTC-4
-        data_hora = timezone.localtime(registro.data_hora, tz) if registro.data_hora else None
-        data_hora_saida = timezone.localtime(registro.data_hora_saida, tz) if registro.data_hora_saida else None
-        
-        # Identifica o plantão do registro
-        plantao_registro = calcular_plantao_atual(data_hora)['nome'] if data_hora else "N/A"
-        
-        # Se for uma entrada normal
-        if registro.tipo_acesso == 'ENTRADA':
-            data.append({
-                'ORD': len(data) + 1,
-                'Plantão': plantao_registro,
-                'Data': data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A',
-                'Operador': registro.operador.get_full_name() or registro.operador.username,
-                'Servidor': registro.servidor.nome,
-                'Documento': registro.servidor.numero_documento,
-                'Setor': registro.servidor.setor or '-',
-                'Veículo': registro.veiculo if registro.veiculo and registro.veiculo.strip() else registro.servidor.veiculo if registro.servidor.veiculo and registro.servidor.veiculo.strip() else '-',
-                'ISV': 'Sim' if registro.isv else 'Não',
-                'Entrada': data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A',
-                'Saída': data_hora_saida.strftime('%d/%m/%Y %H:%M') if data_hora_saida else 'Pendente'
-            })
-        # Se for uma saída definitiva
-        elif registro.tipo_acesso == 'SAIDA':
-            data.append({
-                'ORD': len(data) + 1,
-                'Plantão': plantao_registro,
-                'Data': data_hora.strftime('%d/%m/%Y') if data_hora else 'N/A',
-                'Operador': registro.operador.get_full_name() or registro.operador.username,
-                'Servidor': f"Egresso: {registro.servidor.nome}" if not registro.servidor.nome.startswith('Egresso:') else registro.servidor.nome,
-                'Documento': registro.servidor.numero_documento,
-                'Setor': registro.setor or '-',  # Aqui estará a justificativa
-                'Veículo': registro.veiculo if registro.veiculo and registro.veiculo.strip() else registro.servidor.veiculo if registro.servidor.veiculo and registro.servidor.veiculo.strip() else '-',
-                'ISV': 'Sim' if registro.isv else 'Não',
-                'Entrada': '-',
-                'Saída': data_hora.strftime('%d/%m/%Y %H:%M') if data_hora else 'N/A'
-            })
-    
-    # Se não houver registros, cria dados de exemplo
-    if not data:
-        data = [
-            {
-                'ORD': 1,
-                'Plantão': 'DIURNO',
-                'Data': agora.strftime('%d/%m/%Y'),
-                'Operador': 'USUÁRIO TREINAMENTO',
-                'Servidor': 'SERVIDOR EXEMPLO',
-                'Documento': '12345678900',
-                'Setor': 'EXEMPLO',
-                'Veículo': 'ABC-1234',
-                'ISV': 'Não',
-                'Entrada': f"{agora.strftime('%d/%m/%Y')} 08:00",
-                'Saída': 'Pendente'
-            }
-        ]
-    
-    # Cria o DataFrame com as colunas na ordem especificada
-    df = pd.DataFrame(data, columns=[
-        'ORD', 'Plantão', 'Data', 'Operador', 'Servidor', 'Documento', 
-        'Setor', 'Veículo', 'ISV', 'Entrada', 'Saída'
-    ])
-    
-    # Cria o arquivo Excel
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=treinamento_controle_acesso_{agora.strftime("%Y%m%d_%H%M")}.xlsx'
-    
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Registros')
-        
-        # Ajusta a largura das colunas
-        worksheet = writer.sheets['Registros']
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(col)
-            )
-            worksheet.column_dimensions[chr(65 + idx)].width = max_length + 2
-    
-    return response
+    return exportar_excel_helper(registros, 'treinamento_controle_acesso', is_treinamento=True)
 
 @login_required
 def registro_acesso_treinamento_update(request, registro_id):